@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+micro.py - ホットな関数のマイクロベンチマークと性能低下の検出
+
+対象（実際の MASTER.md と assets/figs を使う）:
+- parse_master_markdown / extract_figure_references
+- PDFBuilder.markdown_to_html（章ごと。html_cache.py のキャッシュを通さない変換）
+- ProfessionalDiagramGenerator.generate_*（図ごと。キャッシュなし）
+- PPTXBuilder.create_content_slide / build_pptx（VOL1全体）
+
+各ベンチマークは1回の計測が min_time 以上になるよう呼び出し回数を調整し、
+repeat 回測った1呼び出しあたりの時間の中央値と、そのばらつき（MAD）を記録する。
+--save-baseline で結果を基準（benchmarks/micro_baseline.json）として保存し、
+以後の実行では基準の中央値との比を表示する。許容する低下は閾値（既定15%）と
+基準のばらつきの NOISE_SIGMAS 倍の大きい方で、これを超えて遅くなったものが
+あれば終了コード1を返す（ばらつきの大きいベンチマークで誤検出しないため）。
+基準はマシンに依存するので、夜間ビルドと同じマシンで保存し直すこと。
+
+図・PDF・PPTXのキャッシュや出力は一時ディレクトリに書き、リポジトリの
+.build_cache や assets/figs には触れない。
+
+使い方:
+    python benchmarks/micro.py --save-baseline          # 基準を保存
+    python benchmarks/micro.py                          # 基準と比較（低下があれば exit 1）
+    python benchmarks/micro.py -k 'generate_*' -k parse_master_markdown --threshold 10
+"""
+
+import argparse
+import contextlib
+import fnmatch
+import io
+import json
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+SRC = ROOT / "src"
+sys.path.insert(0, str(SRC))
+
+from utils import ProjectPaths  # noqa: E402
+
+RESULT_VERSION = 2
+DEFAULT_BASELINE = ROOT / "benchmarks" / "micro_baseline.json"
+DEFAULT_THRESHOLD = 15.0  # %
+NOISE_SIGMAS = 3.0  # 基準のばらつき（MADから求めた標準偏差）の何倍まで許容するか
+MAD_TO_SIGMA = 1.4826
+VOLUME = "vol1_2kyu"
+
+
+class Benchmark(NamedTuple):
+    """setup() が計測対象の関数を返す（importや準備は計測に含めない）"""
+    name: str
+    setup: Callable[[], Callable[[], object]]
+    repeat: int = 7
+    min_time: float = 0.2  # 1回の計測の最小時間（秒）。遅い関数は1呼び出しで超える
+
+
+class Workspace:
+    """ベンチマーク用の作業ディレクトリ（原稿の分割結果・図の出力先）"""
+
+    def __init__(self):
+        self.paths = ProjectPaths()
+        self.root = Path(tempfile.mkdtemp(prefix="bim-micro-"))
+        self._split = None
+
+    def split(self) -> ProjectPaths:
+        """実際の MASTER.md を作業ディレクトリに分割（1回だけ）"""
+        if self._split is None:
+            from split_master import split_master_to_chapters
+            self._split = ProjectPaths(self.root / "project")
+            self._split.root.mkdir(parents=True)
+            shutil.copy(self.paths.master_file, self._split.master_file)
+            split_master_to_chapters(self._split)
+        return self._split
+
+    def isolate(self, builder):
+        """ビルダーのキャッシュ（図のレンディション・PDFレイアウト）を作業ディレクトリに向ける"""
+        from renditions import RenditionCache
+        cache = self.root / "cache"
+        builder.renditions = RenditionCache(cache / "renditions")
+        if hasattr(builder, 'assets'):
+            builder.assets.renditions = builder.renditions
+        if hasattr(builder, 'layout_cache'):
+            from layout_cache import LayoutCache
+            builder.layout_cache = LayoutCache(cache / "pdf_layout" / "parts")
+        return builder
+
+    def close(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+def collect_benchmarks(ws: Workspace) -> List[Benchmark]:
+    from utils import extract_figure_references, parse_master_markdown
+
+    master = ws.paths.master_file
+    benchmarks = [
+        Benchmark("parse_master_markdown", lambda: lambda: parse_master_markdown(master)),
+    ]
+
+    def setup_extract():
+        contents = [ch.content for chapters in parse_master_markdown(master) for ch in chapters]
+        return lambda: [extract_figure_references(content) for content in contents]
+    benchmarks.append(Benchmark("extract_figure_references", setup_extract))
+
+    # 章ごとの Markdown → HTML（キャッシュにヒットすると変換の時間を測れないので、
+    # PDFBuilder.markdown_to_html がキャッシュにないときに行う変換そのものを測る）
+    def setup_markdown(chapter_file: Path):
+        def setup():
+            from html_cache import render_markdown
+            from pdf_build import PDFBuilder
+            builder = ws.isolate(PDFBuilder(ws.root / "dist", figures_dir=ws.paths.figs))
+            content = builder.resolve_figures(chapter_file.read_text(encoding='utf-8'))
+            return lambda: render_markdown(content)
+        return setup
+
+    split = ws.split()
+    for _, vol_dir in split.volumes.values():
+        for chapter_file in sorted(vol_dir.glob("chapter_*.md")):
+            benchmarks.append(Benchmark(
+                f"markdown_to_html:{vol_dir.name}/{chapter_file.stem}", setup_markdown(chapter_file)))
+
+    # 図ごとの生成（描画・保存・PNG最適化まで。キャッシュは使わない）
+    def setup_figure(method: str):
+        def setup():
+            from diagrams_professional import ProfessionalDiagramGenerator
+            generator = ProfessionalDiagramGenerator(ws.root / "figs")
+            return getattr(generator, method)
+        return setup
+
+    from figure_index import load_figure_index
+    for method in load_figure_index(ws.paths.src / "diagrams_professional.py"):
+        benchmarks.append(Benchmark(f"figure:{method}", setup_figure(method), repeat=5))
+
+    def setup_content_slide():
+        from pptx import Presentation
+        from pptx_build import PPTXBuilder
+        builder = ws.isolate(PPTXBuilder(ws.root / "dist", figures_dir=ws.paths.figs))
+        _, vol_dir = split.volumes[VOLUME]
+        section = (vol_dir / "chapter_01.md").read_text(encoding='utf-8').split('#### ')[1]
+        title, _, body = section.partition('\n')
+        prs = Presentation()
+        return lambda: builder.create_content_slide(prs, title, body, 1)
+    benchmarks.append(Benchmark("pptx:create_content_slide", setup_content_slide))
+
+    def setup_build_pptx():
+        from pptx_build import PPTXBuilder
+        builder = ws.isolate(PPTXBuilder(ws.root / "dist", figures_dir=ws.paths.figs))
+        _, vol_dir = split.volumes[VOLUME]
+        return lambda: builder.build_pptx(VOLUME, vol_dir)
+    benchmarks.append(Benchmark(f"pptx:build_pptx:{VOLUME}", setup_build_pptx, repeat=5))
+
+    return benchmarks
+
+
+def measure(func: Callable[[], object], repeat: int, min_time: float) -> Dict[str, float]:
+    """1呼び出しあたりの時間（repeat 回の中央値・MAD・最小値）"""
+    with contextlib.redirect_stdout(io.StringIO()):  # 進捗表示（print）は捨てる
+        start = time.perf_counter()
+        func()  # ウォームアップ（遅延import・キャッシュの作成）
+        single = time.perf_counter() - start
+        number = max(1, int(min_time / single)) if single > 0 else 1000
+
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                func()
+            samples.append((time.perf_counter() - start) / number)
+    median = statistics.median(samples)
+    return {
+        'seconds': median,
+        'mad': statistics.median(abs(sample - median) for sample in samples),
+        'min': min(samples),
+        'number': number,
+        'repeat': repeat,
+    }
+
+
+def environment() -> Dict[str, str]:
+    """結果に影響する環境（基準と違えば警告する）"""
+    from importlib import metadata
+
+    env = {'python': platform.python_version(), 'machine': platform.machine(),
+           'platform': platform.platform()}
+    for package in ('matplotlib', 'markdown2', 'python-pptx', 'Pillow'):
+        try:
+            env[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            env[package] = 'none'
+    return env
+
+
+def git_commit() -> str:
+    result = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True)
+    return result.stdout.strip() if result.returncode == 0 else ''
+
+
+def format_time(seconds: float) -> str:
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:8.1f}µs"
+    if seconds < 1:
+        return f"{seconds * 1e3:8.2f}ms"
+    return f"{seconds:8.3f}s "
+
+
+def spread_percent(result: dict) -> float:
+    """ばらつき（MADから求めた標準偏差の中央値に対する割合, %）"""
+    if not result.get('seconds'):
+        return 0.0
+    if 'mad' in result:
+        return result['mad'] * MAD_TO_SIGMA / result['seconds'] * 100
+    return result.get('stdev', 0.0) / result['seconds'] * 100  # version 1 の基準
+
+
+def compare(results: Dict[str, dict], baseline: Optional[dict], threshold: float) -> List[str]:
+    """
+    結果を表示し、許容範囲を超えて遅くなったベンチマーク名を返す
+
+    許容範囲は threshold と基準のばらつきの NOISE_SIGMAS 倍の大きい方。
+    """
+    base_results = baseline['results'] if baseline else {}
+    regressions = []
+    for name, result in results.items():
+        if 'error' in result:
+            print(f"⚠️  {name:<52} {result['error']}")
+            continue
+        line = f"{name:<52} {format_time(result['seconds'])} ±{spread_percent(result):4.1f}%"
+        base = base_results.get(name)
+        if base is None or 'error' in base:
+            print(f"🆕 {line}")
+            continue
+        bound = max(threshold, NOISE_SIGMAS * spread_percent(base))
+        change = (result['seconds'] / base['seconds'] - 1) * 100
+        if change > bound:
+            mark = "❌"
+            regressions.append(name)
+        elif change < -bound:
+            mark = "🚀"
+        else:
+            mark = "✓ "
+        print(f"{mark} {line}  基準 {format_time(base['seconds'])} ({change:+.1f}% / 許容 {bound:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="マイクロベンチマークと性能低下の検出")
+    parser.add_argument('-k', dest='patterns', action='append', default=[], metavar='PATTERN',
+                        help="実行するベンチマーク名のパターン（fnmatch形式、複数指定可）")
+    parser.add_argument('--baseline', type=Path, default=DEFAULT_BASELINE, help="基準のJSON")
+    parser.add_argument('--save-baseline', action='store_true', help="今回の結果を基準として保存する")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help=f"これ以上（%%）遅くなったら失敗にする（既定 {DEFAULT_THRESHOLD}%%。"
+                             f"基準のばらつきが大きいものはその {NOISE_SIGMAS:.0f}倍まで許容）")
+    parser.add_argument('--repeat', type=int, help="計測回数（既定はベンチマークごと）")
+    parser.add_argument('-o', '--output', type=Path,
+                        help="結果のJSON（既定: .build_cache/benchmarks/micro-<commit>.json）")
+    parser.add_argument('--list', action='store_true', help="ベンチマーク名を表示して終了")
+    args = parser.parse_args()
+
+    import logging
+    import warnings
+    logging.disable(logging.INFO)  # 計測対象のログ出力を抑える
+    logging.getLogger('matplotlib').setLevel(logging.ERROR)  # フォント代替の警告
+    warnings.filterwarnings('ignore', message='Glyph .* missing from font')
+
+    ws = Workspace()
+    try:
+        benchmarks = [b for b in collect_benchmarks(ws)
+                      if not args.patterns or any(fnmatch.fnmatchcase(b.name, p) for p in args.patterns)]
+        if args.list:
+            for bench in benchmarks:
+                print(bench.name)
+            return 0
+
+        baseline = None
+        if args.baseline.exists() and not args.save_baseline:
+            baseline = json.loads(args.baseline.read_text(encoding='utf-8'))
+        env = environment()
+        if baseline and baseline.get('env') != env:
+            changed = [key for key in env if baseline.get('env', {}).get(key) != env[key]]
+            print(f"⚠️  基準と環境が異なります（{', '.join(changed)}）。比較は参考値です")
+
+        results: Dict[str, dict] = {}
+        for bench in benchmarks:
+            try:
+                func = bench.setup()
+                results[bench.name] = measure(func, args.repeat or bench.repeat, bench.min_time)
+            except Exception as e:  # 依存ライブラリがない等。他のベンチマークは続ける
+                results[bench.name] = {'error': f"{type(e).__name__}: {e}".splitlines()[0]}
+        regressions = compare(results, baseline, args.threshold)
+    finally:
+        ws.close()
+
+    report = {'benchmark': 'micro', 'version': RESULT_VERSION, 'commit': git_commit(),
+              'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'env': env,
+              'threshold': args.threshold, 'results': results}
+    output = args.output or ROOT / ".build_cache" / "benchmarks" / f"micro-{report['commit'][:7] or 'unknown'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+    print(f"\n💾 結果: {output}")
+
+    if args.save_baseline:
+        if baseline_exists := args.baseline.exists():
+            # 部分実行（-k）で保存した場合は、対象外のベンチマークの基準を残す
+            previous = json.loads(args.baseline.read_text(encoding='utf-8'))
+            report['results'] = dict(previous.get('results', {}), **report['results'])
+        args.baseline.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+        print(f"📌 基準を{'更新' if baseline_exists else '保存'}: {args.baseline}")
+        return 0
+
+    if baseline is None:
+        print(f"基準がありません。--save-baseline で {args.baseline} に保存できます")
+        return 0
+    if regressions:
+        print(f"❌ 許容範囲を超える性能低下: {', '.join(regressions)}")
+        return 1
+    print(f"✅ 性能低下なし（閾値 {args.threshold:.0f}% / ばらつきの {NOISE_SIGMAS:.0f}倍）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+scaling.py - 原稿の大きさに対する各ステージのスケーリング計測
+
+synthetic_master.py で実際の原稿の 1x / 10x / 100x の合成 MASTER.md を作り、
+次のステージの処理時間とピークメモリ（RSS）を測る。
+
+- parse: utils.parse_master_volumes（キャッシュなし）
+- split: split_master_to_chapters（原稿キャッシュ・manuscript/ が空の状態から）
+- pdf:   PDFBuilder.build_pdf（VOL1）
+- pptx:  PPTXBuilder.build_pptx（VOL1）
+
+合成原稿はどの倍率でも2 VOLで、倍率に比例してVOLあたりの章数が増える
+（pdf・pptx が処理する VOL1 の章数も倍率に比例する）。
+
+各ステージは別プロセスで実行する（ピークRSSがステージごとに独立し、
+前のステージのキャッシュやimportの影響を受けない）。ライブラリのimportは
+計測前に済ませ、時間は --repeat 回の最小値を採る。
+結果はJSONで保存するので、--compare で別のコミットの結果と比べられる。
+
+使い方:
+    python benchmarks/scaling.py                         # 1x/10x/100x × 全ステージ
+    python benchmarks/scaling.py --scales 1 10 --stages parse split
+    python benchmarks/scaling.py --compare .build_cache/benchmarks/scaling-abc1234.json
+"""
+
+import argparse
+import json
+import math
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from synthetic_master import spec_for_scale, write_master
+
+ROOT = Path(__file__).resolve().parent.parent
+SRC = ROOT / "src"
+
+RESULT_VERSION = 2
+STAGES = ("parse", "split", "pdf", "pptx")
+DEFAULT_SCALES = (1, 10, 100)
+VOLUME = "vol1_2kyu"
+
+
+# ---------------------------------------------------------------------------
+# ステージの実行（子プロセス側）
+# ---------------------------------------------------------------------------
+
+def peak_rss_mb() -> float:
+    import resource
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def prepare_stage(stage: str, workdir: Path):
+    """計測対象の関数を返す（importと前提の準備はここで済ませる）"""
+    sys.path.insert(0, str(SRC))
+    import logging
+    logging.disable(logging.INFO)  # 計測中のログ出力を抑える（警告以上は残す）
+    from utils import ProjectPaths, parse_master_volumes
+
+    paths = ProjectPaths(workdir)
+    if stage == "parse":
+        return lambda: parse_master_volumes(paths.master_file)
+
+    from split_master import split_master_to_chapters
+    if stage == "split":
+        def run_split():
+            # 毎回キャッシュなし・章ファイルなしの状態から
+            shutil.rmtree(paths.cache, ignore_errors=True)
+            shutil.rmtree(paths.manuscript, ignore_errors=True)
+            split_master_to_chapters(paths)
+        return run_split
+
+    if not paths.vol1_dir.exists():
+        split_master_to_chapters(paths)
+    figures_dir = ROOT / "assets" / "figs"
+    _, manuscript_dir = paths.volumes[VOLUME]
+    if stage == "pdf":
+        import markdown2  # noqa: F401
+        import weasyprint  # noqa: F401
+        from pdf_build import PDFBuilder
+        builder = PDFBuilder(paths.dist, figures_dir=figures_dir)
+        return lambda: builder.build_pdf(VOLUME, manuscript_dir)
+    if stage == "pptx":
+        import pptx  # noqa: F401
+        from pptx_build import PPTXBuilder
+        builder = PPTXBuilder(paths.dist, figures_dir=figures_dir)
+        return lambda: builder.build_pptx(VOLUME, manuscript_dir)
+    raise ValueError(f"不明なステージ: {stage}")
+
+
+def run_stage(stage: str, workdir: Path, repeat: int) -> dict:
+    """子プロセスで呼ばれる: ステージを repeat 回実行して結果を返す"""
+    action = prepare_stage(stage, workdir)
+    baseline = peak_rss_mb()
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        action()
+        runs.append(time.perf_counter() - start)
+    peak = peak_rss_mb()
+    return {'seconds': min(runs), 'runs': runs, 'peak_rss_mb': round(peak, 1),
+            'rss_delta_mb': round(peak - baseline, 1)}
+
+
+# ---------------------------------------------------------------------------
+# 計測の制御（親プロセス側）
+# ---------------------------------------------------------------------------
+
+def measure(stage: str, workdir: Path, repeat: int, timeout: float) -> dict:
+    command = [sys.executable, str(Path(__file__).resolve()), '--run-stage', stage,
+               '--workdir', str(workdir), '--repeat', str(repeat)]
+    try:
+        completed = subprocess.run(command, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return {'error': f"タイムアウト（{timeout:.0f}秒）"}
+    if completed.returncode != 0:
+        lines = completed.stderr.strip().splitlines()
+        return {'error': lines[-1] if lines else f"終了コード {completed.returncode}"}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def git_revision() -> Dict[str, object]:
+    def git(*args):
+        result = subprocess.run(['git', *args], cwd=ROOT, capture_output=True, text=True)
+        return result.stdout.strip() if result.returncode == 0 else ''
+    return {'commit': git('rev-parse', 'HEAD'), 'dirty': bool(git('status', '--porcelain', '--', 'src'))}
+
+
+def scaling_exponents(results: List[dict]) -> Dict[str, Optional[float]]:
+    """ステージごとの log(時間) / log(倍率) の傾き（1なら線形）"""
+    exponents = {}
+    for stage in dict.fromkeys(r['stage'] for r in results):
+        points = [(r['scale'], r['seconds']) for r in results
+                  if r['stage'] == stage and r.get('seconds')]
+        if len(points) < 2:
+            exponents[stage] = None
+            continue
+        (s1, t1), (s2, t2) = points[0], points[-1]
+        exponents[stage] = round(math.log(t2 / t1) / math.log(s2 / s1), 2) if s2 != s1 else None
+    return exponents
+
+
+def print_report(report: dict, baseline: Optional[dict] = None):
+    previous = {}
+    if baseline:
+        previous = {(r['scale'], r['stage']): r for r in baseline['results']}
+    print(f"\n{'倍率':>6} {'章数':>6} {'ステージ':<6} {'時間':>10} {'ピークRSS':>10} {'増分':>8}"
+          + ("  前回比" if baseline else ""))
+    chapters = {s['scale']: s['chapters'] for s in report['scales']}
+    for r in report['results']:
+        head = f"{r['scale']:>5}x {chapters[r['scale']]:>6} {r['stage']:<6}"
+        if r.get('error'):
+            print(f"{head} ⚠️  {r['error']}")
+            continue
+        line = f"{head} {r['seconds']:>9.3f}s {r['peak_rss_mb']:>8.0f}MB {r['rss_delta_mb']:>6.0f}MB"
+        old = previous.get((r['scale'], r['stage']))
+        if old and old.get('seconds'):
+            line += f"  {r['seconds'] / old['seconds']:.2f}x"
+        print(line)
+    print("\nスケーリング指数（1.0で線形、2.0で二乗）:")
+    for stage, exponent in report['exponents'].items():
+        print(f"  {stage:<6} {'-' if exponent is None else exponent}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="原稿の大きさに対する各ステージのスケーリング計測")
+    parser.add_argument('--scales', type=float, nargs='+', default=list(DEFAULT_SCALES),
+                        help="実際の原稿に対する倍率")
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES))
+    parser.add_argument('--repeat', type=int, default=3, help="各ステージの実行回数（最小値を採用）")
+    parser.add_argument('--timeout', type=float, default=1800, help="1ステージの制限時間（秒）")
+    parser.add_argument('-o', '--output', type=Path,
+                        help="結果のJSON（既定: .build_cache/benchmarks/scaling-<commit>.json）")
+    parser.add_argument('--compare', type=Path, help="比較する以前の結果のJSON")
+    parser.add_argument('--keep', action='store_true', help="合成原稿の作業ディレクトリを残す")
+    # 子プロセス用
+    parser.add_argument('--run-stage', choices=STAGES, help=argparse.SUPPRESS)
+    parser.add_argument('--workdir', type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_stage:
+        print(json.dumps(run_stage(args.run_stage, args.workdir, args.repeat)))
+        return 0
+
+    revision = git_revision()
+    report = {
+        'benchmark': 'scaling', 'version': RESULT_VERSION,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), **revision,
+        'python': platform.python_version(), 'platform': platform.platform(),
+        'repeat': args.repeat, 'scales': [], 'results': [],
+    }
+    workroot = Path(tempfile.mkdtemp(prefix="bim-scaling-"))
+    try:
+        for scale in args.scales:
+            scale = int(scale) if float(scale).is_integer() else scale
+            spec = spec_for_scale(scale)
+            workdir = workroot / f"x{scale}"
+            master = write_master(workdir / "MASTER.md", spec)
+            text = master.read_text(encoding='utf-8')
+            report['scales'].append({'scale': scale, 'volumes': spec.volumes,
+                                     'chapters': spec.chapters, 'lines': text.count('\n'),
+                                     'bytes': len(text.encode('utf-8'))})
+            print(f"📄 {scale}x: {spec.volumes} VOL × {spec.chapters_per_volume}章 "
+                  f"({text.count(chr(10))}行)", flush=True)
+            for stage in args.stages:
+                result = measure(stage, workdir, args.repeat, args.timeout)
+                report['results'].append(dict(result, scale=scale, stage=stage))
+                status = result.get('error') or f"{result['seconds']:.3f}s / {result['peak_rss_mb']:.0f}MB"
+                print(f"   {stage:<6} {status}", flush=True)
+    finally:
+        if args.keep:
+            print(f"作業ディレクトリ: {workroot}")
+        else:
+            shutil.rmtree(workroot, ignore_errors=True)
+
+    report['exponents'] = scaling_exponents(report['results'])
+    baseline = json.loads(args.compare.read_text(encoding='utf-8')) if args.compare else None
+    if baseline and baseline.get('version') != RESULT_VERSION:
+        print(f"⚠️  {args.compare} は合成原稿の形が違う版（version={baseline.get('version')}）の結果です")
+    print_report(report, baseline)
+
+    output = args.output or ROOT / ".build_cache" / "benchmarks" / \
+        f"scaling-{(revision['commit'] or 'unknown')[:7]}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+    print(f"\n💾 結果: {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+startup.py - ビルドコマンドの起動時間ベンチマーク
+
+各コマンドを別プロセスで数回実行して経過時間の中央値を測り、
+`python -X importtime` の出力から読み込みに時間のかかったモジュールを表示する。
+重いライブラリ（matplotlib, WeasyPrint, python-pptx, Pillow など）が
+読み込まれていれば警告し、予算（既定100ms）を超えたら終了コード1を返す。
+
+使い方:
+    python benchmarks/startup.py
+    python benchmarks/startup.py --runs 10 --budget-ms 100 --top 15
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+SRC = ROOT / "src"
+
+# (名前, 引数, 予算の対象か)
+COMMANDS = [
+    ("build --help", [str(SRC / "build.py"), "--help"], True),
+    ("build --status", [str(SRC / "build.py"), "--status"], True),
+    ("build split", [str(SRC / "build.py"), "split"], True),
+    ("build --status --profile draft", [str(SRC / "build.py"), "--status", "--profile", "draft"], True),
+    ("import pdf_build", ["-c", "import pdf_build"], False),
+    ("import pptx_build", ["-c", "import pptx_build"], False),
+]
+
+# 起動時に読み込まれてはいけない重いモジュール
+HEAVY_MODULES = ("matplotlib", "numpy", "japanize_matplotlib", "weasyprint", "markdown2",
+                 "pptx", "PIL")
+
+
+def run_once(args: List[str]) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable] + args, cwd=SRC, stdout=subprocess.DEVNULL,
+                   stderr=subprocess.DEVNULL, check=False)
+    return time.perf_counter() - start
+
+
+def import_times(args: List[str]) -> Dict[str, Tuple[int, int]]:
+    """-X importtime の結果 {モジュール: (自身のμs, 累積μs)}"""
+    result = subprocess.run([sys.executable, "-X", "importtime"] + args, cwd=SRC,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                            text=True, check=False)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ビルドコマンドの起動時間を計測")
+    parser.add_argument('--runs', type=int, default=5, help="各コマンドの実行回数")
+    parser.add_argument('--budget-ms', type=float, default=100.0, help="起動時間の予算（ミリ秒）")
+    parser.add_argument('--top', type=int, default=8, help="表示する遅いモジュールの数")
+    args = parser.parse_args()
+
+    baseline = statistics.median(run_once(["-c", "pass"]) for _ in range(args.runs))
+    print(f"Python自体の起動: {baseline * 1000:.1f}ms\n")
+
+    over_budget = []
+    for name, command, budgeted in COMMANDS:
+        run_once(command)  # ウォームアップ（.pycの生成・ビルドキャッシュの作成）
+        elapsed = statistics.median(run_once(command) for _ in range(args.runs))
+        times = import_times(command)
+        heavy = sorted({module.split('.')[0] for module in times
+                        if module.split('.')[0] in HEAVY_MODULES})
+
+        mark = "✓"
+        if budgeted and elapsed * 1000 > args.budget_ms:
+            mark = "✗"
+            over_budget.append(name)
+        print(f"{mark} {name:<34} {elapsed * 1000:7.1f}ms "
+              f"(import合計 {sum(t[0] for t in times.values()) / 1000:.1f}ms)")
+        if heavy:
+            print(f"    ⚠️  重いモジュールを読み込んでいる: {', '.join(heavy)}")
+        # 累積時間が大きいトップレベルのモジュール
+        slowest = sorted(times.items(), key=lambda item: item[1][1], reverse=True)[:args.top]
+        for module, (self_us, cumulative_us) in slowest:
+            print(f"    {cumulative_us / 1000:7.1f}ms  {module}")
+        print()
+
+    if over_budget:
+        print(f"❌ 予算 {args.budget_ms:.0f}ms 超過: {', '.join(over_budget)}")
+        return 1
+    print(f"✅ すべて予算 {args.budget_ms:.0f}ms 以内")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+synthetic_master.py - ベンチマーク用の合成MASTER.md
+
+実際の MASTER.md と同じ書式（VOL見出し・第N章｜・#### セクション・表・
+コードブロック・![FIG:xxx]()・---CHAPTER_END---・付録）で、
+VOL数・章数・セクション数を指定した原稿を生成する。乱数の種を固定するので、
+同じ引数からは同じ原稿ができる（コミット間で結果を比較できる）。
+
+scale=1 で実際の原稿と同じ 2 VOL・14章、同程度の分量（約1,600行・約100KB）になる。
+--scale で増やすのはVOLあたりの章数だけで、VOL数は2のまま（split_master は
+VOL1・VOL2 だけを書き出し、PDF・PPTXは VOL1 だけを作るので、VOLを増やしても
+後段の処理量は増えない）。
+
+使い方:
+    python benchmarks/synthetic_master.py --scale 10 -o /tmp/MASTER.md
+    python benchmarks/synthetic_master.py --chapters 20 --sections 6 -o /tmp/MASTER.md
+"""
+
+import argparse
+import random
+import sys
+from pathlib import Path
+from typing import List, NamedTuple, Sequence
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# 実際の原稿（scale=1 の基準）
+BASE_VOLUMES = 2
+BASE_CHAPTERS = 14
+BASE_SECTIONS = 8
+
+WORDS = [
+    "BIM", "IFC", "LOD", "属性情報", "オブジェクト", "ワークフロー", "干渉チェック", "共通データ環境",
+    "設計者", "施工者", "維持管理", "モデル", "図面", "数量", "ファミリ", "パラメータ", "レベル",
+    "壁", "床", "柱", "梁", "建具", "部屋", "集計表", "ビュー", "シート", "テンプレート", "連携",
+]
+
+DEFAULT_FIGURES = ("cad_vs_bim", "lifecycle_flow", "info_layers", "lod_matrix",
+                   "openbim_ifc", "clash_detection", "element_structure")
+
+
+class SyntheticSpec(NamedTuple):
+    """合成原稿の大きさ"""
+    volumes: int
+    chapters_per_volume: int
+    sections_per_chapter: int = BASE_SECTIONS
+    seed: int = 0
+
+    @property
+    def chapters(self) -> int:
+        return self.volumes * self.chapters_per_volume
+
+
+def spec_for_scale(scale: float, seed: int = 0) -> SyntheticSpec:
+    """実際の原稿の scale 倍の章数になる大きさ（2 VOLのまま、VOLあたりの章数を増やす）"""
+    chapters = max(1, round(BASE_CHAPTERS * scale / BASE_VOLUMES))
+    return SyntheticSpec(BASE_VOLUMES, chapters, BASE_SECTIONS, seed)
+
+
+def available_figures() -> List[str]:
+    """assets/figs にある図ID（なければ既定の一覧）"""
+    figs = sorted(path.stem for path in (ROOT / "assets" / "figs").glob("*.png"))
+    return figs or list(DEFAULT_FIGURES)
+
+
+def _sentence(rng: random.Random) -> str:
+    words = rng.sample(WORDS, 4)
+    return f"{words[0]}と{words[1]}の関係を整理し、{words[2]}を{words[3]}として扱います。"
+
+
+def _section(rng: random.Random, number: int, figures: Sequence[str], with_figure: bool) -> List[str]:
+    lines = [f"#### {number}. {rng.choice(WORDS)}の{rng.choice(['考え方', '手順', '注意点', 'ポイント'])}"]
+    lines += [_sentence(rng) + "  " for _ in range(rng.randint(3, 6))]
+    lines.append("")
+    kind = rng.random()
+    if kind < 0.3:
+        lines += ["| 項目 | 内容 | 備考 |", "|------|------|------|"]
+        lines += [f"| {rng.choice(WORDS)} | {_sentence(rng)} | {rng.randint(1, 500)} |"
+                  for _ in range(rng.randint(3, 6))]
+    elif kind < 0.5:
+        lines += ["```"] + [f"{rng.choice(WORDS)} → {rng.choice(WORDS)}" for _ in range(rng.randint(2, 5))] + ["```"]
+    else:
+        lines += [f"- {_sentence(rng)}" for _ in range(rng.randint(3, 6))]
+    if with_figure and figures:
+        lines += ["", f"![FIG:{rng.choice(figures)}]()"]
+    lines.append("")
+    return lines
+
+
+def generate_master(spec: SyntheticSpec, figures: Sequence[str] = DEFAULT_FIGURES) -> str:
+    """合成原稿の本文"""
+    rng = random.Random(spec.seed)
+    lines = ["# BIM利用技術者試験 教科書シリーズ - マスター原稿（合成）", "",
+             "> ベンチマーク用に自動生成した原稿です。", "", "---", ""]
+    for vol in range(1, spec.volumes + 1):
+        lines += [f"## VOL{vol}: 合成ボリューム{vol}", ""]
+        for chapter in range(1, spec.chapters_per_volume + 1):
+            lines += [f"### 第{chapter}章｜{rng.choice(WORDS)}と{rng.choice(WORDS)}", ""]
+            # 実際の原稿と同じく、おおむね1章に1つ図を参照する
+            figure_section = rng.randrange(spec.sections_per_chapter)
+            for section in range(1, spec.sections_per_chapter + 1):
+                lines += _section(rng, section, figures, section - 1 == figure_section)
+            lines += ["---CHAPTER_END---", ""]
+    lines += ["## 付録", "", "### A. 用語集", ""]
+    lines += [f"- **{word}**: {_sentence(rng)}" for word in WORDS]
+    lines += ["", "---END_OF_MASTER---", ""]
+    return '\n'.join(lines)
+
+
+def write_master(path: Path, spec: SyntheticSpec, figures: Sequence[str] = None) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(generate_master(spec, figures or available_figures()), encoding='utf-8')
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ベンチマーク用の合成MASTER.mdを生成")
+    parser.add_argument('-o', '--output', type=Path, required=True, help="出力先")
+    parser.add_argument('--scale', type=float, default=1.0, help="実際の原稿に対する章数の倍率")
+    parser.add_argument('--volumes', type=int, help="VOL数（既定2。split_master が処理するのは VOL1・VOL2 だけ）")
+    parser.add_argument('--chapters', type=int, help="VOLあたりの章数（--scale より優先）")
+    parser.add_argument('--sections', type=int, default=BASE_SECTIONS, help="章あたりのセクション数")
+    parser.add_argument('--seed', type=int, default=0, help="乱数の種")
+    args = parser.parse_args()
+
+    spec = spec_for_scale(args.scale, args.seed)
+    spec = spec._replace(volumes=args.volumes or spec.volumes,
+                         chapters_per_volume=args.chapters or spec.chapters_per_volume,
+                         sections_per_chapter=args.sections)
+    write_master(args.output, spec)
+    lines = args.output.read_text(encoding='utf-8').count('\n')
+    print(f"✓ {args.output}: {spec.volumes} VOL × {spec.chapters_per_volume}章 × "
+          f"{spec.sections_per_chapter}セクション ({lines}行)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -23,23 +23,24 @@ if [ ! -d "$DOCS_FIGS_DIR" ]; then
     mkdir -p "$DOCS_FIGS_DIR"
 fi
 
-# 図表ファイル一覧
+# 図表一覧（PNGとSVGの両方をコピーする）
+FORMATS=("png" "svg")
 DIAGRAMS=(
-    "cad_vs_bim.png"
-    "info_layers.png"
-    "lifecycle_flow.png"
-    "lod_matrix.png"
-    "element_structure.png"
-    "openbim_ifc.png"
-    "4d_5d_bim.png"
-    "bep_flow.png"
-    "worksharing_concept.png"
-    "family_hierarchy_detail.png"
-    "clash_detection.png"
-    "ng_ok_level_mistake.png"
-    "level_mistake_detail.png"
-    "wall_mistake_patterns.png"
-    "floor_mistake_examples.png"
+    "cad_vs_bim"
+    "info_layers"
+    "lifecycle_flow"
+    "lod_matrix"
+    "element_structure"
+    "openbim_ifc"
+    "4d_5d_bim"
+    "bep_flow"
+    "worksharing_concept"
+    "family_hierarchy_detail"
+    "clash_detection"
+    "ng_ok_level_mistake"
+    "level_mistake_detail"
+    "wall_mistake_patterns"
+    "floor_mistake_examples"
 )
 
 # ファイルコピー
@@ -48,35 +49,40 @@ echo "📋 図表ファイルをコピー..."
 COPIED=0
 MISSING=0
 
+TOTAL=$((${#DIAGRAMS[@]} * ${#FORMATS[@]}))
+
 for diagram in "${DIAGRAMS[@]}"; do
-    SOURCE="$FIGS_DIR/$diagram"
-    DEST="$DOCS_FIGS_DIR/$diagram"
-    
-    if [ -f "$SOURCE" ]; then
-        cp "$SOURCE" "$DEST"
-        echo "  ✅ $diagram"
-        COPIED=$((COPIED + 1))
-    else
-        echo "  ⚠️  $diagram (未作成)"
-        MISSING=$((MISSING + 1))
-    fi
+    for format in "${FORMATS[@]}"; do
+        SOURCE="$FIGS_DIR/$diagram.$format"
+        DEST="$DOCS_FIGS_DIR/$diagram.$format"
+        
+        if [ -f "$SOURCE" ]; then
+            cp "$SOURCE" "$DEST"
+            # コピーしたファイルだけをステージする（存在しない形式をglobで渡さない）
+            git -C "$WORK_DIR" add "$SOURCE" "$DEST"
+            echo "  ✅ $diagram.$format"
+            COPIED=$((COPIED + 1))
+        else
+            echo "  ⚠️  $diagram.$format (未作成)"
+            MISSING=$((MISSING + 1))
+        fi
+    done
 done
 
 echo ""
 echo "======================================"
 echo "📊 コピー結果"
-echo "  成功: $COPIED / ${#DIAGRAMS[@]}"
-echo "  未作成: $MISSING / ${#DIAGRAMS[@]}"
+echo "  成功: $COPIED / $TOTAL"
+echo "  未作成: $MISSING / $TOTAL"
 
 # Git操作
 if [ $COPIED -gt 0 ]; then
     echo ""
     echo "📦 Gitにコミット..."
     cd "$WORK_DIR"
-    git add assets/figs/*.png docs/assets/figs/*.png
     
     # コミットメッセージ
-    COMMIT_MSG="feat: 外部ツールで作成した高品質図解を追加 ($COPIED/$((${#DIAGRAMS[@]})))"
+    COMMIT_MSG="feat: 外部ツールで作成した高品質図解を追加 ($COPIED/$TOTAL)"
     git commit -m "$COMMIT_MSG" || echo "⚠️  コミットするファイルがありません"
     
     echo ""
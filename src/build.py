@@ -7,26 +7,140 @@ build.py - BIM教科書シリーズ 一括ビルドスクリプト
 1. MASTER.mdを分割 → manuscript/
 2. 図を自動生成 → assets/figs/
 3. PDF/PPTXを生成 → dist/
+
+各成果物は依存グラフのターゲットとして宣言され、入力（原稿・生成関数の
+ソース）が前回ビルドから変わっていないものはスキップされる。
+
+使い方:
+    python src/build.py                  # 古いターゲットだけをビルド
+    python src/build.py pdf:vol1_2kyu    # 指定ターゲット（と依存先）だけ
+    python src/build.py 'fig:*' --force  # 全図を強制的に再生成
+    python src/build.py --status         # 各ターゲットの状態を表示
+    python src/build.py --jobs 8         # 独立したターゲットを8プロセスで並列実行
+    python src/build.py --pdf-jobs 8     # PDFの各章を8プロセスで並列にレイアウト
+    python src/build.py --profile draft  # 確認用の高速ビルド（低解像度の図・PDFのみ）
+    python src/build.py --watch          # 変更を監視し、影響を受けるターゲットだけ再ビルド
+    python src/build.py --trace out.json # ステージごとのタイムラインを Chrome trace 形式で出力
+    python src/build.py --profile-stage 'fig:*'  # 指定ステージを cProfile で計測
 """
 
+import argparse
+import fnmatch
 import sys
 import time
+from functools import lru_cache, partial
 from pathlib import Path
+from typing import List
 
 # 同じディレクトリのモジュールをインポート
-from utils import ProjectPaths, logger, get_project_info
-from split_master import split_master_to_chapters
-# from diagrams import generate_all_diagrams  # 旧版
-from diagrams_professional import ProfessionalDiagramGenerator  # 新版
-from pdf_build import build_all_pdfs
+import tracing
+from utils import ProjectPaths, configure_logging, logger, get_project_info
+from build_cache import load_manuscript, report_cache_stats
+from build_graph import BuildGraph, BuildFailed, Target, TargetError
+from build_stages import run_split, run_figure, run_pdf, run_pptx
+from figure_index import load_figure_index, GENERATOR_PREFIX
+from profiles import BuildProfile, DEFAULT_PROFILE, PROFILES, get_profile
+from split_master import manifest_outputs
 
 
-def generate_all_diagrams():
-    """新しいプロフェッショナル図解を生成"""
-    paths = ProjectPaths()
-    generator = ProfessionalDiagramGenerator(paths.figs)
-    generator.generate_all()
-    return len(list(paths.figs.glob('*.png')))
+@lru_cache(maxsize=None)
+def package_version(name: str) -> str:
+    """インストール済みパッケージのバージョン（import せずに取得）"""
+    from importlib import metadata  # 読み込みに時間がかかるので、必要になったときだけ
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return 'none'
+
+
+def figure_stamp(source_digest: str, profile: BuildProfile) -> str:
+    """図ターゲットのstamp（生成関数のハッシュ・matplotlibのバージョン・プロファイル）"""
+    return f"{source_digest}:{package_version('matplotlib')}:{profile.figure_settings}"
+
+
+def volume_inputs(paths: ProjectPaths, vol_dir: Path, fig_files: List[Path],
+                  builder: str) -> List[Path]:
+    """VOL成果物の入力（分割後に評価する）"""
+    return sorted(vol_dir.glob("*.md")) + fig_files + [
+        paths.src / builder, paths.src / "utils.py", paths.src / "renditions.py",
+        paths.src / "profiles.py", paths.src / "html_cache.py"]
+
+
+def create_build_graph(paths: ProjectPaths, profile: BuildProfile, pdf_jobs: int = 1) -> BuildGraph:
+    """
+    ビルドターゲットの依存グラフを作成
+
+    MASTER.md → split → pdf:<VOL> / pptx:<VOL>
+    diagrams_professional.py の generate_* → fig:<名前> → pdf / pptx
+    図・成果物の出力先、対象のVOLと成果物の種類はプロファイルに従う。
+    pdf_jobs > 1 の場合、PDFターゲットは章ごとに並列にレイアウトする。
+    """
+    graph = BuildGraph(profile.state_file(paths), root=paths.root)
+    src = paths.src
+    figs_dir = profile.figures_dir(paths)
+    dist_dir = profile.dist_dir(paths)
+
+    graph.add(Target(
+        'split', run_split,
+        inputs=[paths.master_file, src / "split_master.py", src / "utils.py",
+                src / "build_cache.py"],
+        outputs=lambda: manifest_outputs(paths),
+        label="MASTER.md を章ファイルに分割"
+    ))
+
+    # 図: generate_* メソッドごとに1ターゲット
+    # MASTER.mdで参照されていない図は、明示的に指定したときだけ生成する
+    manuscript = load_manuscript(paths)
+    referenced = set(manuscript.figure_refs)
+    figure_targets = {}  # 図ID → ターゲット名
+    figure_index = load_figure_index(src / "diagrams_professional.py",
+                                     paths.cache / "figure_index.json")
+    for method, source in figure_index.items():
+        name = f"fig:{method[len(GENERATOR_PREFIX):]}"
+        graph.add(Target(
+            name, run_figure, (method, profile.name),
+            inputs=[src / "image_optimize.py", src / "profiles.py"],
+            outputs=[figs_dir / f"{fig_id}.{fmt}"
+                     for fig_id in source.outputs for fmt in profile.figure_formats],
+            stamp=partial(figure_stamp, source.digest, profile),
+            label=f"図を生成 ({', '.join(source.outputs)})",
+            default=bool(referenced.intersection(source.outputs))
+        ))
+        for fig_id in source.outputs:
+            figure_targets[fig_id] = name
+
+    unimplemented = [fig_id for fig_id in manuscript.figure_refs if fig_id not in figure_targets]
+    unreferenced = [fig_id for fig_id in figure_targets if fig_id not in referenced]
+    for fig_id in unimplemented:
+        logger.warning(f"⚠️  未実装の図: {fig_id}（MASTER.mdで参照されているが生成メソッドがない）")
+    if unreferenced:
+        logger.info(f"ℹ️  参照されていない図: {', '.join(unreferenced)}")
+
+    # VOLごとの成果物: 章ファイルと、そのVOLが参照する図に依存
+    builders = {
+        'pdf': (run_pdf, "pdf_build.py", "PDF"),
+        'pptx': (run_pptx, "pptx_build.py", "PPTX"),
+    }
+    for volume_name in profile.volumes:
+        vol_key, vol_dir = paths.volumes[volume_name]
+        fig_ids = [fig for ch in manuscript.volumes.get(vol_key, []) for fig in ch.figures]
+        fig_deps = sorted({figure_targets[fig] for fig in fig_ids if fig in figure_targets})
+        fig_files = [figs_dir / f"{fig}.{fmt}"
+                     for fig in dict.fromkeys(fig_ids) for fmt in profile.figure_formats]
+
+        for kind in profile.deliverables:
+            action, builder, kind_label = builders[kind]
+            args = (volume_name, profile.name, pdf_jobs) if kind == 'pdf' else (volume_name, profile.name)
+            graph.add(Target(
+                f"{kind}:{volume_name}", action, args,
+                inputs=partial(volume_inputs, paths, vol_dir, fig_files, builder),
+                outputs=[dist_dir / f"{volume_name}.{kind}"],
+                deps=['split'] + fig_deps,
+                stamp=profile.document_settings,
+                label=f"{vol_key} {kind_label}を生成"
+            ))
+
+    return graph
 
 
 def print_banner():
@@ -41,7 +155,7 @@ def print_banner():
 ╚══════════════════════════════════════════════════════════════╝
 """
     print(banner)
-    
+
     info = get_project_info()
     print(f"プロジェクト: {info['name']}")
     print(f"バージョン: {info['version']}")
@@ -49,37 +163,114 @@ def print_banner():
     print()
 
 
-def main():
+def print_status(graph: BuildGraph, patterns):
+    """ターゲットの状態を表示"""
+    for target, stale, reason in graph.status(patterns):
+        mark = "🔨" if stale else "✅"
+        print(f"{mark} {target.name:<32} {reason}")
+
+
+def enable_stage_profiling(graph: BuildGraph, patterns: List[str], output_dir: Path) -> List[str]:
+    """
+    パターンに一致するターゲットを cProfile の下で実行するようにする
+
+    計測対象は最新でも再実行する（前回のシグネチャを忘れさせる）。図は図キャッシュを
+    使わずに描画する（キャッシュからの復元ではなく描画そのものを計測する）。
+    PDFの章レイアウトは --pdf-jobs > 1 だとワーカープロセスで動くので計測に含まれない。
+    """
+    from profiling import profile_call
+
+    profiled = []
+    for target in graph.targets.values():
+        if not any(fnmatch.fnmatchcase(target.name, pattern) for pattern in patterns):
+            continue
+        action = target.action
+        if action is run_figure:
+            action = partial(run_figure, use_cache=False)
+        elif action is run_pdf and len(target.args) > 2 and target.args[2] > 1:
+            logger.warning(f"⚠️  {target.name}: 章のレイアウトはワーカープロセスで動くため計測されません"
+                           f"（--pdf-jobs 1 で全体を計測できます）")
+        target.action = partial(profile_call, action, output_dir, target.name)
+        graph.state.signatures.pop(target.name, None)
+        profiled.append(target.name)
+    if not profiled:
+        logger.warning(f"プロファイル対象のターゲットがありません: {', '.join(patterns)}")
+    return profiled
+
+
+def save_trace(path: Path):
+    """記録したタイムラインを保存し、時間のかかったスパンを表示"""
+    events = tracing.stop()
+    tracing.write_trace(path, events)
+    print(f"🧵 トレース: {path}（{sum(1 for e in events if e.get('ph') == 'X')}スパン）")
+    for line in tracing.summarize(events):
+        print(f"   {line}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="BIM教科書シリーズ 一括ビルド（変更のあった成果物だけを再生成）"
+    )
+    parser.add_argument('targets', nargs='*',
+                        help="ビルドするターゲット（例: split, 'fig:*', pdf:vol1_2kyu）。省略時はすべて")
+    parser.add_argument('--force', action='store_true',
+                        help="最新のターゲットも再ビルドする")
+    parser.add_argument('--status', action='store_true',
+                        help="ビルドせずに各ターゲットの状態を表示する")
+    parser.add_argument('--profile', choices=list(PROFILES), default=DEFAULT_PROFILE,
+                        help="ビルドプロファイル（draft: 確認用の高速ビルド / release: 配布用）")
+    parser.add_argument('-j', '--jobs', type=int, default=1, metavar='N',
+                        help="独立したターゲット（図・VOLごとのPDF/PPTX）をNプロセスで並列実行する")
+    parser.add_argument('--pdf-jobs', type=int, default=1, metavar='N',
+                        help="PDFの表紙・目次・各章をNプロセスで並列にレイアウトする（pypdf が必要）")
+    parser.add_argument('--watch', action='store_true',
+                        help="ビルド後も原稿・図の生成コードを監視し、変更のたびに再ビルドする")
+    parser.add_argument('--poll', action='store_true',
+                        help="--watch で inotify を使わずポーリングで監視する")
+    parser.add_argument('--trace', type=Path, metavar='FILE',
+                        help="ステージ・図・VOL・章ごとの所要時間を Chrome trace 形式(JSON)で保存する"
+                             "（chrome://tracing や ui.perfetto.dev で表示）")
+    parser.add_argument('--profile-stage', action='append', default=[], metavar='PATTERN',
+                        help="一致するターゲット（例: 'fig:*', pdf:vol1_2kyu）を cProfile で計測し、"
+                             "pstats と collapsed stack を保存する（複数指定可）")
+    parser.add_argument('--profile-dir', type=Path, metavar='DIR',
+                        help="--profile-stage の出力先（既定: .build_cache/profiles）")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
     """メインビルド処理"""
+    args = parse_args(argv)
+    configure_logging()
     start_time = time.time()
-    
+    paths = ProjectPaths()
+    profile = get_profile(args.profile)
+    create_graph = partial(create_build_graph, pdf_jobs=max(1, args.pdf_jobs))
+
+    if args.status:
+        print_status(create_graph(paths, profile), args.targets)
+        return 0
+
+    if args.watch:
+        from watch import watch
+        return watch(paths, profile, args.targets, max(1, args.jobs), create_graph,
+                     force_polling=args.poll)
+
     print_banner()
-    
+
+    if args.trace:
+        tracing.start('build')
     try:
-        # 1. 原稿分割
-        logger.info("=" * 70)
-        logger.info("STEP 1/3: MASTER.md を章ファイルに分割")
-        logger.info("=" * 70)
-        vol1_chapters, vol2_chapters = split_master_to_chapters()
-        logger.info(f"✅ 分割完了: VOL1={len(vol1_chapters)}章, VOL2={len(vol2_chapters)}章\n")
-        
-        # 2. 図生成
-        logger.info("=" * 70)
-        logger.info("STEP 2/3: 図表を自動生成")
-        logger.info("=" * 70)
-        fig_count = generate_all_diagrams()
-        logger.info(f"✅ 図生成完了: {fig_count}個\n")
-        
-        # 3. PDF生成
-        logger.info("=" * 70)
-        logger.info("STEP 3/3: PDF教科書を生成")
-        logger.info("=" * 70)
-        build_all_pdfs()
-        logger.info("✅ PDF生成完了\n")
-        
+        with tracing.span('create_build_graph', 'graph'):
+            graph = create_graph(paths, profile)
+        if args.profile_stage:
+            enable_stage_profiling(graph, args.profile_stage,
+                                   args.profile_dir or paths.cache / "profiles")
+        result = graph.run(args.targets, force=args.force, jobs=max(1, args.jobs))
+
         # 完了メッセージ
         elapsed_time = time.time() - start_time
-        
+
         print()
         print("╔══════════════════════════════════════════════════════════════╗")
         print("║                                                              ║")
@@ -87,33 +278,47 @@ def main():
         print("║                                                              ║")
         print("╚══════════════════════════════════════════════════════════════╝")
         print()
-        
-        paths = ProjectPaths()
-        
-        print("📦 生成された成果物:")
+
+        print(f"🧭 プロファイル: {profile.name}")
+        print(f"🔨 ビルド: {len(result.built)}件 / ⏭️  最新のためスキップ: {len(result.skipped)}件")
+        for name in result.built:
+            print(f"   • {name}")
         print()
-        print("📄 原稿 (Markdown):")
+        print("📦 成果物:")
         print(f"   • {paths.vol1_dir}/ - VOL1 (2級対応) 章ファイル")
         print(f"   • {paths.vol2_dir}/ - VOL2 (準1級対応) 章ファイル")
+        figs_dir = profile.figures_dir(paths)
+        print(f"   • {figs_dir}/ - 自動生成された図 ({len(list(figs_dir.glob('*.png')))}個)")
+        for volume_name in profile.volumes:
+            outputs = ' / '.join(f".{kind}" for kind in profile.deliverables)
+            print(f"   • {profile.dist_dir(paths)}/{volume_name} {outputs}")
         print()
-        print("🖼️  図表 (PNG):")
-        print(f"   • {paths.figs}/ - 自動生成された図 ({fig_count}個)")
-        print()
-        print("📚 成果物 (PDF):")
-        print(f"   • {paths.dist}/vol1_2kyu.pdf - 2級教科書 (PDF, 約30ページ)")
-        print(f"   • {paths.dist}/vol2_jun1kyu.pdf - 準1級教科書 (PDF, 約35ページ)")
-        print()
-        print(f"⏱️  処理時間: {elapsed_time:.2f}秒")
+        report_cache_stats()
+        print(f"⏱️  処理時間: {elapsed_time:.2f}秒 "
+              f"(ビルド {result.elapsed:.2f}秒 / CPU時間合計 {result.cpu_time:.2f}秒, "
+              f"並列度 {result.cpu_time / result.elapsed if result.elapsed else 0:.1f}x, jobs={args.jobs})")
         print()
         print("=" * 70)
-        
+
         return 0
-        
+
+    except BuildFailed as e:
+        logger.error(f"❌ ビルド中にエラーが発生しました: {e}")
+        logger.error("   成功したターゲットは記録済みです。再実行すると続きからビルドします")
+        if isinstance(e.error, TargetError):
+            print(e.error.formatted_traceback, file=sys.stderr)
+        else:
+            import traceback
+            traceback.print_exception(type(e.error), e.error, e.error.__traceback__)
+        return 1
     except Exception as e:
         logger.error(f"❌ ビルド中にエラーが発生しました: {e}")
         import traceback
         traceback.print_exc()
         return 1
+    finally:
+        if args.trace:
+            save_trace(args.trace)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+build_cache.py - ビルドキャッシュ（解析済み原稿の永続化・ヒット率集計）
+"""
+
+import hashlib
+import os
+import pickle
+import shutil
+import time
+import zlib
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from utils import (
+    ProjectPaths,
+    ChapterInfo,
+    parse_master_volumes,
+    logger
+)
+
+# キャッシュ形式のバージョン（ChapterInfoやパーサの仕様を変えたら上げる）
+MANUSCRIPT_CACHE_VERSION = 1
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(path: Path) -> str:
+    """ファイル内容のSHA-256ハッシュ（チャンク単位で読み込む）"""
+    h = hashlib.sha256()
+    with path.open('rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def text_digest(text: str) -> str:
+    """文字列のSHA-256ハッシュ"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class CacheStats:
+    """キャッシュのヒット/ミス回数"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+
+    def hit(self):
+        self.hits += 1
+
+    def miss(self):
+        self.misses += 1
+
+    def __repr__(self):
+        return f"<CacheStats {self.name}: hit={self.hits} miss={self.misses}>"
+
+
+_cache_stats: Dict[str, CacheStats] = {}
+
+
+def get_cache_stats(name: str) -> CacheStats:
+    """名前付きのキャッシュ統計を取得（なければ作成）"""
+    if name not in _cache_stats:
+        _cache_stats[name] = CacheStats(name)
+    return _cache_stats[name]
+
+
+def report_cache_stats():
+    """全キャッシュのヒット/ミス回数をログ出力"""
+    for stats in _cache_stats.values():
+        if stats.hits or stats.misses:
+            logger.info(f"📦 キャッシュ[{stats.name}]: ヒット {stats.hits} / ミス {stats.misses}")
+
+
+def entry_size(entry: Path) -> int:
+    """キャッシュエントリのバイト数（ディレクトリなら中のファイルの合計。ハードリンクは1回だけ数える）"""
+    if not entry.is_dir():
+        return entry.stat().st_size
+    inodes = {(stat.st_ino, stat.st_size) for stat in (path.stat() for path in entry.iterdir())}
+    return sum(size for _, size in inodes)
+
+
+def remove_entry(entry: Path):
+    """キャッシュエントリ（ファイルまたはディレクトリ）を削除"""
+    if entry.is_dir():
+        shutil.rmtree(entry, ignore_errors=True)
+    else:
+        entry.unlink()
+
+
+def prune_directory(root: Path, pattern: str, max_bytes: int, max_age_days: float,
+                    remove: Callable[[Path], None] = remove_entry) -> int:
+    """
+    root 以下の pattern に一致するエントリを最近使われた順（更新時刻の新しい順）に見て、
+    最終使用から max_age_days を過ぎたものと、合計が max_bytes を超える分を削除する
+
+    各キャッシュはヒットしたエントリの更新時刻を新しくしておく（os.utime）。
+    期限切れで削除したエントリは合計サイズに数えない。
+
+    Returns:
+        削除した件数
+    """
+    entries = []
+    for entry in root.glob(pattern):
+        try:
+            entries.append((entry.stat().st_mtime, entry_size(entry), entry))
+        except OSError:
+            continue
+    entries.sort(reverse=True)  # 最近使われた順
+
+    cutoff = time.time() - max_age_days * 86400
+    removed, total = 0, 0
+    for mtime, size, entry in entries:
+        if mtime >= cutoff and total + size <= max_bytes:
+            total += size
+            continue
+        try:
+            remove(entry)
+            removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+def touch(path: Path):
+    """最終使用時刻として更新時刻を新しくする（失敗しても無視）"""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+class ParsedManuscript(NamedTuple):
+    """解析済みの原稿"""
+    digest: str
+    volumes: Dict[str, List[ChapterInfo]]
+    figure_refs: List[str]
+
+    @property
+    def vol1(self) -> List[ChapterInfo]:
+        return self.volumes.get("VOL1", [])
+
+    @property
+    def vol2(self) -> List[ChapterInfo]:
+        return self.volumes.get("VOL2", [])
+
+
+class ManuscriptCache:
+    """
+    MASTER.mdの解析結果キャッシュ
+
+    MASTER.mdの内容ハッシュをキーに、章リストと図の参照を
+    zlib圧縮したpickleとして cache_dir に保存する。
+    同一プロセス内ではメモリ上の結果も再利用する。
+    """
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = cache_dir
+        self.stats = get_cache_stats('manuscript')
+        self.last_source = ''  # 'memory' / 'disk' / 'parse'
+        self._memory: Dict[str, ParsedManuscript] = {}
+
+    def _cache_file(self, digest: str) -> Path:
+        return self.cache_dir / f"manuscript-{digest[:16]}.bin"
+
+    def load(self, master_path: Path) -> ParsedManuscript:
+        """MASTER.mdを（必要なら）解析して返す"""
+        if not master_path.exists():
+            raise FileNotFoundError(f"MASTER.md が見つかりません: {master_path}")
+
+        digest = file_digest(master_path)
+
+        if digest in self._memory:
+            self.stats.hit()
+            self.last_source = 'memory'
+            return self._memory[digest]
+
+        manuscript = self._read(digest)
+        if manuscript is not None:
+            self.stats.hit()
+            self.last_source = 'disk'
+            logger.info(f"原稿キャッシュを使用: {self._cache_file(digest).name}")
+        else:
+            self.stats.miss()
+            self.last_source = 'parse'
+            volumes = parse_master_volumes(master_path)
+            all_chapters = [ch for chapters in volumes.values() for ch in chapters]
+            figure_refs = list(dict.fromkeys(
+                fig for ch in all_chapters for fig in ch.figures
+            ))
+            manuscript = ParsedManuscript(digest, volumes, figure_refs)
+            self._write(manuscript)
+
+        self._memory = {digest: manuscript}
+        return manuscript
+
+    def _read(self, digest: str) -> Optional[ParsedManuscript]:
+        cache_file = self._cache_file(digest)
+        if not cache_file.exists():
+            return None
+        try:
+            payload = pickle.loads(zlib.decompress(cache_file.read_bytes()))
+        except Exception as e:
+            logger.warning(f"原稿キャッシュの読み込みに失敗: {cache_file.name} - {e}")
+            return None
+
+        if payload.get('version') != MANUSCRIPT_CACHE_VERSION or payload.get('digest') != digest:
+            return None
+
+        volumes = {
+            vol_name: [
+                ChapterInfo(vol_name, num, title, content, list(figures))
+                for num, title, content, figures in chapters
+            ]
+            for vol_name, chapters in payload['volumes']
+        }
+        return ParsedManuscript(digest, volumes, list(payload['figure_refs']))
+
+    def _write(self, manuscript: ParsedManuscript):
+        # ChapterInfoそのものではなく素のタプルで保存（クラス変更に強くする）
+        payload = {
+            'version': MANUSCRIPT_CACHE_VERSION,
+            'digest': manuscript.digest,
+            'volumes': [
+                (vol_name, [
+                    (ch.chapter_num, ch.title, ch.content, tuple(ch.figures))
+                    for ch in chapters
+                ])
+                for vol_name, chapters in manuscript.volumes.items()
+            ],
+            'figure_refs': tuple(manuscript.figure_refs),
+        }
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        # 古い世代を削除
+        for old_file in self.cache_dir.glob("manuscript-*.bin"):
+            old_file.unlink()
+
+        cache_file = self._cache_file(manuscript.digest)
+        tmp_file = cache_file.with_suffix('.tmp')
+        tmp_file.write_bytes(zlib.compress(pickle.dumps(payload, pickle.HIGHEST_PROTOCOL)))
+        tmp_file.replace(cache_file)
+
+
+_manuscript_caches: Dict[Path, ManuscriptCache] = {}
+
+
+def load_manuscript(paths: Optional[ProjectPaths] = None) -> ParsedManuscript:
+    """プロジェクトのMASTER.mdをキャッシュ経由で取得"""
+    if paths is None:
+        paths = ProjectPaths()
+
+    cache = _manuscript_caches.get(paths.cache)
+    if cache is None:
+        cache = _manuscript_caches[paths.cache] = ManuscriptCache(paths.cache)
+
+    manuscript = cache.load(paths.master_file)
+    if cache.last_source != 'memory':
+        logger.info(f"VOL1: {len(manuscript.vol1)}章, VOL2: {len(manuscript.vol2)}章 "
+                    f"(原稿キャッシュ ヒット {cache.stats.hits} / ミス {cache.stats.misses})")
+    return manuscript
+
+
+def parse_master_markdown_cached(paths: Optional[ProjectPaths] = None
+                                 ) -> Tuple[List[ChapterInfo], List[ChapterInfo]]:
+    """parse_master_markdown のキャッシュ版（VOL1, VOL2 を返す）"""
+    manuscript = load_manuscript(paths)
+    return manuscript.vol1, manuscript.vol2
@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+build_graph.py - 依存グラフ型ビルドエンジン
+
+ターゲット（入力ファイル → 出力ファイル + 実行関数）を宣言的に登録し、
+入力ハッシュが前回成功時と同じで出力も揃っているターゲットはスキップする。
+状態はターゲットが成功するたびに保存するので、途中で失敗しても
+再実行時は失敗したところから再開できる。
+jobs > 1 を指定すると、互いに独立なターゲットをプロセスプールで並列実行する。
+"""
+
+import contextlib
+import fnmatch
+import hashlib
+import io
+import json
+import logging
+import time
+import traceback
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import tracing
+from utils import logger
+from build_cache import file_digest
+
+STATE_VERSION = 1
+
+PathSource = Union[Sequence[Path], Callable[[], Sequence[Path]]]
+StampSource = Union[str, Callable[[], str]]
+
+
+class Target:
+    """ビルドターゲット"""
+
+    def __init__(self, name: str, action: Callable, args: tuple = (),
+                 inputs: PathSource = (), outputs: PathSource = (),
+                 deps: Sequence[str] = (), stamp: StampSource = '', label: str = '',
+                 default: bool = True):
+        self.name = name
+        self.action = action  # モジュールレベル関数（並列実行時にpickleするため）
+        self.args = args
+        self.inputs = inputs  # 依存先の実行後に評価したい場合は関数で渡す
+        self.outputs = outputs
+        self.deps = list(deps)
+        self.stamp = stamp  # ファイル以外の入力（生成関数のソースハッシュ等。関数なら判定時に評価）
+        self.label = label or name
+        self.default = default  # ターゲット未指定のビルドに含めるか
+
+    def input_paths(self) -> List[Path]:
+        return list(self.inputs() if callable(self.inputs) else self.inputs)
+
+    def output_paths(self) -> List[Path]:
+        return list(self.outputs() if callable(self.outputs) else self.outputs)
+
+    def stamp_value(self) -> str:
+        return self.stamp() if callable(self.stamp) else self.stamp
+
+    def __repr__(self):
+        return f"<Target {self.name}>"
+
+
+class BuildFailed(Exception):
+    """ターゲットの実行に失敗"""
+
+    def __init__(self, target: Target, error: BaseException):
+        super().__init__(f"{target.name}: {error}")
+        self.target = target
+        self.error = error
+
+
+class BuildResult:
+    """ビルド結果"""
+
+    def __init__(self):
+        self.built: List[str] = []
+        self.skipped: List[str] = []
+        self.failed: List[str] = []
+        self.elapsed = 0.0
+        self.cpu_time = 0.0  # 親プロセスとワーカーのCPU時間の合計
+
+    @property
+    def ok(self) -> bool:
+        return not self.failed
+
+
+class BuildState:
+    """ターゲットのシグネチャとファイルハッシュの記録"""
+
+    def __init__(self, state_file: Path):
+        self.state_file = state_file
+        self.signatures: Dict[str, str] = {}
+        # path -> [mtime_ns, size, digest]（stat が同じならハッシュを再計算しない）
+        self.files: Dict[str, list] = {}
+        self._saved = ''  # 最後に読み書きした内容（変化がなければ書き込まない）
+        self.load()
+
+    def load(self):
+        if not self.state_file.exists():
+            return
+        try:
+            text = self.state_file.read_text(encoding='utf-8')
+            data = json.loads(text)
+        except (OSError, ValueError) as e:
+            logger.warning(f"ビルド状態の読み込みに失敗: {e}")
+            return
+        if data.get('version') != STATE_VERSION:
+            return
+        self.signatures = data.get('targets', {})
+        self.files = data.get('files', {})
+        self._saved = text
+
+    def save(self):
+        data = {'version': STATE_VERSION, 'targets': self.signatures, 'files': self.files}
+        text = json.dumps(data, ensure_ascii=False)
+        if text == self._saved:
+            return
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.state_file.with_suffix('.tmp')
+        tmp_file.write_text(text, encoding='utf-8')
+        tmp_file.replace(self.state_file)
+        self._saved = text
+
+    def digest(self, path: Path) -> str:
+        """ファイルのハッシュ（mtime・サイズが前回と同じなら記録値を使う）"""
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return 'missing'
+        key = str(path)
+        cached = self.files.get(key)
+        if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return cached[2]
+        digest = file_digest(path)
+        self.files[key] = [st.st_mtime_ns, st.st_size, digest]
+        return digest
+
+
+class BuildGraph:
+    """ターゲットの依存グラフ"""
+
+    def __init__(self, state_file: Path, root: Optional[Path] = None):
+        self.targets: Dict[str, Target] = {}
+        self.state = BuildState(state_file)
+        self.root = root
+
+    def add(self, target: Target) -> Target:
+        if target.name in self.targets:
+            raise ValueError(f"ターゲット名が重複しています: {target.name}")
+        self.targets[target.name] = target
+        return target
+
+    def select(self, patterns: Optional[Iterable[str]] = None) -> List[Target]:
+        """
+        パターン（fnmatch形式）に一致するターゲットと依存先をトポロジカル順で返す
+
+        パターン未指定の場合は default=True のターゲットが対象
+        """
+        if patterns:
+            roots = []
+            for pattern in patterns:
+                matched = [name for name in self.targets if fnmatch.fnmatchcase(name, pattern)]
+                if not matched:
+                    raise KeyError(f"ターゲットが見つかりません: {pattern}")
+                roots.extend(matched)
+        else:
+            roots = [name for name, target in self.targets.items() if target.default]
+
+        ordered: List[Target] = []
+        visiting = set()
+        done = set()
+
+        def visit(name: str):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"依存関係が循環しています: {name}")
+            visiting.add(name)
+            for dep in self.targets[name].deps:
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+            ordered.append(self.targets[name])
+
+        for name in roots:
+            visit(name)
+        return ordered
+
+    def _display_path(self, path: Path) -> str:
+        if self.root is not None:
+            try:
+                return path.relative_to(self.root).as_posix()
+            except ValueError:
+                pass
+        return str(path)
+
+    def signature(self, target: Target) -> str:
+        """入力ファイルのハッシュとstampから算出したシグネチャ"""
+        h = hashlib.sha256()
+        h.update(target.stamp_value().encode('utf-8'))
+        for path in sorted(target.input_paths()):
+            h.update(b'\0')
+            h.update(self._display_path(path).encode('utf-8'))
+            h.update(self.state.digest(path).encode('ascii'))
+        return h.hexdigest()
+
+    def check(self, target: Target) -> Tuple[bool, str, str]:
+        """
+        最新かどうかを判定
+
+        Returns:
+            (stale, reason, signature)
+        """
+        signature = self.signature(target)
+        previous = self.state.signatures.get(target.name)
+        if previous is None:
+            return True, "未ビルド", signature
+        if previous != signature:
+            return True, "入力が変更された", signature
+        missing = [p for p in target.output_paths() if not p.exists()]
+        if missing:
+            return True, f"出力がない: {self._display_path(missing[0])}", signature
+        return False, "最新", signature
+
+    def status(self, patterns: Optional[Iterable[str]] = None) -> List[Tuple[Target, bool, str]]:
+        """各ターゲットの状態（依存先が未ビルドなら下流も古いとみなす）"""
+        rows = []
+        stale_names = set()
+        for target in self.select(patterns):
+            stale, reason, _ = self.check(target)
+            if not stale and any(dep in stale_names for dep in target.deps):
+                stale, reason = True, "依存先が古い"
+            if stale:
+                stale_names.add(target.name)
+            rows.append((target, stale, reason))
+        return rows
+
+    def _start(self, target: Target, force: bool) -> Tuple[bool, str]:
+        """ターゲットの実行要否を判定してログを出す（返り値: (実行するか, シグネチャ)）"""
+        # 依存先の実行後に判定するので、その出力の変化も反映される
+        stale, reason, signature = self.check(target)
+        if force:
+            stale, reason = True, "強制"
+        if stale:
+            logger.info(f"▶ {target.label} [{target.name}] - {reason}")
+        else:
+            logger.debug(f"  = {target.name} (最新)")
+        return stale, signature
+
+    def _finish(self, target: Target, signature: str, result: BuildResult, wall: float):
+        # 実行前の入力で記録する（実行中に編集された入力は次回検出される）
+        self.state.signatures[target.name] = signature
+        self.state.save()
+        result.built.append(target.name)
+        logger.info(f"  ✓ {target.name} ({wall:.2f}秒)")
+
+    def _fail(self, target: Target, error: BaseException, result: BuildResult) -> BuildFailed:
+        result.failed.append(target.name)
+        # 失敗したターゲットは次回も古いままにする
+        self.state.signatures.pop(target.name, None)
+        return BuildFailed(target, error)
+
+    def run(self, patterns: Optional[Iterable[str]] = None, force: bool = False,
+            jobs: int = 1) -> BuildResult:
+        """
+        古いターゲットだけを依存順に実行
+
+        jobs > 1 の場合は、依存関係を満たしたターゲットから順に
+        プロセスプールへ投入して並列に実行する。
+        """
+        result = BuildResult()
+        start_time = time.perf_counter()
+        start_cpu = time.process_time()
+
+        try:
+            targets = self.select(patterns)
+            with tracing.span('run', 'graph', targets=len(targets), jobs=jobs):
+                if jobs > 1:
+                    self._run_parallel(targets, force, jobs, result)
+                else:
+                    self._run_serial(targets, force, result)
+        finally:
+            self.state.save()
+            result.elapsed = time.perf_counter() - start_time
+            result.cpu_time += time.process_time() - start_cpu
+
+        return result
+
+    def _run_serial(self, targets: List[Target], force: bool, result: BuildResult):
+        for target in targets:
+            stale, signature = self._start(target, force)
+            if not stale:
+                result.skipped.append(target.name)
+                continue
+
+            target_start = time.perf_counter()
+            try:
+                with tracing.span(target.name, 'target', label=target.label):
+                    target.action(*target.args)
+            except Exception as e:
+                raise self._fail(target, e, result) from e
+            self._finish(target, signature, result, time.perf_counter() - target_start)
+
+    def _run_parallel(self, targets: List[Target], force: bool, jobs: int, result: BuildResult):
+        from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+        remaining = list(targets)
+        done = set()
+        running = {}  # future -> (target, signature)
+        failure: Optional[BuildFailed] = None
+
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            while True:
+                # 依存先が揃ったターゲットを投入（最新ならその場で完了扱い）
+                progressed = failure is None
+                while progressed:
+                    progressed = False
+                    for target in list(remaining):
+                        if not all(dep in done for dep in target.deps):
+                            continue
+                        remaining.remove(target)
+                        stale, signature = self._start(target, force)
+                        if stale:
+                            trace_name = target.name if tracing.enabled() else ''
+                            future = pool.submit(execute_captured, target.action, target.args,
+                                                 trace_name)
+                            running[future] = (target, signature)
+                        else:
+                            result.skipped.append(target.name)
+                            done.add(target.name)
+                            progressed = True
+
+                if not running:
+                    break
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    target, signature = running.pop(future)
+                    try:
+                        outcome = future.result()
+                    except Exception as e:  # ワーカープロセス自体の異常終了など
+                        failure = failure or self._fail(target, e, result)
+                        continue
+
+                    replay_outcome(target.name, outcome)
+                    tracing.add_events(outcome.trace)
+                    result.cpu_time += outcome.cpu
+                    if outcome.error:
+                        failure = failure or self._fail(target, TargetError(outcome.error), result)
+                    else:
+                        self._finish(target, signature, result, outcome.wall)
+                        done.add(target.name)
+
+        if failure is not None:
+            raise failure
+
+
+class TargetError(Exception):
+    """ワーカープロセスで発生した例外（トレースバック文字列を保持）"""
+
+    def __init__(self, formatted_traceback: str):
+        lines = formatted_traceback.strip().splitlines()
+        super().__init__(lines[-1] if lines else "不明なエラー")
+        self.formatted_traceback = formatted_traceback
+
+
+class TaskOutcome(NamedTuple):
+    """ワーカープロセスでの実行結果"""
+    logs: List[Tuple[int, float, str]]  # (levelno, created, message)
+    stdout: str
+    wall: float
+    cpu: float
+    error: str  # 失敗時のトレースバック（成功時は空文字）
+    trace: List[dict]  # ワーカーで記録したスパン（tracing が無効なら空）
+
+
+class _RecordCollector(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records: List[Tuple[int, float, str]] = []
+
+    def emit(self, record):
+        self.records.append((record.levelno, record.created, record.getMessage()))
+
+
+def execute_captured(action: Callable, args: tuple = (), trace_name: str = '') -> TaskOutcome:
+    """
+    関数を実行し、ログ・標準出力・経過時間・CPU時間をまとめて返す
+
+    ProcessPoolExecutor のワーカーで使う。ログは親プロセスで
+    replay_outcome() によりターゲット名付きで出力し直す。
+    trace_name を指定すると、その名前のスパンの中で実行して記録したスパンも返す。
+    """
+    collector = _RecordCollector()
+    root = logging.getLogger()
+    saved_handlers = root.handlers[:]
+    root.handlers = [collector]
+    stdout = io.StringIO()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    error = ''
+    if trace_name:
+        tracing.start('worker')
+    try:
+        with contextlib.redirect_stdout(stdout), tracing.span(trace_name, 'target'):
+            action(*args)
+    except Exception:
+        error = traceback.format_exc()
+    finally:
+        root.handlers = saved_handlers
+    trace = tracing.stop() if trace_name else []
+    return TaskOutcome(collector.records, stdout.getvalue(),
+                       time.perf_counter() - wall_start, time.process_time() - cpu_start, error,
+                       trace)
+
+
+def replay_outcome(name: str, outcome: TaskOutcome):
+    """ワーカーのログと標準出力を、ターゲット名を付けて親プロセスのロガーに流す"""
+    for levelno, created, message in outcome.logs:
+        record = logger.makeRecord(logger.name, levelno, __file__, 0,
+                                   f"[{name}] {message}", None, None)
+        record.created = created
+        record.msecs = (created - int(created)) * 1000
+        logger.handle(record)
+    for line in outcome.stdout.splitlines():
+        if line.strip():
+            logger.info(f"[{name}] {line}")
@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+build_server.py - 常駐ビルドサーバーと軽量クライアント
+
+build.py を毎回起動すると、matplotlib・フォントキャッシュ・japanize_matplotlib・
+WeasyPrint（fontconfig / Pango）の初期化だけで数秒かかる。
+サーバーはこれらを読み込んだまま常駐し、解析済み原稿・図の索引・派生画像の
+キャッシュもメモリに保持して、Unixソケット経由のビルド要求を処理する。
+
+通信は1行1JSONのやりとり:
+    要求: {"command": "build", "targets": [...], "force": false, "profile": "release", "jobs": 1}
+          {"command": "status" | "ping" | "stop", ...}
+    応答: {"event": "log", "level": "INFO", "message": "..."}（ログ・標準出力を逐次）
+          {"event": "done", "ok": true, "built": [...], ...}（最後に1回）
+          {"event": "restart", "changed": [...]}（src/*.py が変わったのでサーバーが再起動する）
+
+要求は1つずつ順に処理する（ビルド状態ファイルへの書き込みが競合しないように）。
+src/ のモジュールが編集された場合は、古いコードで図やPDFを作らないよう
+サーバー自身を再起動し、クライアントは再接続して同じ要求を送り直す。
+
+使い方:
+    python src/build_server.py serve                    # サーバーを起動（フォアグラウンド）
+    python src/build_server.py build 'fig:bim_*'        # サーバーでビルド
+    python src/build_server.py build --profile draft pdf:vol1_2kyu
+    python src/build_server.py status                   # 各ターゲットの状態
+    python src/build_server.py stop                     # サーバーを停止
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import socket
+import sys
+import time
+import traceback
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from utils import ProjectPaths, configure_logging, logger
+
+PROTOCOL_VERSION = 1
+SOCKET_NAME = "build.sock"
+
+# 再起動したサーバーのソケットが現れるまで待つ時間（秒）
+RESTART_TIMEOUT = 60.0
+
+
+def socket_path(paths: ProjectPaths) -> Path:
+    return paths.cache / SOCKET_NAME
+
+
+# ---------------------------------------------------------------------------
+# サーバー
+# ---------------------------------------------------------------------------
+
+def _warm_matplotlib():
+    """matplotlib・フォントキャッシュ・日本語フォント設定・図の索引"""
+    import diagrams_professional
+    import matplotlib.pyplot as plt
+    from matplotlib import font_manager
+
+    font_manager.fontManager.get_font_names()
+    diagrams_professional.figure_sources()
+    diagrams_professional.render_environment()
+    # 日本語グリフのラスタライズまで一度通しておく
+    fig = plt.figure(figsize=(1, 1))
+    fig.text(0, 0, "BIM 教科書")
+    fig.canvas.draw()
+    plt.close(fig)
+
+
+def _warm_weasyprint():
+    """WeasyPrint・fontconfig・Pango（本のスタイルシートのコンパイルと日本語フォントの解決まで）"""
+    import markdown2  # noqa: F401
+    from pdf_build import compiled_stylesheet
+    from build_stages import pdf_builder
+    from profiles import DEFAULT_PROFILE
+
+    compiled_stylesheet(pdf_builder(DEFAULT_PROFILE).css_style)
+
+
+def _warm_pptx():
+    from pptx import Presentation
+
+    Presentation()
+
+
+WARM_UP_STEPS = [
+    ("matplotlib", _warm_matplotlib),
+    ("WeasyPrint", _warm_weasyprint),
+    ("python-pptx", _warm_pptx),
+]
+
+
+class _ClientLogHandler(logging.Handler):
+    """要求の処理中に出たログをクライアントへ送る"""
+
+    def __init__(self, send: Callable[[dict], None]):
+        super().__init__()
+        self.send = send
+
+    def emit(self, record):
+        self.send({'event': 'log', 'level': record.levelname, 'message': record.getMessage()})
+
+
+class _ClientStdout:
+    """print() の出力を行ごとにクライアントへ送る"""
+
+    def __init__(self, send: Callable[[dict], None]):
+        self.send = send
+        self._buffer = ''
+
+    def write(self, text: str) -> int:
+        self._buffer += text
+        *lines, self._buffer = self._buffer.split('\n')
+        for line in lines:
+            self.send({'event': 'log', 'level': 'OUTPUT', 'message': line})
+        return len(text)
+
+    def flush(self):
+        if self._buffer:
+            self.send({'event': 'log', 'level': 'OUTPUT', 'message': self._buffer})
+            self._buffer = ''
+
+
+class BuildServer:
+    """
+    常駐ビルドサーバー
+
+    読み込んだライブラリ・解析済み原稿（build_cache）・ステージのビルダー
+    （build_stages）はプロセス内に残るので、2回目以降の要求では再利用される。
+    """
+
+    def __init__(self, paths: ProjectPaths, warm_up: bool = True):
+        self.paths = paths
+        self.socket_path = socket_path(paths)
+        self.warm_up_enabled = warm_up
+        self.source_mtimes = self._source_mtimes()
+        self.started = time.time()  # 再起動の検出用（execv では pid が変わらない）
+        self.requests = 0
+        self.stopping = False
+        self.restart = False
+
+    def _source_mtimes(self) -> Dict[str, int]:
+        return {path.name: path.stat().st_mtime_ns for path in sorted(self.paths.src.glob("*.py"))}
+
+    def changed_sources(self) -> List[str]:
+        """起動後に編集された src/*.py"""
+        current = self._source_mtimes()
+        return sorted(name for name in set(current) | set(self.source_mtimes)
+                      if current.get(name) != self.source_mtimes.get(name))
+
+    def warm_up(self):
+        """重いライブラリを読み込み、初期化を済ませておく"""
+        for name, step in WARM_UP_STEPS:
+            start = time.perf_counter()
+            try:
+                step()
+            except Exception as e:  # 未インストール・ネイティブライブラリ不足など
+                logger.warning(f"  ⚠️  {name} の事前読み込みに失敗（ビルド時に読み込む）: {e}")
+                continue
+            logger.info(f"  ✓ {name} ({time.perf_counter() - start:.2f}秒)")
+
+        from build_cache import load_manuscript
+        try:
+            load_manuscript(self.paths)
+        except FileNotFoundError as e:
+            logger.warning(f"  ⚠️  {e}")
+
+    def _bind(self) -> socket.socket:
+        self.paths.cache.mkdir(parents=True, exist_ok=True)
+        if self.socket_path.exists():
+            # 応答があれば別のサーバーが動いている。なければ残骸なので消す
+            if ping(self.paths):
+                raise RuntimeError(f"ビルドサーバーは起動済みです: {self.socket_path}")
+            self.socket_path.unlink()
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(str(self.socket_path))
+        server.listen(8)
+        return server
+
+    def serve(self):
+        """要求を1つずつ処理する（stop 要求かソース変更による再起動まで）"""
+        server = self._bind()
+        logger.info(f"🚀 ビルドサーバーを起動: {self.socket_path} (pid {os.getpid()})")
+        try:
+            # 先にソケットを用意するので、事前読み込み中の要求は待たせておける
+            if self.warm_up_enabled:
+                start = time.perf_counter()
+                logger.info("事前読み込み中...")
+                self.warm_up()
+                logger.info(f"事前読み込み完了 ({time.perf_counter() - start:.2f}秒)")
+            while not self.stopping:
+                connection, _ = server.accept()
+                with connection:
+                    self.handle_connection(connection)
+        except KeyboardInterrupt:
+            logger.info("中断されました")
+        finally:
+            server.close()
+            with contextlib.suppress(FileNotFoundError):
+                self.socket_path.unlink()
+
+        if self.restart:
+            logger.info("♻️  ソースの変更を反映するため再起動します")
+            os.execv(sys.executable, [sys.executable] + sys.argv)
+        logger.info("ビルドサーバーを停止しました")
+
+    def handle_connection(self, connection: socket.socket):
+        stream = connection.makefile('rwb')
+        connected = True
+
+        def send(message: dict):
+            nonlocal connected
+            if not connected:
+                return
+            try:
+                stream.write(json.dumps(message, ensure_ascii=False).encode('utf-8') + b'\n')
+                stream.flush()
+            except OSError:
+                # クライアントが切断してもビルドは最後まで続ける
+                connected = False
+
+        try:
+            line = stream.readline()
+            if not line:  # 接続確認だけのクライアント
+                return
+            request = json.loads(line.decode('utf-8'))
+        except (OSError, ValueError) as e:
+            send({'event': 'done', 'ok': False, 'error': f"不正な要求: {e}"})
+            return
+
+        command = request.get('command')
+        if command == 'ping':
+            send({'event': 'done', 'ok': True, 'protocol': PROTOCOL_VERSION, 'pid': os.getpid(),
+                  'started': self.started, 'requests': self.requests})
+            return
+        if command == 'stop':
+            self.stopping = True
+            send({'event': 'done', 'ok': True})
+            return
+
+        changed = self.changed_sources()
+        if changed:
+            self.stopping = self.restart = True
+            send({'event': 'restart', 'changed': changed, 'started': self.started})
+            return
+
+        handlers = {'build': self.build, 'status': self.status}
+        if command not in handlers:
+            send({'event': 'done', 'ok': False, 'error': f"不明なコマンド: {command}"})
+            return
+
+        self.requests += 1
+        log_handler = _ClientLogHandler(send)
+        root = logging.getLogger()
+        root.addHandler(log_handler)
+        output = _ClientStdout(send)
+        try:
+            with contextlib.redirect_stdout(output):
+                reply = handlers[command](request)
+        except Exception as e:
+            reply = {'ok': False, 'error': str(e), 'traceback': traceback.format_exc()}
+        finally:
+            output.flush()
+            root.removeHandler(log_handler)
+        send(dict(reply, event='done'))
+
+    def build(self, request: dict) -> dict:
+        from build import create_build_graph
+        from build_cache import report_cache_stats
+        from build_graph import BuildFailed, TargetError
+        from profiles import get_profile
+
+        profile = get_profile(request.get('profile') or 'release')
+        graph = create_build_graph(self.paths, profile)
+        try:
+            result = graph.run(request.get('targets') or None, force=bool(request.get('force')),
+                               jobs=max(1, int(request.get('jobs') or 1)))
+        except BuildFailed as e:
+            formatted = e.error.formatted_traceback if isinstance(e.error, TargetError) \
+                else ''.join(traceback.format_exception(type(e.error), e.error, e.error.__traceback__))
+            return {'ok': False, 'error': str(e), 'traceback': formatted,
+                    'failed': [e.target.name]}
+        report_cache_stats()
+        return {'ok': result.ok, 'built': result.built, 'skipped': result.skipped,
+                'elapsed': result.elapsed, 'cpu_time': result.cpu_time}
+
+    def status(self, request: dict) -> dict:
+        from build import create_build_graph
+        from profiles import get_profile
+
+        profile = get_profile(request.get('profile') or 'release')
+        graph = create_build_graph(self.paths, profile)
+        rows = [[target.name, stale, reason]
+                for target, stale, reason in graph.status(request.get('targets') or None)]
+        return {'ok': True, 'targets': rows}
+
+
+# ---------------------------------------------------------------------------
+# クライアント（標準ライブラリと utils だけで動く）
+# ---------------------------------------------------------------------------
+
+class ServerUnavailable(Exception):
+    """ビルドサーバーに接続できない"""
+
+
+def _connect(paths: ProjectPaths) -> socket.socket:
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(str(socket_path(paths)))
+    except OSError as e:
+        client.close()
+        raise ServerUnavailable(str(e)) from None
+    return client
+
+
+def request(paths: ProjectPaths, message: dict,
+            on_event: Optional[Callable[[dict], None]] = None) -> dict:
+    """
+    要求を送り、done まで応答を読む（log は on_event に渡す）
+
+    サーバーがソース変更で再起動した場合は、再起動を待って送り直す。
+    """
+    while True:
+        with _connect(paths) as client:
+            stream = client.makefile('rwb')
+            stream.write(json.dumps(message, ensure_ascii=False).encode('utf-8') + b'\n')
+            stream.flush()
+            for line in stream:
+                event = json.loads(line.decode('utf-8'))
+                if event.get('event') == 'done':
+                    return event
+                if event.get('event') == 'restart':
+                    break
+                if on_event is not None:
+                    on_event(event)
+            else:
+                raise ServerUnavailable("サーバーとの接続が切れました")
+
+        logger.info(f"♻️  ソースが変更されたためサーバーが再起動します: {', '.join(event['changed'])}")
+        _wait_for_restart(paths, event['started'])
+
+
+def _wait_for_restart(paths: ProjectPaths, previous_start: float):
+    deadline = time.monotonic() + RESTART_TIMEOUT
+    # 古いサーバーが閉じて、新しいサーバーが応答するようになるのを待つ
+    while time.monotonic() < deadline:
+        info = ping(paths)
+        if info is not None and info.get('started') != previous_start:
+            return
+        time.sleep(0.1)
+    raise ServerUnavailable("再起動したサーバーに接続できません")
+
+
+def ping(paths: ProjectPaths) -> Optional[dict]:
+    """サーバーが応答すればその情報、なければ None"""
+    try:
+        return request(paths, {'command': 'ping'})
+    except (ServerUnavailable, OSError, ValueError):
+        return None
+
+
+def print_event(event: dict):
+    """サーバーからのログを表示"""
+    level = event.get('level', 'INFO')
+    if level == 'OUTPUT':
+        print(event['message'])
+    else:
+        logger.log(logging.getLevelName(level), event['message'])
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="常駐ビルドサーバーとクライアント")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve = commands.add_parser('serve', help="サーバーを起動する")
+    serve.add_argument('--no-warm-up', action='store_true',
+                       help="起動時にライブラリを事前読み込みしない")
+
+    for name, help_text in (('build', "サーバーでビルドする"), ('status', "各ターゲットの状態を表示する")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument('targets', nargs='*', help="ターゲット（build.py と同じ指定）")
+        command.add_argument('--profile', default='release', help="ビルドプロファイル")
+        if name == 'build':
+            command.add_argument('--force', action='store_true', help="最新のターゲットも再ビルドする")
+            command.add_argument('-j', '--jobs', type=int, default=1, metavar='N',
+                                 help="サーバー内でNプロセス並列に実行する")
+            command.add_argument('--no-fallback', action='store_true',
+                                 help="サーバーがなければビルドせずに終了する")
+
+    commands.add_parser('ping', help="サーバーの稼働を確認する")
+    commands.add_parser('stop', help="サーバーを停止する")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_logging()
+    paths = ProjectPaths()
+
+    if args.command == 'serve':
+        try:
+            BuildServer(paths, warm_up=not args.no_warm_up).serve()
+        except RuntimeError as e:
+            logger.error(f"❌ {e}")
+            return 1
+        return 0
+
+    if args.command == 'ping':
+        info = ping(paths)
+        if info is None:
+            print("ビルドサーバーは起動していません")
+            return 1
+        print(f"ビルドサーバー稼働中 (pid {info['pid']}, 処理した要求 {info['requests']}件)")
+        return 0
+
+    message = {'command': args.command}
+    if args.command in ('build', 'status'):
+        message.update(targets=args.targets, profile=args.profile)
+    if args.command == 'build':
+        message.update(force=args.force, jobs=args.jobs)
+
+    start = time.perf_counter()
+    try:
+        reply = request(paths, message, print_event)
+    except ServerUnavailable as e:
+        if args.command != 'build' or args.no_fallback:
+            logger.error(f"❌ ビルドサーバーに接続できません: {e}")
+            return 1
+        logger.warning("ビルドサーバーが起動していないため、このプロセスでビルドします "
+                       "(python src/build_server.py serve)")
+        from build import main as build_main
+        build_argv = list(args.targets) + ['--profile', args.profile, '--jobs', str(args.jobs)]
+        return build_main(build_argv + (['--force'] if args.force else []))
+    roundtrip = time.perf_counter() - start
+
+    if args.command == 'status':
+        for name, stale, reason in reply.get('targets', []):
+            print(f"{'🔨' if stale else '✅'} {name:<32} {reason}")
+    elif args.command == 'build' and reply.get('ok'):
+        print(f"🔨 ビルド: {len(reply['built'])}件 / ⏭️  最新のためスキップ: {len(reply['skipped'])}件")
+        print(f"⏱️  ビルド {reply['elapsed']:.2f}秒 / 往復 {roundtrip:.2f}秒")
+
+    if not reply.get('ok'):
+        logger.error(f"❌ {reply.get('error', 'エラー')}")
+        if reply.get('traceback'):
+            print(reply['traceback'], file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+build_stages.py - ビルドグラフから呼ばれる各ステージの実行関数
+
+重い依存（matplotlib, WeasyPrint, python-pptx）は各関数の中で import する。
+ワーカープロセスにはプロファイル名だけを渡し、設定は profiles.py から引く。
+図の生成器・PDF/PPTXのビルダーはプロファイルごとに1つ作って使い回すので、
+常駐ビルドサーバー（build_server.py）ではキャッシュが要求をまたいで残る。
+"""
+
+from functools import lru_cache
+
+from profiles import DEFAULT_PROFILE, get_profile
+from utils import ProjectPaths
+
+
+def run_split():
+    """MASTER.md → 章ファイル"""
+    from split_master import split_master_to_chapters
+    split_master_to_chapters()
+
+
+@lru_cache(maxsize=None)
+def figure_generator(profile_name: str, use_cache: bool = True):
+    """プロファイルの図生成器（プロセス内で共有。use_cache=False なら図キャッシュを使わない）"""
+    from diagrams_professional import ProfessionalDiagramGenerator
+    paths = ProjectPaths()
+    profile = get_profile(profile_name)
+    return ProfessionalDiagramGenerator(profile.figures_dir(paths),
+                                        cache_dir=paths.cache / "figs" if use_cache else None,
+                                        profile=profile)
+
+
+@lru_cache(maxsize=None)
+def pdf_builder(profile_name: str):
+    """プロファイルのPDFビルダー（プロセス内で共有）"""
+    from pdf_build import PDFBuilder
+    paths = ProjectPaths()
+    profile = get_profile(profile_name)
+    return PDFBuilder(profile.dist_dir(paths), profile, profile.figures_dir(paths))
+
+
+@lru_cache(maxsize=None)
+def pptx_builder(profile_name: str):
+    """プロファイルのPPTXビルダー（プロセス内で共有）"""
+    from pptx_build import PPTXBuilder
+    paths = ProjectPaths()
+    profile = get_profile(profile_name)
+    return PPTXBuilder(profile.dist_dir(paths), profile, profile.figures_dir(paths))
+
+
+def run_figure(method_name: str, profile_name: str = DEFAULT_PROFILE, use_cache: bool = True):
+    """図を1つ生成（generate_* メソッド単位）"""
+    figure_generator(profile_name, use_cache).generate(method_name)
+
+
+def run_pdf(volume_name: str, profile_name: str = DEFAULT_PROFILE, layout_jobs: int = 1):
+    """VOL単位でPDFを生成（layout_jobs > 1 なら章ごとに並列レイアウト）"""
+    _, manuscript_dir = ProjectPaths().volumes[volume_name]
+    pdf_builder(profile_name).build_pdf(volume_name, manuscript_dir, jobs=layout_jobs)
+
+
+def run_pptx(volume_name: str, profile_name: str = DEFAULT_PROFILE):
+    """VOL単位でPPTXを生成"""
+    _, manuscript_dir = ProjectPaths().volumes[volume_name]
+    pptx_builder(profile_name).build_pptx(volume_name, manuscript_dir)
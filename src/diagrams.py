@@ -14,10 +14,10 @@ import numpy as np
 
 from utils import (
     ProjectPaths,
-    parse_master_markdown,
-    get_all_figure_references,
+    configure_logging,
     logger
 )
+from build_cache import load_manuscript
 
 # 日本語フォント設定
 try:
@@ -927,9 +927,7 @@ def generate_all_diagrams():
     paths.ensure_dirs()
     
     # 必要な図のリストを取得
-    vol1, vol2 = parse_master_markdown(paths.master_file)
-    all_chapters = vol1 + vol2
-    figure_refs = get_all_figure_references(all_chapters)
+    figure_refs = load_manuscript(paths).figure_refs
     
     # 図を生成
     generator = DiagramGenerator(paths.figs)
@@ -940,6 +938,7 @@ def generate_all_diagrams():
 
 
 if __name__ == "__main__":
+    configure_logging()
     try:
         count = generate_all_diagrams()
         logger.info(f"📊 合計 {count} 個の図を生成しました")
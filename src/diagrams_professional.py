@@ -6,6 +6,13 @@ diagrams_professional.py - BIM教科書用プロフェッショナル図解生
 """
 
 import sys
+import time
+import hashlib
+from io import BytesIO
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
@@ -14,6 +21,13 @@ from matplotlib.patches import FancyBboxPatch, Circle, Rectangle, Wedge, Arc
 from pathlib import Path
 import numpy as np
 
+from figure_cache import FigureCache, link_or_copy, write_atomic
+from image_optimize import OPTIMIZER_VERSION, format_bytes, optimize_png_bytes
+from figure_index import FigureSource, index_figure_generators
+from profiles import RELEASE, BuildProfile, PROFILES, get_profile
+from tracing import span
+from utils import ProjectPaths, configure_logging
+
 # 日本語フォント設定
 try:
     import japanize_matplotlib
@@ -26,6 +40,11 @@ plt.rcParams['figure.dpi'] = 150
 plt.rcParams['savefig.dpi'] = 150
 plt.rcParams['figure.figsize'] = (14, 10)  # 大きめのデフォルトサイズ
 plt.rcParams['font.size'] = 14  # ベースフォントサイズを大きく
+# ベクター出力: SVGは文字をパス化（閲覧環境のフォントに依存しない）、
+# PDFはTrueTypeフォントをサブセット埋め込み
+plt.rcParams['svg.fonttype'] = 'path'
+plt.rcParams['svg.hashsalt'] = 'bim-textbook'  # 要素IDを固定して出力を再現可能にする
+plt.rcParams['pdf.fonttype'] = 42
 
 # プロフェッショナルカラーパレット
 COLORS = {
@@ -44,14 +63,108 @@ COLORS = {
     'light_gray': '#F5F5F5',   # 薄いグレー
 }
 
+# ベクター形式の保存時メタデータ（日付を入れない）
+VECTOR_METADATA = {
+    'svg': {'Date': None},
+    'pdf': {'CreationDate': None},
+}
+
+
+def figure(*fig_ids: str):
+    """
+    図生成メソッドに図ID（MASTER.mdの ![FIG:xxx]() のxxx）を登録するデコレータ
+    
+    1つのメソッドが複数の図を出力する場合は、すべてのIDを列挙する。
+    """
+    def decorator(method):
+        method.figure_ids = fig_ids
+        return method
+    return decorator
+
 
 class ProfessionalDiagramGenerator:
     """プロフェッショナル品質の図解生成クラス"""
     
-    def __init__(self, output_dir: Path):
+    def __init__(self, output_dir: Path, cache_dir: Optional[Path] = None,
+                 profile: BuildProfile = RELEASE):
         self.output_dir = output_dir
         self.output_dir.mkdir(parents=True, exist_ok=True)
         self.colors = COLORS
+        # 解像度・余白・出力形式・PNG最適化の有無（profiles.py）
+        self.profile = profile
+        # cache_dir を指定すると、変更のない図は描画せずキャッシュから復元する
+        self.cache_dir = cache_dir
+        self.cache = FigureCache(cache_dir) if cache_dir is not None else None
+    
+    def figure_cache_key(self, method_name: str) -> str:
+        """図のキャッシュキー（生成関数・使用ヘルパー・パレット・rcParams・ライブラリとフォント）"""
+        h = hashlib.sha256()
+        h.update(figure_sources()[method_name].digest.encode('ascii'))
+        h.update(repr(sorted(self.colors.items())).encode('utf-8'))
+        h.update(render_environment().encode('utf-8'))
+        h.update(self.profile.figure_settings.encode('ascii'))
+        h.update(f"optimizer={OPTIMIZER_VERSION}".encode('ascii'))
+        return h.hexdigest()
+    
+    def generate(self, method_name: str) -> bool:
+        """
+        図を1つ生成（generate_* メソッド名で指定）
+        
+        Returns:
+            キャッシュから復元した場合 True
+        """
+        source = figure_sources().get(method_name)
+        fig_ids = source.outputs if source else []
+        key = ''
+        if self.cache is not None and fig_ids:
+            key = self.figure_cache_key(method_name)
+            with span('restore', 'figure', figure=method_name):
+                restored = self.cache.restore(key, fig_ids, self.output_dir)
+            if restored:
+                print(f"↺ キャッシュから復元: {', '.join(fig_ids)} ({'/'.join(self.profile.figure_formats)})")
+                return True
+        
+        start = time.perf_counter()
+        with span(method_name, 'figure', outputs=','.join(fig_ids)):
+            getattr(self, method_name)()
+        if key:
+            self.cache.store(key, {fig_id: [f"{fig_id}.{fmt}" for fmt in self.profile.figure_formats]
+                                   for fig_id in fig_ids},
+                             self.output_dir, time.perf_counter() - start, method_name)
+        return False
+    
+    def save_figure(self, fig, *names: str, formats: Optional[Tuple[str, ...]] = None):
+        """
+        図を保存して閉じる
+        
+        形式ごとに1回だけ描画・エンコードし、同じバッファを全ての出力名に使う。
+        2つ目以降の出力名は1つ目へのハードリンクにする（内容が同一のため）。
+        SVG/PDFは作成日時を埋め込まず、同じ図からは同じバイト列を出力する。
+        解像度・余白の切り詰め・形式（省略時）・PNG最適化はプロファイルに従う。
+        """
+        profile = self.profile
+        formats = formats or profile.figure_formats
+        notes = []
+        for fmt in formats:
+            buffer = BytesIO()
+            with span(f"savefig:{fmt}", 'figure', figure=names[0]):
+                fig.savefig(buffer, format=fmt, facecolor='white', dpi=profile.figure_dpi,
+                            bbox_inches='tight' if profile.tight_bbox else None,
+                            metadata=VECTOR_METADATA.get(fmt))
+            data = buffer.getvalue()
+            if fmt == 'png' and profile.optimize_png:
+                rendered_size = len(data)
+                with span('optimize_png', 'figure', figure=names[0]):
+                    data, mode = optimize_png_bytes(data)
+                notes.append(f"PNG {format_bytes(rendered_size)}→{format_bytes(len(data))} {mode}")
+            first = self.output_dir / f"{names[0]}.{fmt}"
+            write_atomic(first, data)
+            for name in names[1:]:
+                link_or_copy(first, self.output_dir / f"{name}.{fmt}")
+        plt.close(fig)
+        detail = '/'.join(formats) + ''.join(f", {note}" for note in notes)
+        for name in names:
+            print(f"✓ 生成完了: {name} ({detail})")
     
     def draw_rounded_box(self, ax, x, y, width, height, text, bgcolor, 
                         textcolor='black', fontsize=16, fontweight='bold',
@@ -92,6 +205,7 @@ class ProfessionalDiagramGenerator:
     
     # ========== 図表生成メソッド ==========
     
+    @figure('cad_vs_bim')
     def generate_cad_vs_bim(self):
         """CAD vs BIM比較図（改善版）"""
         fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(16, 10))
@@ -168,11 +282,9 @@ class ProfessionalDiagramGenerator:
         ax2.axis('off')
         
         plt.tight_layout()
-        output_path = self.output_dir / "cad_vs_bim.png"
-        plt.savefig(output_path, bbox_inches='tight', facecolor='white', dpi=150)
-        plt.close()
-        print(f"✓ 生成完了: cad_vs_bim.png")
+        self.save_figure(fig, 'cad_vs_bim')
     
+    @figure('info_layers')
     def generate_info_layers(self):
         """BIM情報の3層構造（改善版）"""
         fig, ax = plt.subplots(figsize=(16, 12))
@@ -241,11 +353,9 @@ class ProfessionalDiagramGenerator:
         ax.set_ylim(0, 1)
         ax.axis('off')
         
-        output_path = self.output_dir / "info_layers.png"
-        plt.savefig(output_path, bbox_inches='tight', facecolor='white', dpi=150)
-        plt.close()
-        print(f"✓ 生成完了: info_layers.png")
+        self.save_figure(fig, 'info_layers')
     
+    @figure('lifecycle_flow')
     def generate_lifecycle_flow(self):
         """ライフサイクルフロー（改善版）"""
         fig, ax = plt.subplots(figsize=(18, 10))
@@ -308,11 +418,9 @@ class ProfessionalDiagramGenerator:
         ax.axis('off')
         ax.legend(loc='upper right', fontsize=14)
         
-        output_path = self.output_dir / "lifecycle_flow.png"
-        plt.savefig(output_path, bbox_inches='tight', facecolor='white', dpi=150)
-        plt.close()
-        print(f"✓ 生成完了: lifecycle_flow.png")
+        self.save_figure(fig, 'lifecycle_flow')
     
+    @figure('lod_matrix')
     def generate_lod_matrix(self):
         """LODマトリックス（改善版）"""
         fig, ax = plt.subplots(figsize=(18, 12))
@@ -387,11 +495,9 @@ class ProfessionalDiagramGenerator:
         ax.set_ylim(0.05, 1)
         ax.axis('off')
         
-        output_path = self.output_dir / "lod_matrix.png"
-        plt.savefig(output_path, bbox_inches='tight', facecolor='white', dpi=150)
-        plt.close()
-        print(f"✓ 生成完了: lod_matrix.png")
+        self.save_figure(fig, 'lod_matrix')
     
+    @figure('element_structure')
     def generate_element_structure(self):
         """要素構造図（改善版）"""
         fig, ax = plt.subplots(figsize=(16, 12))
@@ -446,11 +552,9 @@ class ProfessionalDiagramGenerator:
         ax.set_ylim(0.05, 0.95)
         ax.axis('off')
         
-        output_path = self.output_dir / "element_structure.png"
-        plt.savefig(output_path, bbox_inches='tight', facecolor='white', dpi=150)
-        plt.close()
-        print(f"✓ 生成完了: element_structure.png")
+        self.save_figure(fig, 'element_structure')
     
+    @figure('openbim_ifc')
     def generate_openbim_ifc(self):
         """OpenBIM/IFC図（改善版）"""
         fig, ax = plt.subplots(figsize=(16, 12))
@@ -496,11 +600,9 @@ class ProfessionalDiagramGenerator:
         ax.set_ylim(0, 1)
         ax.axis('off')
         
-        output_path = self.output_dir / "openbim_ifc.png"
-        plt.savefig(output_path, bbox_inches='tight', facecolor='white', dpi=150)
-        plt.close()
-        print(f"✓ 生成完了: openbim_ifc.png")
+        self.save_figure(fig, 'openbim_ifc')
     
+    @figure('4d_5d_bim')
     def generate_4d_5d_bim(self):
         """4D/5D BIM図（改善版）"""
         fig, ax = plt.subplots(figsize=(14, 14))
@@ -555,11 +657,9 @@ class ProfessionalDiagramGenerator:
         ax.set_ylim(0, 1)
         ax.axis('off')
         
-        output_path = self.output_dir / "4d_5d_bim.png"
-        plt.savefig(output_path, bbox_inches='tight', facecolor='white', dpi=150)
-        plt.close()
-        print(f"✓ 生成完了: 4d_5d_bim.png")
+        self.save_figure(fig, '4d_5d_bim')
     
+    @figure('bep_flow')
     def generate_bep_flow(self):
         """BEPフロー図（改善版）"""
         fig, ax = plt.subplots(figsize=(14, 16))
@@ -602,11 +702,9 @@ class ProfessionalDiagramGenerator:
         ax.set_ylim(0.1, 0.95)
         ax.axis('off')
         
-        output_path = self.output_dir / "bep_flow.png"
-        plt.savefig(output_path, bbox_inches='tight', facecolor='white', dpi=150)
-        plt.close()
-        print(f"✓ 生成完了: bep_flow.png")
+        self.save_figure(fig, 'bep_flow')
     
+    @figure('worksharing_concept')
     def generate_worksharing_concept(self):
         """ワークシェアリング図（改善版）"""
         fig, ax = plt.subplots(figsize=(16, 12))
@@ -659,11 +757,9 @@ class ProfessionalDiagramGenerator:
         ax.set_ylim(0, 1)
         ax.axis('off')
         
-        output_path = self.output_dir / "worksharing_concept.png"
-        plt.savefig(output_path, bbox_inches='tight', facecolor='white', dpi=150)
-        plt.close()
-        print(f"✓ 生成完了: worksharing_concept.png")
+        self.save_figure(fig, 'worksharing_concept')
     
+    @figure('family_hierarchy_detail')
     def generate_family_hierarchy_detail(self):
         """ファミリ階層図（改善版）"""
         fig, ax = plt.subplots(figsize=(16, 14))
@@ -721,11 +817,9 @@ class ProfessionalDiagramGenerator:
         ax.set_ylim(0, 1)
         ax.axis('off')
         
-        output_path = self.output_dir / "family_hierarchy_detail.png"
-        plt.savefig(output_path, bbox_inches='tight', facecolor='white', dpi=150)
-        plt.close()
-        print(f"✓ 生成完了: family_hierarchy_detail.png")
+        self.save_figure(fig, 'family_hierarchy_detail')
     
+    @figure('clash_detection')
     def generate_clash_detection(self):
         """干渉チェック図（改善版）"""
         fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(16, 16))
@@ -800,11 +894,10 @@ class ProfessionalDiagramGenerator:
         ax4.axis('off')
         
         plt.tight_layout()
-        output_path = self.output_dir / "clash_detection.png"
-        plt.savefig(output_path, bbox_inches='tight', facecolor='white', dpi=150)
-        plt.close()
-        print(f"✓ 生成完了: clash_detection.png")
+        self.save_figure(fig, 'clash_detection')
     
+    @figure('ng_ok_level_mistake', 'level_mistake_detail',
+            'wall_mistake_patterns', 'floor_mistake_examples')
     def generate_ng_ok_examples(self):
         """NG/OK例（レベル・壁・床）を生成"""
         # これらは既存のdiagrams.pyから移植・改善
@@ -845,51 +938,175 @@ class ProfessionalDiagramGenerator:
         
         plt.tight_layout()
         
-        # 3つのファイル名で保存
-        for filename in ['ng_ok_level_mistake.png', 'level_mistake_detail.png', 
-                        'wall_mistake_patterns.png', 'floor_mistake_examples.png']:
-            output_path = self.output_dir / filename
-            plt.savefig(output_path, bbox_inches='tight', facecolor='white', dpi=150)
-            print(f"✓ 生成完了: {filename}")
-        
-        plt.close()
+        # 4つのファイル名で保存（描画・エンコードは1回だけ）
+        self.save_figure(fig, 'ng_ok_level_mistake', 'level_mistake_detail',
+                         'wall_mistake_patterns', 'floor_mistake_examples')
+    
+    def generate_all(self, workers: int = 1):
+        """登録されているすべての図を生成"""
+        return self.generate_figures(list(FIGURE_REGISTRY), workers=workers)
     
-    def generate_all(self):
-        """すべての図を生成"""
+    def generate_figures(self, fig_ids: List[str], workers: int = 1):
+        """
+        指定した図IDの図だけを生成
+        
+        workers > 1 の場合は図ごとに別プロセスで並列に描画する。
+        1つの図が失敗しても残りの図は生成を続ける。
+        
+        Returns:
+            [(メソッド名, 秒数, エラー内容, キャッシュから復元したか)]
+            （成功時のエラー内容は空文字）
+        """
+        unimplemented = [fig_id for fig_id in fig_ids if fig_id not in FIGURE_REGISTRY]
+        unreferenced = [fig_id for fig_id in FIGURE_REGISTRY if fig_id not in fig_ids]
+        methods = list(dict.fromkeys(
+            FIGURE_REGISTRY[fig_id] for fig_id in fig_ids if fig_id in FIGURE_REGISTRY
+        ))
+        
         print("\n" + "="*60)
-        print("プロフェッショナル図解生成開始（15種類）")
+        print(f"プロフェッショナル図解生成開始（{len(methods)}メソッド, workers={workers}）")
+        for fig_id in unimplemented:
+            print(f"⚠️  未実装の図: {fig_id}")
+        if unreferenced:
+            print(f"ℹ️  対象外の図（参照されていない）: {', '.join(unreferenced)}")
         print("="*60 + "\n")
         
-        self.generate_cad_vs_bim()
-        self.generate_info_layers()
-        self.generate_lifecycle_flow()
-        self.generate_lod_matrix()
-        self.generate_element_structure()
-        self.generate_openbim_ifc()
-        self.generate_4d_5d_bim()
-        self.generate_bep_flow()
-        self.generate_worksharing_concept()
-        self.generate_family_hierarchy_detail()
-        self.generate_clash_detection()
-        self.generate_ng_ok_examples()
+        cache_dir = str(self.cache_dir) if self.cache_dir is not None else None
+        start = time.perf_counter()
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [
+                    pool.submit(render_figure, str(self.output_dir), method_name, cache_dir,
+                                self.profile)
+                    for method_name in methods
+                ]
+                results = []
+                for method_name, future in zip(methods, futures):
+                    try:
+                        results.append(future.result())
+                    except Exception as e:  # ワーカープロセス自体の異常終了
+                        results.append((method_name, 0.0, repr(e), False))
+        else:
+            results = [render_figure(str(self.output_dir), method_name, cache_dir,
+                                     self.profile)
+                       for method_name in methods]
+        elapsed = time.perf_counter() - start
         
         print("\n" + "="*60)
+        for method_name, seconds, error, cached in results:
+            mark = "✗" if error else ("↺" if cached else "✓")
+            print(f"{mark} {method_name:<36} {seconds:6.2f}秒")
+        failed = [(method_name, error) for method_name, _, error, _ in results if error]
+        for method_name, error in failed:
+            print(f"\n❌ {method_name} の生成に失敗:\n{error}")
+        
         generated_count = len(list(self.output_dir.glob('*.png')))
-        print(f"✨ {generated_count}個の図解生成完了！")
+        total = sum(result[1] for result in results)
+        cached_count = sum(1 for result in results if result[3])
+        print(f"✨ {generated_count}個の図解生成完了！（キャッシュ復元 {cached_count}件 / 失敗 {len(failed)}件）")
+        print(f"⏱️  経過 {elapsed:.2f}秒 / 図ごとの合計 {total:.2f}秒")
         print("="*60 + "\n")
+        
+        return results
+
+
+# 図ID → 生成メソッド名
+FIGURE_REGISTRY: Dict[str, str] = {
+    fig_id: name
+    for name, method in vars(ProfessionalDiagramGenerator).items()
+    for fig_id in getattr(method, 'figure_ids', ())
+}
+
+
+def render_figure(output_dir: str, method_name: str, cache_dir: Optional[str] = None,
+                  profile: BuildProfile = RELEASE) -> Tuple[str, float, str, bool]:
+    """
+    図を1つ生成（ワーカープロセスからも呼ばれる）
+    
+    Returns:
+        (メソッド名, 秒数, エラー内容, キャッシュから復元したか)
+        例外は捕捉してトレースバック文字列で返す
+    """
+    start = time.perf_counter()
+    try:
+        generator = ProfessionalDiagramGenerator(
+            Path(output_dir), Path(cache_dir) if cache_dir else None, profile)
+        cached = generator.generate(method_name)
+    except Exception:
+        plt.close('all')
+        return method_name, time.perf_counter() - start, traceback.format_exc(), False
+    return method_name, time.perf_counter() - start, '', cached
+
+
+@lru_cache(maxsize=None)
+def figure_sources() -> Dict[str, FigureSource]:
+    """このモジュールの generate_* メソッドの索引（ソースハッシュ・出力名）"""
+    return index_figure_generators(Path(__file__))
+
+
+@lru_cache(maxsize=None)
+def render_environment() -> str:
+    """描画結果に影響するライブラリ・フォント・rcParamsの指紋"""
+    from matplotlib import font_manager, ft2font
+    
+    parts = [
+        f"matplotlib={matplotlib.__version__}",
+        f"freetype={getattr(ft2font, '__freetype_version__', '')}",
+        f"japanize={getattr(sys.modules.get('japanize_matplotlib'), '__version__', 'none')}",
+    ]
+    font_path = Path(font_manager.findfont(
+        font_manager.FontProperties(family=plt.rcParams['font.family'])))
+    if font_path.exists():
+        parts.append(f"font={font_path.name}:{font_path.stat().st_size}")
+    parts.extend(f"{name}={value!r}" for name, value in sorted(plt.rcParams.items()))
+    return '\n'.join(parts)
 
 
 def main():
     """メイン実行関数"""
-    output_dir = Path("assets/figs")
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="BIM教科書用プロフェッショナル図解を生成（既定ではMASTER.mdで参照されている図のみ）")
+    parser.add_argument('fig_ids', nargs='*',
+                        help="生成する図ID（例: cad_vs_bim）。省略時はMASTER.mdの参照から決定")
+    parser.add_argument('--all', action='store_true',
+                        help="参照の有無に関係なく登録済みの図をすべて生成する")
+    parser.add_argument('-w', '--workers', type=int, default=1, metavar='N',
+                        help="図をNプロセスで並列に生成する")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="図のキャッシュを使わずにすべて描画する")
+    parser.add_argument('--no-optimize', action='store_true',
+                        help="PNGを最適化せずに書き出す")
+    parser.add_argument('--profile', choices=list(PROFILES), default=RELEASE.name,
+                        help="ビルドプロファイル（draft: 低解像度・PNGのみ・最適化なし、.build_cache/draft/figs に出力）")
+    args = parser.parse_args()
+    configure_logging()
+    
+    profile = get_profile(args.profile)
+    if args.no_optimize:
+        profile = profile._replace(optimize_png=False)
+    # カレントディレクトリ基準（assets/figs, .build_cache/figs）
+    paths = ProjectPaths(Path("."))
+    output_dir = profile.figures_dir(paths)
     output_dir.mkdir(parents=True, exist_ok=True)
+    cache_dir = None if args.no_cache else paths.cache / "figs"
+    
+    if args.all:
+        fig_ids = list(FIGURE_REGISTRY)
+    elif args.fig_ids:
+        fig_ids = args.fig_ids
+    else:
+        from build_cache import load_manuscript
+        fig_ids = load_manuscript().figure_refs
     
-    generator = ProfessionalDiagramGenerator(output_dir)
-    generator.generate_all()
+    generator = ProfessionalDiagramGenerator(output_dir, cache_dir, profile)
+    results = generator.generate_figures(fig_ids, workers=args.workers)
     
     print(f"\n📁 出力ディレクトリ: {output_dir.absolute()}")
     print(f"📊 生成された図: {len(list(output_dir.glob('*.png')))}個\n")
+    
+    return 1 if any(result[2] for result in results) else 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+docs_hooks.py - MkDocs のフック（docsサイトの図を <img srcset> で出す）
+
+mkdocs.yml の hooks: に登録して使う。
+
+- on_pre_build:     assets/figs の各図から web 用の派生画像（480 / 960 / 1600px）を
+                    docs/assets/figs に <図ID>-<幅>w.png として置く（renditions.py）
+- on_page_markdown: 本文中の図の参照を、派生画像を並べた <img srcset> に置き換える
+                    （![説明](assets/figs/<図ID>.png) と ![FIG:<図ID>]() の両方）
+
+ブラウザは表示幅に合った派生画像だけを読み込むので、スマートフォンでも
+幅2000px超の元画像をダウンロードしなくてよい。派生画像を作れなかった図
+（Pillow がない・元画像がない）の参照は置き換えない。
+"""
+
+import posixpath
+import re
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+SRC = Path(__file__).resolve().parent
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+from utils import ProjectPaths, logger  # noqa: E402
+
+# ![説明](assets/figs/<図ID>.png)（../ で始まる相対パスも含む）と ![FIG:<図ID>]()
+MARKDOWN_FIGURE = re.compile(r'!\[([^\]]*)\]\((?:\.\./)*assets/figs/([\w-]+)\.png\)')
+FIG_PLACEHOLDER = re.compile(r'!\[FIG:(\w+)\]\(\)')
+
+# 図ID → web 用派生画像（パス, 幅）の一覧
+_variants: Dict[str, List[Tuple[Path, int]]] = {}
+
+
+def on_pre_build(config, **kwargs):
+    """web 用の派生画像を docs/assets/figs に用意する"""
+    from renditions import RenditionCache, web_variants
+
+    paths = ProjectPaths()
+    docs_figs = Path(config['docs_dir']) / "assets" / "figs"
+    docs_figs.mkdir(parents=True, exist_ok=True)
+    cache = RenditionCache(paths.cache / "renditions")
+    _variants.clear()
+    try:
+        for source in sorted(paths.figs.glob("*.png")):
+            _variants[source.stem] = web_variants(source, docs_figs, cache)
+    except ImportError as e:
+        logger.warning(f"web用の派生画像を作れないため、図は元画像のまま表示します: {e}")
+        _variants.clear()
+        return
+    logger.info(f"🖼️  web用の派生画像: {len(_variants)}図 "
+                f"(キャッシュ ヒット {cache.stats.hits} / ミス {cache.stats.misses})")
+
+
+def figure_html(fig_id: str, alt: str, page_url: str) -> str:
+    """図の <img srcset>（派生画像がなければ空文字列）"""
+    from renditions import srcset_html
+
+    variants = _variants.get(fig_id)
+    if not variants:
+        return ''
+    # 生のHTMLのパスは MkDocs が書き換えないので、ページのURLからの相対パスにする
+    base_url = posixpath.relpath('assets/figs', page_url or '.')
+    return srcset_html(fig_id, alt, variants, base_url)
+
+
+def rewrite_figures(markdown: str, page_url: str) -> str:
+    """本文中の図の参照を <img srcset> に置き換える"""
+    markdown = MARKDOWN_FIGURE.sub(
+        lambda m: figure_html(m.group(2), m.group(1) or m.group(2), page_url) or m.group(0), markdown)
+    return FIG_PLACEHOLDER.sub(
+        lambda m: figure_html(m.group(1), m.group(1), page_url) or m.group(0), markdown)
+
+
+def on_page_markdown(markdown, page, config, files, **kwargs):
+    if not _variants:
+        return markdown
+    return rewrite_figures(markdown, page.url)
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+figure_cache.py - 図のコンテンツアドレス型キャッシュ
+
+生成関数のソース・パレット・rcParams・matplotlib/フォントのバージョンから
+求めたキーごとに、描画済みファイルを .build_cache/figs/ に保存する。
+キーが一致すれば描画せずにファイルを復元する。
+
+各図にはサイドカー（<キー>/<図ID>.json）を置き、キー・描画時間・
+出力ファイルのサイズとハッシュを記録する。
+
+内容が同一のファイル（1回の描画から複数の出力名に保存した図）は
+キャッシュ内・出力先それぞれでハードリンクにより1つの実体を共有する。
+キャッシュと出力先の間はコピーする（片方の書き換えがもう片方に及ばないように）。
+
+復元するたびにエントリの更新時刻を新しくし、描画結果を保存したプロセスで1回だけ、
+古いもの（既定30日）と合計サイズの上限（既定256MB）を超えた分を
+使われていない順に削除する（生成関数を直すたびに古いキーのエントリが残るため）。
+"""
+
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from build_cache import file_digest, get_cache_stats, prune_directory, touch
+from utils import logger
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_MAX_AGE_DAYS = 30
+
+
+def write_atomic(path: Path, data: bytes):
+    """一時ファイルに書いてから置き換える（リンクされた既存ファイルを書き換えない）"""
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+def copy_atomic(source: Path, target: Path):
+    """ファイルをコピーして置き換える"""
+    tmp_path = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+    shutil.copyfile(source, tmp_path)
+    os.replace(tmp_path, target)
+
+
+def link_or_copy(source: Path, target: Path):
+    """
+    target を source へのハードリンクにする
+    
+    既存の target は置き換える（上書きではないので他のリンク先に影響しない）。
+    リンクできないファイルシステムではコピーする。
+    """
+    if target.exists() and os.path.samefile(source, target):
+        return
+    tmp_path = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+    try:
+        os.link(source, tmp_path)
+    except OSError:
+        shutil.copyfile(source, tmp_path)
+    os.replace(tmp_path, target)
+
+
+class FigureCache:
+    """
+    描画済み図のキャッシュストア
+
+    エントリは <キー先頭2文字>/<キー>/ のディレクトリ。復元したエントリは
+    更新時刻を新しくするので、更新時刻が最後に使われた時刻になる。
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int = DEFAULT_MAX_BYTES,
+                 max_age_days: float = DEFAULT_MAX_AGE_DAYS):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.stats = get_cache_stats('figures')
+        self._pruned = False
+
+    def entry_dir(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / key
+
+    def sidecar(self, key: str, fig_id: str) -> Path:
+        return self.entry_dir(key) / f"{fig_id}.json"
+
+    def _read_sidecar(self, key: str, fig_id: str):
+        try:
+            return json.loads(self.sidecar(key, fig_id).read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return None
+
+    def restore(self, key: str, fig_ids: List[str], output_dir: Path) -> bool:
+        """キャッシュにあれば出力先へ復元してTrue（内容が同じファイルは書き換えない）"""
+        entry = self.entry_dir(key)
+        metas = [self._read_sidecar(key, fig_id) for fig_id in fig_ids]
+        if not fig_ids or any(meta is None or meta.get('key') != key for meta in metas):
+            self.stats.miss()
+            return False
+        if any(not (entry / filename).exists() for meta in metas for filename in meta['files']):
+            self.stats.miss()
+            return False
+
+        restored: Dict[str, Path] = {}  # sha256 → 復元済みの出力ファイル
+        for meta in metas:
+            for filename, info in meta['files'].items():
+                target = output_dir / filename
+                if target.exists() and target.stat().st_size == info['bytes'] \
+                        and file_digest(target) == info['sha256']:
+                    restored.setdefault(info['sha256'], target)
+                    continue
+                if info['sha256'] in restored:
+                    link_or_copy(restored[info['sha256']], target)
+                else:
+                    copy_atomic(entry / filename, target)
+                    restored[info['sha256']] = target
+
+        touch(entry)
+        self.stats.hit()
+        return True
+
+    def store(self, key: str, files_by_figure: Dict[str, List[str]], output_dir: Path,
+              render_seconds: float, method: str = ''):
+        """描画結果を保存し、図ごとにサイドカーを書く"""
+        entry = self.entry_dir(key)
+        entry.mkdir(parents=True, exist_ok=True)
+
+        stored: Dict[str, Path] = {}  # sha256 → キャッシュ内の実体
+        for fig_id, filenames in files_by_figure.items():
+            files = {}
+            for filename in filenames:
+                source = output_dir / filename
+                if not source.exists():
+                    continue
+                digest = file_digest(source)
+                if digest in stored:
+                    link_or_copy(stored[digest], entry / filename)
+                else:
+                    copy_atomic(source, entry / filename)
+                    stored[digest] = entry / filename
+                files[filename] = {
+                    'bytes': source.stat().st_size,
+                    'sha256': digest,
+                }
+            meta = {
+                'key': key,
+                'figure': fig_id,
+                'method': method,
+                'render_seconds': round(render_seconds, 4),
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'files': files,
+            }
+            self.sidecar(key, fig_id).write_text(
+                json.dumps(meta, ensure_ascii=False, indent=2), encoding='utf-8')
+        os.utime(entry)
+
+        if not self._pruned:
+            # 書き込みのあるプロセスで1回だけ（復元だけのビルドでは走査しない）
+            self._pruned = True
+            self.prune()
+
+    def prune(self, max_bytes: Optional[int] = None, max_age_days: Optional[float] = None) -> int:
+        """上限を超えた古いエントリをディレクトリごと削除し、削除した件数を返す"""
+        removed = prune_directory(
+            self.cache_dir, "*/*",
+            self.max_bytes if max_bytes is None else max_bytes,
+            self.max_age_days if max_age_days is None else max_age_days)
+        if removed:
+            logger.info(f"🧹 図キャッシュを {removed}件 削除")
+        return removed
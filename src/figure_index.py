@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+figure_index.py - 図生成メソッドのソース索引
+
+diagrams_professional.py を import せずに（matplotlibを読み込まずに）
+ASTから generate_* メソッドごとの出力ファイル名とソースハッシュを求める。
+ハッシュには、メソッド本体・そこから呼ばれるヘルパー（draw_rounded_box 等）・
+モジュール冒頭の設定（COLORS, rcParams）を含める。
+"""
+
+import ast
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Set
+
+GENERATOR_PREFIX = 'generate_'
+NON_FIGURE_METHODS = {'generate_all', 'generate_figures'}
+OUTPUT_NAME = re.compile(r'^(\w+)\.png$')
+FIGURE_DECORATOR = 'figure'
+# 図ごとに出力する形式（PNG: PPTX・プレビュー用、SVG: PDF・Web用、PDF: 印刷入稿用）
+FIGURE_FORMATS = ('png', 'svg', 'pdf')
+# 索引の仕様を変えたら上げる（load_figure_index のキャッシュを無効にする）
+INDEX_VERSION = 1
+
+
+class FigureSource(NamedTuple):
+    """図生成メソッドの索引情報"""
+    method: str
+    outputs: List[str]  # 拡張子なしの出力名
+    digest: str
+
+
+def _segment(lines: List[str], node: ast.AST) -> str:
+    """文・定義ノードのソース（行単位で切り出す。デコレータを含む）"""
+    decorators = getattr(node, 'decorator_list', None)
+    first_line = decorators[0].lineno if decorators else node.lineno
+    return '\n'.join(lines[first_line - 1:node.end_lineno])
+
+
+def _self_attributes(node: ast.AST) -> Set[str]:
+    """self.xxx として参照している属性名"""
+    names = set()
+    for child in ast.walk(node):
+        if (isinstance(child, ast.Attribute) and isinstance(child.value, ast.Name)
+                and child.value.id == 'self'):
+            names.add(child.attr)
+    return names
+
+
+def _registered_ids(node: ast.FunctionDef) -> List[str]:
+    """@figure('xxx', ...) デコレータで登録された図ID"""
+    ids = []
+    for decorator in node.decorator_list:
+        if (isinstance(decorator, ast.Call) and isinstance(decorator.func, ast.Name)
+                and decorator.func.id == FIGURE_DECORATOR):
+            ids.extend(arg.value for arg in decorator.args
+                       if isinstance(arg, ast.Constant) and isinstance(arg.value, str))
+    return ids
+
+
+def _output_names(node: ast.AST) -> List[str]:
+    """出力名（@figure の図ID。なければメソッド内の 'xxx.png' リテラル）"""
+    registered = _registered_ids(node)
+    if registered:
+        return registered
+    names = []
+    for child in ast.walk(node):
+        if isinstance(child, ast.Constant) and isinstance(child.value, str):
+            match = OUTPUT_NAME.match(child.value)
+            if match and match.group(1) not in names:
+                names.append(match.group(1))
+    return names
+
+
+def index_figure_generators(source_path: Path, class_name: str = 'ProfessionalDiagramGenerator'
+                            ) -> Dict[str, FigureSource]:
+    """
+    図生成メソッドの索引を作成
+
+    Returns:
+        {メソッド名: FigureSource}（定義順）
+    """
+    source = source_path.read_text(encoding='utf-8')
+    tree = ast.parse(source)
+    lines = source.splitlines()
+
+    preamble = []
+    class_node = None
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and node.name == class_name:
+            class_node = node
+        elif isinstance(node, (ast.Import, ast.ImportFrom, ast.Assign, ast.AugAssign,
+                               ast.Expr, ast.Try)):
+            preamble.append(_segment(lines, node))
+        elif isinstance(node, ast.If) and 'matplotlib' in _segment(lines, node):
+            preamble.append(_segment(lines, node))
+
+    if class_node is None:
+        raise ValueError(f"{class_name} が見つかりません: {source_path}")
+
+    methods = {
+        node.name: node for node in class_node.body
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))
+    }
+    preamble_digest = hashlib.sha256('\n'.join(preamble).encode('utf-8')).hexdigest()
+
+    def helper_closure(node: ast.AST) -> List[str]:
+        """メソッドから（間接的に）呼ばれるヘルパーメソッド名"""
+        seen: List[str] = []
+        pending = ['__init__'] + sorted(_self_attributes(node))
+        while pending:
+            name = pending.pop()
+            if name in seen or name not in methods or name.startswith(GENERATOR_PREFIX):
+                continue
+            seen.append(name)
+            pending.extend(sorted(_self_attributes(methods[name])))
+        return sorted(seen)
+
+    index: Dict[str, FigureSource] = {}
+    for name, node in methods.items():
+        if not name.startswith(GENERATOR_PREFIX) or name in NON_FIGURE_METHODS:
+            continue
+        outputs = _output_names(node)
+        if not outputs:
+            continue
+        h = hashlib.sha256()
+        h.update(preamble_digest.encode('ascii'))
+        for helper in helper_closure(node):
+            h.update(b'\0')
+            h.update(_segment(lines, methods[helper]).encode('utf-8'))
+        h.update(b'\0')
+        h.update(_segment(lines, node).encode('utf-8'))
+        index[name] = FigureSource(name, outputs, h.hexdigest())
+
+    return index
+
+
+def load_figure_index(source_path: Path, cache_file: Optional[Path] = None,
+                      class_name: str = 'ProfessionalDiagramGenerator') -> Dict[str, FigureSource]:
+    """
+    index_figure_generators のキャッシュ版
+
+    ソースファイルの内容ハッシュが前回と同じなら、ASTを解析せずに
+    cache_file（JSON）の索引を返す。
+    """
+    if cache_file is None:
+        return index_figure_generators(source_path, class_name)
+
+    source_digest = hashlib.sha256(source_path.read_bytes()).hexdigest()
+    key = f"{INDEX_VERSION}:{class_name}:{source_digest}"
+    try:
+        data = json.loads(cache_file.read_text(encoding='utf-8'))
+        if data.get('key') == key:
+            return {name: FigureSource(name, list(outputs), digest)
+                    for name, outputs, digest in data['methods']}
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    index = index_figure_generators(source_path, class_name)
+    data = {'key': key, 'methods': [list(source) for source in index.values()]}
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = cache_file.with_name(f".{cache_file.name}.{os.getpid()}.tmp")
+    tmp_file.write_text(json.dumps(data, ensure_ascii=False), encoding='utf-8')
+    os.replace(tmp_file, cache_file)
+    return index
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+html_cache.py - Markdown→HTML変換のキャッシュ
+
+章・目次のMarkdownを markdown2（tables / fenced-code-blocks / strike /
+task_list / header-ids）でHTML断片に変換した結果を、Markdownの内容ハッシュを
+キーに .build_cache/html/ に保存する。fenced-code-blocks は Pygments で
+シンタックスハイライトするので、変換結果は markdown2 と Pygments の
+バージョンにも依存する（キーに含める）。
+
+同一プロセス内ではメモリ上（LRU）の結果も再利用するので、PDF・HTML出力など
+同じ章を何度変換しても、内容が変わらない限り markdown2 は1回しか動かない。
+
+    from html_cache import markdown_to_html
+    html = markdown_to_html(chapter_file.read_text(encoding='utf-8'))
+
+キャッシュは使うたびに更新時刻を新しくし、古いもの（既定30日）と、
+合計サイズの上限（既定64MB）を超えた分を使われていない順に削除する。
+
+    python src/html_cache.py            # キャッシュの件数・サイズを表示
+    python src/html_cache.py --prune    # 上限に従って削除
+    python src/html_cache.py --clear    # すべて削除
+"""
+
+import hashlib
+import sys
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from build_cache import get_cache_stats, prune_directory, touch
+from figure_cache import write_atomic
+from utils import ProjectPaths, configure_logging, format_file_size, logger
+
+# 変換オプションや出力の形を変えたら上げる（キャッシュキーに含める）
+HTML_CACHE_VERSION = 1
+
+MARKDOWN_EXTRAS = ('tables', 'fenced-code-blocks', 'strike', 'task_list', 'header-ids')
+
+MAX_MEMORY_ENTRIES = 256
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_AGE_DAYS = 30
+
+
+@lru_cache(maxsize=None)
+def converter_version() -> str:
+    """変換結果に影響するライブラリのバージョン（import せずに取得）"""
+    from importlib import metadata
+    versions = []
+    for package in ('markdown2', 'Pygments'):
+        try:
+            versions.append(f"{package}={metadata.version(package)}")
+        except metadata.PackageNotFoundError:
+            versions.append(f"{package}=none")
+    return ','.join(versions)
+
+
+def render_markdown(md_content: str) -> str:
+    """Markdown→HTML変換（キャッシュなし）"""
+    import markdown2
+    return markdown2.markdown(md_content, extras=list(MARKDOWN_EXTRAS))
+
+
+class HTMLCache:
+    """
+    Markdown→HTML変換結果のキャッシュ
+
+    ファイルは <キー先頭2文字>/<キー>.html。ヒットしたファイルは更新時刻を
+    新しくするので、更新時刻が最後に使われた時刻になる。
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int = DEFAULT_MAX_BYTES,
+                 max_age_days: float = DEFAULT_MAX_AGE_DAYS):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.stats = get_cache_stats('html')
+        self._memory: 'OrderedDict[str, str]' = OrderedDict()
+        self._pruned = False
+
+    def key(self, md_content: str) -> str:
+        h = hashlib.sha256()
+        h.update(f"v{HTML_CACHE_VERSION}:{converter_version()}:{','.join(MARKDOWN_EXTRAS)}\n".encode('utf-8'))
+        h.update(md_content.encode('utf-8'))
+        return h.hexdigest()
+
+    def _cache_file(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.html"
+
+    def convert(self, md_content: str) -> str:
+        """Markdown→HTML（キャッシュにあれば変換しない）"""
+        key = self.key(md_content)
+        html = self._memory.get(key)
+        if html is not None:
+            self._memory.move_to_end(key)
+            self.stats.hit()
+            return html
+
+        cache_file = self._cache_file(key)
+        try:
+            html = cache_file.read_text(encoding='utf-8')
+            touch(cache_file)
+            self.stats.hit()
+        except OSError:
+            self.stats.miss()
+            html = render_markdown(md_content)
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            write_atomic(cache_file, html.encode('utf-8'))
+            if not self._pruned:
+                # 書き込みのあるプロセスで1回だけ（読むだけのビルドでは走査しない）
+                self._pruned = True
+                self.prune()
+
+        self._memory[key] = html
+        if len(self._memory) > MAX_MEMORY_ENTRIES:
+            self._memory.popitem(last=False)
+        return html
+
+    def usage(self) -> Tuple[int, int]:
+        """(件数, 合計バイト数)"""
+        files = list(self.cache_dir.glob("*/*.html"))
+        return len(files), sum(f.stat().st_size for f in files)
+
+    def prune(self, max_bytes: Optional[int] = None, max_age_days: Optional[float] = None) -> int:
+        """上限を超えた古いHTMLを削除し、削除した件数を返す（build_cache.prune_directory）"""
+        removed = prune_directory(
+            self.cache_dir, "*/*.html",
+            self.max_bytes if max_bytes is None else max_bytes,
+            self.max_age_days if max_age_days is None else max_age_days)
+        if removed:
+            logger.info(f"🧹 HTMLキャッシュを {removed}件 削除")
+        return removed
+
+    def clear(self):
+        self._memory.clear()
+        self.prune(max_bytes=0)
+
+
+_html_caches: Dict[Path, HTMLCache] = {}
+
+
+def get_html_cache(paths: Optional[ProjectPaths] = None) -> HTMLCache:
+    """プロジェクトのHTMLキャッシュ（プロセス内で共有）"""
+    if paths is None:
+        paths = ProjectPaths()
+    cache = _html_caches.get(paths.cache)
+    if cache is None:
+        cache = _html_caches[paths.cache] = HTMLCache(paths.cache / "html")
+    return cache
+
+
+def markdown_to_html(md_content: str, paths: Optional[ProjectPaths] = None) -> str:
+    """Markdown→HTML変換（キャッシュ経由）"""
+    return get_html_cache(paths).convert(md_content)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Markdown→HTML変換キャッシュの管理")
+    parser.add_argument('--prune', action='store_true', help="古いもの・上限を超えた分を削除する")
+    parser.add_argument('--clear', action='store_true', help="すべて削除する")
+    parser.add_argument('--max-mb', type=float, default=DEFAULT_MAX_BYTES / 1024 / 1024,
+                        help="--prune で残す合計サイズ（MB）")
+    parser.add_argument('--max-age-days', type=float, default=DEFAULT_MAX_AGE_DAYS,
+                        help="--prune で残す最終使用からの日数")
+    args = parser.parse_args()
+    configure_logging()
+
+    cache = get_html_cache()
+    if args.clear:
+        cache.clear()
+    elif args.prune:
+        cache.prune(int(args.max_mb * 1024 * 1024), args.max_age_days)
+    count, size = cache.usage()
+    logger.info(f"HTMLキャッシュ: {count}件 / {format_file_size(size)} ({cache.cache_dir})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+image_optimize.py - 図のPNG最適化
+
+図解は少数の色（COLORS パレット）で塗られた図形が中心なので、
+フルカラーRGBAで保存する必要はない。
+
+1. 完全に不透明ならアルファチャンネルを落とす
+2. MEDIANCUT と FASTOCTREE（RGBAはアルファを保つ FASTOCTREE だけ）で
+   256色以下にパレット化し、PSNR（アルファを含む）が閾値以上のものの
+   うち最も小さいものを採る。色数が256以下なら可逆になることが多い
+3. zlib最大圧縮で再エンコードし、メタデータ（tEXtチャンク等）を落とす
+4. oxipng / optipng がPATHにあれば、PNGのフィルタ・圧縮の組み合わせを
+   探索させて小さくなれば採る（Pillow は行ごとのフィルタを選べないため）
+5. 元より小さくなった場合だけ置き換える
+
+PSNRの閾値（既定40dB）は、アンチエイリアスのかかった文字や細線の周りの
+色の置き換えが見た目で分からない程度。assets/figs の図の多くは
+FASTOCTREE で40〜43dBになり、フルカラーの再エンコードより約85%小さくなる。
+
+使い方:
+    python src/image_optimize.py                     # assets/figs と docs/assets/figs
+    python src/image_optimize.py path/to/*.png -j 8  # 指定ファイルを8スレッドで
+"""
+
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional, Tuple
+
+from build_cache import file_digest
+from utils import logger
+
+# Pillow は最適化するときにだけ読み込む
+if TYPE_CHECKING:
+    from PIL import Image
+
+# パレット化を許容する最小PSNR（dB）。図解では40dB以上なら見た目の差は分からない
+DEFAULT_MIN_PSNR = 40.0
+PALETTE_COLORS = 256
+
+# 外部のPNG最適化ツール（見つかった最初のもの）。ファイルパスを最後に付けて実行する
+EXTERNAL_OPTIMIZERS = (
+    ('oxipng', ['-o', '4', '--strip', 'safe', '--quiet']),
+    ('optipng', ['-o2', '-quiet']),
+)
+EXTERNAL_TIMEOUT = 120  # 秒
+
+# 最適化の仕様を変えたら上げる（図キャッシュのキーにも含める）
+OPTIMIZER_VERSION = 3
+MANIFEST_VERSION = 1
+
+
+class OptimizeResult(NamedTuple):
+    """1ファイル（または同一内容のファイル群）の最適化結果"""
+    paths: List[Path]
+    before: int
+    after: int
+    mode: str  # 'palette' / 'palette-lossy' / 'RGB' / 'RGBA' / 'skip'
+
+    @property
+    def saved(self) -> int:
+        return self.before - self.after
+
+
+def psnr(original: 'Image.Image', candidate: 'Image.Image') -> float:
+    """2画像間のPSNR（dB）。同一なら無限大"""
+    from PIL import ImageChops, ImageStat
+    
+    diff = ImageChops.difference(original, candidate.convert(original.mode))
+    mse = sum(rms * rms for rms in ImageStat.Stat(diff).rms) / len(diff.getbands())
+    if mse == 0:
+        return math.inf
+    return 20 * math.log10(255 / math.sqrt(mse))
+
+
+def _encode(image: 'Image.Image', dpi=None) -> bytes:
+    buffer = BytesIO()
+    options = {'optimize': True}  # optimize=True で zlib レベル9
+    if dpi:
+        options['dpi'] = dpi
+    image.save(buffer, format='PNG', **options)
+    return buffer.getvalue()
+
+
+@lru_cache(maxsize=None)
+def external_optimizer() -> Optional[List[str]]:
+    """PATHにある外部のPNG最適化ツールのコマンド（なければNone）"""
+    for name, options in EXTERNAL_OPTIMIZERS:
+        path = shutil.which(name)
+        if path:
+            return [path] + options
+    return None
+
+
+def recompress_external(data: bytes) -> bytes:
+    """外部ツールでフィルタ・圧縮を探索して再圧縮（ツールがない・失敗したら元のまま）"""
+    command = external_optimizer()
+    if command is None:
+        return data
+    fd, tmp_name = tempfile.mkstemp(suffix='.png')
+    tmp_path = Path(tmp_name)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        subprocess.run(command + [tmp_name], check=True, timeout=EXTERNAL_TIMEOUT,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        result = tmp_path.read_bytes()
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.debug(f"外部ツールでの再圧縮に失敗: {e}")
+        return data
+    finally:
+        try:
+            tmp_path.unlink()
+        except OSError:
+            pass
+    return result if 0 < len(result) < len(data) else data
+
+
+def palette_candidates(image: 'Image.Image', min_psnr: float) -> List[Tuple[bytes, str]]:
+    """PSNRの閾値を満たすパレット化の候補（エンコード済みのバイト列, 形式）"""
+    from PIL import Image
+
+    colors = image.getcolors(PALETTE_COLORS)
+    count = len(colors) if colors is not None else PALETTE_COLORS
+    # MEDIANCUT はアルファを扱えないので、RGBA は FASTOCTREE（アルファごと量子化）だけ
+    methods = [Image.Quantize.FASTOCTREE]
+    if image.mode == 'RGB':
+        methods.insert(0, Image.Quantize.MEDIANCUT)
+
+    candidates = []
+    for method in methods:
+        palette_image = image.quantize(count, method=method, dither=Image.Dither.NONE)
+        score = psnr(image, palette_image)
+        if score == math.inf:
+            candidates.append((palette_image, 'palette'))
+        elif score >= min_psnr:
+            candidates.append((palette_image, 'palette-lossy'))
+    return candidates
+
+
+def optimize_png_bytes(data: bytes, min_psnr: float = DEFAULT_MIN_PSNR) -> Tuple[bytes, str]:
+    """
+    PNGのバイト列を最適化
+
+    Returns:
+        (最適化後のバイト列, 採用した形式)。小さくならなければ元のバイト列と 'skip'
+    """
+    from PIL import Image
+    
+    with Image.open(BytesIO(data)) as source:
+        source.load()
+        dpi = source.info.get('dpi')
+        image = source
+        if image.mode == 'RGBA' and image.getchannel('A').getextrema() == (255, 255):
+            image = image.convert('RGB')
+        elif image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+
+        # パレット化できればその中で最小のものを採用（フルカラーの再エンコードより
+        # 常に小さい）。できなければ元の形式のまま最大圧縮で再エンコードする
+        candidates = [(_encode(palette_image, dpi), mode)
+                      for palette_image, mode in palette_candidates(image, min_psnr)]
+        if not candidates:
+            candidates = [(_encode(image, dpi), image.mode)]
+
+    best, mode = min(candidates, key=lambda candidate: len(candidate[0]))
+    best = recompress_external(best)
+    if len(best) >= len(data):
+        return data, 'skip'
+    return best, mode
+
+
+def _replace(path: Path, data: bytes):
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+class PNGOptimizer:
+    """
+    PNGファイル群の最適化
+
+    同一内容のファイル（ハードリンクや同じ図の複数出力名）はまとめて1回だけ処理する。
+    manifest_file を指定すると、最適化済みファイルのハッシュを記録して次回はスキップする。
+    """
+
+    def __init__(self, manifest_file: Optional[Path] = None, min_psnr: float = DEFAULT_MIN_PSNR):
+        self.manifest_file = manifest_file
+        self.min_psnr = min_psnr
+        self.optimized = self._load_manifest()
+
+    @property
+    def settings_key(self) -> str:
+        return f"png-optimize:{OPTIMIZER_VERSION}:{self.min_psnr}"
+
+    def _load_manifest(self) -> Dict[str, int]:
+        if self.manifest_file is None or not self.manifest_file.exists():
+            return {}
+        try:
+            data = json.loads(self.manifest_file.read_text(encoding='utf-8'))
+        except (OSError, ValueError) as e:
+            logger.warning(f"最適化マニフェストの読み込みに失敗: {e}")
+            return {}
+        if data.get('version') != MANIFEST_VERSION or data.get('settings') != self.settings_key:
+            return {}
+        return data.get('optimized', {})
+
+    def _save_manifest(self):
+        if self.manifest_file is None:
+            return
+        self.manifest_file.parent.mkdir(parents=True, exist_ok=True)
+        data = {'version': MANIFEST_VERSION, 'settings': self.settings_key,
+                'optimized': dict(sorted(self.optimized.items()))}
+        _replace(self.manifest_file, json.dumps(data, indent=2).encode('utf-8'))
+
+    def _optimize_group(self, digest: str, paths: List[Path]) -> OptimizeResult:
+        first = paths[0]
+        data = first.read_bytes()
+        if digest in self.optimized:
+            return OptimizeResult(paths, len(data), len(data), 'skip')
+
+        optimized, mode = optimize_png_bytes(data, self.min_psnr)
+        if optimized is not data:
+            _replace(first, optimized)
+            for path in paths[1:]:
+                # 同一内容のファイルは1つ目へのリンクにする（リンクできなければコピー）
+                tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+                try:
+                    os.link(first, tmp_path)
+                except OSError:
+                    tmp_path.write_bytes(optimized)
+                os.replace(tmp_path, path)
+        return OptimizeResult(paths, len(data), len(optimized), mode)
+
+    def optimize(self, paths: List[Path], workers: int = 4) -> List[OptimizeResult]:
+        """ファイル群をスレッドプールで最適化（PillowとzlibはGILを解放する）"""
+        groups: Dict[str, List[Path]] = {}
+        for path in paths:
+            groups.setdefault(file_digest(path), []).append(path)
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            results = list(pool.map(lambda item: self._optimize_group(*item), groups.items()))
+
+        for result in results:
+            self.optimized[file_digest(result.paths[0])] = result.after
+        self._save_manifest()
+        return results
+
+
+def format_bytes(size: int) -> str:
+    return f"{size / 1024:.0f}KB" if size < 1024 * 1024 else f"{size / 1024 / 1024:.1f}MB"
+
+
+def report_results(results: List[OptimizeResult]):
+    """ファイルごとの削減量と合計を表示"""
+    for result in sorted(results, key=lambda r: r.paths[0].name):
+        names = ', '.join(path.name for path in result.paths)
+        if result.mode == 'skip':
+            print(f"  = {names} ({format_bytes(result.before)}, 最適化済み)")
+            continue
+        ratio = result.saved / result.before * 100 if result.before else 0
+        print(f"  ✓ {names}: {format_bytes(result.before)} → {format_bytes(result.after)} "
+              f"(-{ratio:.0f}%, {result.mode})")
+
+    # 同一内容のファイル群はファイル数ぶん削減されたとみなす
+    before = sum(result.before * len(result.paths) for result in results)
+    after = sum(result.after * len(result.paths) for result in results)
+    print(f"📉 合計: {format_bytes(before)} → {format_bytes(after)} "
+          f"({format_bytes(before - after)} 削減)")
+
+
+def main():
+    import argparse
+    from utils import ProjectPaths, configure_logging
+
+    parser = argparse.ArgumentParser(description="図のPNGを最適化（パレット化・再圧縮・メタデータ除去）")
+    parser.add_argument('files', nargs='*', type=Path,
+                        help="対象のPNG。省略時は assets/figs と docs/assets/figs のすべて")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 4, metavar='N',
+                        help="N スレッドで並列に処理する")
+    parser.add_argument('--min-psnr', type=float, default=DEFAULT_MIN_PSNR,
+                        help=f"非可逆のパレット化を許容する最小PSNR（既定 {DEFAULT_MIN_PSNR}dB）")
+    args = parser.parse_args()
+    configure_logging()
+
+    paths = ProjectPaths()
+    files = args.files or sorted(paths.figs.glob("*.png")) + \
+        sorted((paths.root / "docs" / "assets" / "figs").glob("*.png"))
+    if not files:
+        logger.warning("対象のPNGがありません")
+        return 0
+
+    optimizer = PNGOptimizer(paths.cache / "png_optimized.json", min_psnr=args.min_psnr)
+    logger.info(f"PNG最適化: {len(files)}ファイル（{args.jobs}スレッド）")
+    report_results(optimizer.optimize(files, workers=args.jobs))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+layout_cache.py - PDFのパート（表紙・目次・章）ごとのレイアウト済みページのキャッシュ
+
+PDFBuilder はパートごとにレイアウトしたPDFをつないで1冊にする（pdf_build.py）。
+パートのHTML（本文・開始ページ番号を含む）、スタイルシート、参照している画像の
+内容ハッシュ、PDFの出力設定、WeasyPrintのバージョンから求めたキーごとに、
+レイアウト済みのPDFを .build_cache/pdf_layout/parts/ に保存する。
+キーが一致するパートはレイアウトせずにこのPDFを使う。
+
+1章だけ直した場合は、その章（とページ数が変わって開始ページがずれた後続の章）
+だけがレイアウトし直しになる。
+
+キャッシュは使うたびに更新時刻を新しくし、レイアウトを書き込んだビルドの後に、
+古いもの（既定30日）と合計サイズの上限（既定256MB）を超えた分を
+使われていない順に削除する（build_cache.prune_directory）。
+"""
+
+import hashlib
+import json
+import re
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+from urllib.parse import unquote, urljoin, urlparse
+
+from build_cache import file_digest, get_cache_stats, prune_directory, touch
+from figure_cache import write_atomic
+from utils import logger
+
+# レイアウトやPDFの書き出し方を変えたら上げる（キャッシュキーに含める）
+LAYOUT_CACHE_VERSION = 1
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_MAX_AGE_DAYS = 30
+
+IMAGE_SRC = re.compile(r'<img\b[^>]*?\bsrc="([^"]+)"')
+
+
+class CachedLayout(NamedTuple):
+    """キャッシュから取り出したパート"""
+    pdf: bytes
+    pages: int
+
+
+def part_assets(html: str, base_url: str) -> List[Path]:
+    """
+    パートが参照しているローカルの画像ファイル
+
+    図（fig: のURL）は図のハッシュをURLに含むので、HTMLのハッシュで足りる。
+    """
+    assets = []
+    base = Path(base_url).resolve().as_uri() + '/'
+    for src in IMAGE_SRC.findall(html):
+        url = urlparse(urljoin(base, src))
+        if url.scheme == 'file':
+            assets.append(Path(unquote(url.path)))
+    return assets
+
+
+@lru_cache(maxsize=None)
+def engine_version() -> str:
+    """WeasyPrint のバージョン（import せずに取得）"""
+    from importlib import metadata
+    try:
+        return metadata.version('weasyprint')
+    except metadata.PackageNotFoundError:
+        return 'none'
+
+
+def layout_key(html: str, base_url: str, settings: str, stylesheet: str) -> str:
+    """
+    パートのキャッシュキー
+
+    html は開始ページ番号の指定を含む完全なHTML（PDFBuilder.full_html）、
+    settings はPDFの出力設定（BuildProfile.document_settings）、
+    stylesheet はレイアウト時に渡すCSS（PDFBuilder.css_style）。
+    """
+    h = hashlib.sha256()
+    h.update(f"v{LAYOUT_CACHE_VERSION}:{settings}:weasyprint={engine_version()}\n".encode('utf-8'))
+    h.update(stylesheet.encode('utf-8'))
+    h.update(html.encode('utf-8'))
+    for asset in part_assets(html, base_url):
+        digest = file_digest(asset) if asset.exists() else 'missing'
+        h.update(f"\n{asset.name}:{digest}".encode('utf-8'))
+    return h.hexdigest()
+
+
+class LayoutCache:
+    """
+    レイアウト済みパートのキャッシュストア
+
+    ファイルは <キー先頭2文字>/<キー>.pdf と同名の .json。ヒットしたPDFは
+    更新時刻を新しくするので、更新時刻が最後に使われた時刻になる。
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int = DEFAULT_MAX_BYTES,
+                 max_age_days: float = DEFAULT_MAX_AGE_DAYS):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.stats = get_cache_stats('pdf-layout')
+
+    def entry(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.pdf"
+
+    def sidecar(self, key: str) -> Path:
+        return self.entry(key).with_suffix('.json')
+
+    def get(self, key: str) -> Optional[CachedLayout]:
+        try:
+            meta = json.loads(self.sidecar(key).read_text(encoding='utf-8'))
+            pdf = self.entry(key).read_bytes()
+        except (OSError, ValueError):
+            self.stats.miss()
+            return None
+        if meta.get('key') != key or len(pdf) != meta.get('bytes'):
+            self.stats.miss()
+            return None
+        touch(self.entry(key))
+        self.stats.hit()
+        return CachedLayout(pdf, meta['pages'])
+
+    def put(self, key: str, pdf: bytes, pages: int, part: str = '', layout_seconds: float = 0.0):
+        entry = self.entry(key)
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(entry, pdf)
+        meta = {
+            'key': key,
+            'part': part,
+            'pages': pages,
+            'bytes': len(pdf),
+            'layout_seconds': round(layout_seconds, 4),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+        write_atomic(self.sidecar(key), json.dumps(meta, ensure_ascii=False, indent=2).encode('utf-8'))
+
+    @staticmethod
+    def _remove(entry: Path):
+        """PDFとサイドカーを削除"""
+        entry.unlink()
+        try:
+            entry.with_suffix('.json').unlink()
+        except OSError:
+            pass
+
+    def prune(self, max_bytes: Optional[int] = None, max_age_days: Optional[float] = None) -> int:
+        """上限を超えた古いパートをサイドカーごと削除し、削除した件数を返す"""
+        removed = prune_directory(
+            self.cache_dir, "*/*.pdf",
+            self.max_bytes if max_bytes is None else max_bytes,
+            self.max_age_days if max_age_days is None else max_age_days,
+            remove=self._remove)
+        if removed:
+            logger.info(f"🧹 PDFレイアウトキャッシュを {removed}件 削除")
+        return removed
@@ -4,21 +4,304 @@
 pdf_build.py - Markdown原稿からPDF生成（日本語対応版）
 """
 
+import contextlib
+import io
+import json
 import sys
+import time
+from collections import OrderedDict
+from functools import lru_cache
 from pathlib import Path
-import markdown2
-from weasyprint import HTML, CSS
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
 import re
 
-from utils import ProjectPaths, logger
+import tracing
+from utils import ProjectPaths, FIGURE_REF, configure_logging, logger
+from build_cache import get_cache_stats
+from layout_cache import LayoutCache, layout_key
+from html_cache import markdown_to_html
+from renditions import RenditionCache, print_spec, resolve_rendition
+from profiles import RELEASE, BuildProfile, PROFILES, get_profile
+from tracing import span
+
+
+class DocumentPart(NamedTuple):
+    """改ページ単位の本文（表紙・目次・章）"""
+    name: str
+    html: str
+
+
+class PartLayout(NamedTuple):
+    """ワーカーでレイアウトしたパート"""
+    pdf: bytes
+    pages: int
+    seconds: float        # レイアウトとPDFの書き出し
+    setup_seconds: float  # スタイルシートのコンパイルとフォントの解決（プロセスごとに初回だけ）
+    peak_rss_mb: float
+    trace: list
+
+
+CHAPTER_BREAK = '<div class="chapter-break"></div>'
+
+# 並列レイアウトのワーカーを作り直すまでのパート数（WeasyPrintのメモリを解放し、
+# ワーカーのピークRSSを1パート分程度に抑える。Python 3.11 以降）
+LAYOUT_TASKS_PER_CHILD = 4
+
+# 別のパートへの内部リンクの仮のURI（つないだ後に名前付き宛先へのリンクに戻す）
+INTERNAL_LINK_SCHEME = 'bim-anchor:'
+ANCHOR_ID = re.compile(r'\bid="([^"]+)"')
+INTERNAL_HREF = re.compile(r'href="#([^"]+)"')
+
+
+def pypdf_available() -> bool:
+    import importlib.util
+    return importlib.util.find_spec('pypdf') is not None
+
+
+def layout_pool(jobs: int):
+    """並列レイアウト用のプロセスプール（ワーカーは一定数のパートごとに作り直す）"""
+    from concurrent.futures import ProcessPoolExecutor
+    if sys.version_info >= (3, 11):
+        import multiprocessing
+        # max_tasks_per_child は fork では使えない
+        return ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context('spawn'),
+                                   max_tasks_per_child=LAYOUT_TASKS_PER_CHILD)
+    return ProcessPoolExecutor(max_workers=jobs)
+
+
+@lru_cache(maxsize=None)
+def font_configuration():
+    """WeasyPrint のフォント設定（プロセス内で共有し、fontconfig の解決結果を使い回す）"""
+    from weasyprint.text.fonts import FontConfiguration
+    return FontConfiguration()
+
+
+@lru_cache(maxsize=8)
+def compiled_stylesheet(css_text: str):
+    """
+    コンパイル済みのスタイルシート（プロセス内で共有）
+    
+    あわせて日本語の短い文書を一度レイアウトし、font-family の候補
+    （Noto Sans JP, ヒラギノ, メイリオ…）の解決をここで済ませておく。
+    以後のVOL・章・常駐サーバーへの要求では、解析済みのCSSと解決済みの
+    フォントをそのまま使う。
+    """
+    from weasyprint import CSS, HTML
+    stylesheet = CSS(string=css_text, font_config=font_configuration())
+    HTML(string='<h1>BIM</h1><p>BIM 教科書 <code>IFC</code></p>').render(
+        stylesheets=[stylesheet], font_config=font_configuration())
+    return stylesheet
+
+
+def prepare_stylesheet(css_text: str) -> Tuple[object, float]:
+    """(スタイルシート, 準備にかかった秒数)。2回目以降はほぼ0秒"""
+    start = time.perf_counter()
+    with span('weasyprint:setup', 'pdf'):
+        stylesheet = compiled_stylesheet(css_text)
+    return stylesheet, time.perf_counter() - start
+
+
+def layout_part(html: str, base_url: str, profile_name: str, anchors: Set[str],
+                css_text: str, trace: bool = False) -> PartLayout:
+    """
+    1パートをレイアウトしてPDFのバイト列を返す（ワーカープロセスで実行）
+    
+    base_url は図の出力先（fig: のURLもここから解決する）。
+    anchors はこのパートにある id。それ以外への内部リンクは
+    WeasyPrint に捨てられないよう、仮のURIにしておく。
+    """
+    from weasyprint import HTML
+    
+    html = INTERNAL_HREF.sub(
+        lambda m: m.group(0) if m.group(1) in anchors else f'href="{INTERNAL_LINK_SCHEME}{m.group(1)}"',
+        html)
+    options = dict(get_profile(profile_name).pdf_options, cache=image_cache())
+    if trace:
+        tracing.start('pdf-layout')
+    stylesheet, setup_seconds = prepare_stylesheet(css_text)
+    start = time.perf_counter()
+    with span('weasyprint:layout', 'pdf'):
+        document = HTML(string=html, base_url=base_url,
+                        url_fetcher=worker_url_fetcher(base_url, profile_name)).render(
+            stylesheets=[stylesheet], font_config=font_configuration(), **options)
+    with span('weasyprint:write_pdf', 'pdf', pages=len(document.pages)):
+        pdf = document.write_pdf(**options)
+    seconds = time.perf_counter() - start
+    events = tracing.stop() if trace else []
+    return PartLayout(pdf, len(document.pages), seconds, setup_seconds, tracing.peak_rss_mb(), events)
+
+
+def collect_layout(name: str, layout: PartLayout) -> PartLayout:
+    """ワーカーの結果を受け取る（スパンを親プロセスのトレースに取り込む）"""
+    tracing.add_events(layout.trace)
+    logger.debug(f"  {name}: {layout.pages}ページ {layout.seconds:.2f}秒")
+    return layout._replace(trace=[])
+
+
+def stitch_pdfs(pdfs: List[bytes], output_file: Path):
+    """
+    パートのPDFを順につなぐ
+    
+    名前付き宛先（見出しの id）はすべてのパートから引き継ぎ、
+    仮のURIにしておいた別パートへの内部リンクをそれらへのリンクに戻す。
+    """
+    from pypdf import PdfReader, PdfWriter
+    from pypdf.generic import DictionaryObject, NameObject, TextStringObject
+    
+    writer = PdfWriter()
+    for pdf in pdfs:
+        writer.append(PdfReader(io.BytesIO(pdf)))
+    
+    for page in writer.pages:
+        for annotation in page.get('/Annots') or []:
+            annotation = annotation.get_object()
+            action = annotation.get('/A')
+            uri = action.get_object().get('/URI') if action is not None else None
+            if uri is None or not str(uri).startswith(INTERNAL_LINK_SCHEME):
+                continue
+            annotation[NameObject('/A')] = DictionaryObject({
+                NameObject('/S'): NameObject('/GoTo'),
+                NameObject('/D'): TextStringObject(str(uri)[len(INTERNAL_LINK_SCHEME):]),
+            })
+    
+    with open(output_file, 'wb') as f:
+        writer.write(f)
+
+
+def load_page_history(path: Path) -> Dict[str, int]:
+    try:
+        return {name: int(pages) for name, pages in json.loads(path.read_text(encoding='utf-8')).items()}
+    except (OSError, ValueError, AttributeError):
+        return {}
+
+
+def save_page_history(path: Path, pages: Dict[str, int]):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(pages, ensure_ascii=False), encoding='utf-8')
+
+
+# 図の参照 ![FIG:xxx]() は fig:xxx?v=<ハッシュ> のURLにしておき、
+# WeasyPrint の url_fetcher（figure_url_fetcher）で図ファイルに解決する
+FIGURE_SCHEME = 'fig:'
+FIGURE_MIME_TYPES = {'.svg': 'image/svg+xml', '.png': 'image/png'}
+
+# 図のバイト列のLRU（プロセス内で共有。VOLをまたいで各ファイルを1回だけ読む）
+MAX_ASSET_CACHE_BYTES = 128 * 1024 * 1024
+_asset_bytes: 'OrderedDict[Tuple[str, int, int], bytes]' = OrderedDict()
+_asset_stats = get_cache_stats('pdf-assets')
+
+# WeasyPrint のデコード済み画像のキャッシュ（render の cache オプション。URLがキー）。
+# URLに図のハッシュを含めるので、図が変わっても古い画像は使われない
+MAX_IMAGE_CACHE_ENTRIES = 512
+_image_cache: Dict[str, object] = {}
+
+
+def read_asset(path: Path) -> bytes:
+    """図ファイルの内容（パス・mtime・サイズが同じならメモリから）"""
+    st = path.stat()
+    key = (str(path), st.st_mtime_ns, st.st_size)
+    data = _asset_bytes.get(key)
+    if data is not None:
+        _asset_bytes.move_to_end(key)
+        _asset_stats.hit()
+        return data
+    _asset_stats.miss()
+    data = path.read_bytes()
+    _asset_bytes[key] = data
+    total = sum(len(value) for value in _asset_bytes.values())
+    while total > MAX_ASSET_CACHE_BYTES and len(_asset_bytes) > 1:
+        _, evicted = _asset_bytes.popitem(last=False)
+        total -= len(evicted)
+    return data
+
+
+def image_cache() -> Dict[str, object]:
+    """VOL・要求をまたいで共有する WeasyPrint の画像キャッシュ"""
+    if len(_image_cache) > MAX_IMAGE_CACHE_ENTRIES:
+        _image_cache.clear()
+    return _image_cache
+
+
+class FigureAssets:
+    """
+    図IDから印刷に使う図ファイルを解決する
+    
+    ベクター版があればそれを使う（PDFが小さく、拡大しても鮮明）。
+    なければPNGの印刷用派生画像（本文幅・print_dpi）を使う。
+    """
+    
+    def __init__(self, figures_dir: Path, profile: BuildProfile = RELEASE):
+        self.figures_dir = figures_dir
+        self.renditions = RenditionCache(ProjectPaths().cache / "renditions")
+        self.print_spec = print_spec(profile.print_dpi)
+    
+    def resolve(self, fig_id: str) -> Optional[Path]:
+        """図ファイルを探す（SVG → PNGの印刷用派生画像の順）"""
+        vector_path = self.figures_dir / f"{fig_id}.svg"
+        if vector_path.exists():
+            return vector_path
+        return resolve_rendition(self.figures_dir, fig_id, self.print_spec, self.renditions)
+    
+    def url(self, fig_id: str, path: Path) -> str:
+        """fig: のURL（図の内容が変わればURLも変わる）"""
+        return f"{FIGURE_SCHEME}{fig_id}?v={self.renditions.source_digest(path)[:16]}"
+    
+    def fetch(self, url: str) -> Tuple[bytes, str]:
+        """fig: のURL → (バイト列, MIMEタイプ)"""
+        fig_id = url[len(FIGURE_SCHEME):].split('?', 1)[0]
+        path = self.resolve(fig_id)
+        if path is None:
+            raise FileNotFoundError(f"図が見つかりません: {fig_id}")
+        return read_asset(path), FIGURE_MIME_TYPES.get(path.suffix, 'application/octet-stream')
+
+
+def figure_url_fetcher(assets: FigureAssets):
+    """
+    fig: のURLを assets で解決し、それ以外は WeasyPrint の既定の取得処理に任せる url_fetcher
+    
+    WeasyPrint 67 以降は URLFetcher のサブクラス、それより前は
+    辞書を返す関数を url_fetcher として渡す。
+    """
+    from weasyprint import urls
+    
+    if hasattr(urls, 'URLFetcherResponse'):
+        class FigureURLFetcher(urls.URLFetcher):
+            def fetch(self, url, headers=None):
+                if url.startswith(FIGURE_SCHEME):
+                    data, mime_type = assets.fetch(url)
+                    return urls.URLFetcherResponse(url, data, {'Content-Type': mime_type})
+                return super().fetch(url, headers)
+        return FigureURLFetcher()
+    
+    def fetch(url):
+        if url.startswith(FIGURE_SCHEME):
+            data, mime_type = assets.fetch(url)
+            return {'string': data, 'mime_type': mime_type, 'redirected_url': url}
+        return urls.default_url_fetcher(url)
+    return fetch
+
+
+@lru_cache(maxsize=None)
+def worker_url_fetcher(figures_dir: str, profile_name: str):
+    """ワーカープロセス用の url_fetcher（プロセス内で共有）"""
+    return figure_url_fetcher(FigureAssets(Path(figures_dir), get_profile(profile_name)))
+
 
 
 class PDFBuilder:
     """PDF生成クラス（日本語対応・WeasyPrint版）"""
     
-    def __init__(self, output_dir: Path):
+    def __init__(self, output_dir: Path, profile: BuildProfile = RELEASE,
+                 figures_dir: Optional[Path] = None):
         self.output_dir = output_dir
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.profile = profile
+        self.figures_dir = figures_dir or self.output_dir.parent / "assets" / "figs"
+        self.assets = FigureAssets(self.figures_dir, profile)
+        self.renditions = self.assets.renditions
+        self.print_spec = self.assets.print_spec
+        self.url_fetcher = None  # 初回のレイアウト時に作る（WeasyPrintの読み込みが重いため）
+        self.layout_cache = LayoutCache(ProjectPaths().cache / "pdf_layout" / "parts")
         
         # CSSスタイル
         self.css_style = """
@@ -163,29 +446,42 @@ class PDFBuilder:
         .chapter-break {
             page-break-before: always;
         }
+        
+        img {
+            display: block;
+            max-width: 100%;
+            height: auto;
+            margin: 15px auto;
+        }
         """
     
+    def resolve_figure(self, fig_id: str) -> Optional[Path]:
+        """図ファイルを探す（SVG → PNGの印刷用派生画像の順）"""
+        return self.assets.resolve(fig_id)
+    
+    def resolve_figures(self, md_content: str) -> str:
+        """![FIG:xxx]() を fig: のURLへの参照に置き換える（url_fetcher が図ファイルを返す）"""
+        def replace(match):
+            fig_id = match.group(1)
+            figure_path = self.resolve_figure(fig_id)
+            if figure_path is None:
+                logger.warning(f"図が見つかりません: {fig_id}")
+                return match.group(0)
+            return f"![FIG:{fig_id}]({self.assets.url(fig_id, figure_path)})"
+        return FIGURE_REF.sub(replace, md_content)
+    
     def markdown_to_html(self, md_content: str) -> str:
-        """Markdown→HTML変換（日本語対応）"""
-        # markdown2で変換（日本語対応）
-        html = markdown2.markdown(
-            md_content,
-            extras=[
-                'tables',
-                'fenced-code-blocks',
-                'strike',
-                'task_list',
-                'header-ids'
-            ]
-        )
-        return html
+        """Markdown→HTML変換（日本語対応。内容が同じなら html_cache.py のキャッシュを使う）"""
+        return markdown_to_html(md_content)
     
-    def build_pdf(self, volume_name: str, manuscript_dir: Path):
-        """PDFを生成（日本語対応）"""
-        output_file = self.output_dir / f"{volume_name}.pdf"
+    def document_parts(self, volume_name: str, manuscript_dir: Path) -> Tuple[str, List[DocumentPart]]:
+        """
+        VOLの本文を改ページ（chapter-break）単位に分ける
         
-        # HTMLコンテンツを構築
-        html_parts = []
+        Returns:
+            (タイトル, [表紙, 目次, 各章])
+        """
+        parts = []
         
         # 表紙
         if "vol1" in volume_name:
@@ -195,7 +491,7 @@ class PDFBuilder:
             title = "BIM利用技術者試験準1級対応"
             subtitle = "教科書"
         
-        html_parts.append(f'''
+        parts.append(DocumentPart('cover', f'''
         <div class="cover-page">
             <div class="cover-title">{title}</div>
             <div class="cover-subtitle">{subtitle}</div>
@@ -204,74 +500,255 @@ class PDFBuilder:
                 Version 1.0.0
             </p>
         </div>
-        <div class="chapter-break"></div>
-        ''')
+        '''))
         
         # 目次
         toc_file = manuscript_dir / "00_toc.md"
         if toc_file.exists():
             toc_content = toc_file.read_text(encoding='utf-8')
-            html_parts.append(self.markdown_to_html(toc_content))
-            html_parts.append('<div class="chapter-break"></div>')
+            parts.append(DocumentPart(toc_file.stem, self.markdown_to_html(toc_content)))
         
-        # 各章を追加
+        # 各章
         chapter_files = sorted(manuscript_dir.glob("chapter_*.md"))
         for chapter_file in chapter_files:
             logger.info(f"  処理中: {chapter_file.name}")
-            content = chapter_file.read_text(encoding='utf-8')
-            html = self.markdown_to_html(content)
-            html_parts.append(html)
-            html_parts.append('<div class="chapter-break"></div>')
+            with span(chapter_file.name, 'chapter', volume=volume_name):
+                with span('resolve_figures', 'pdf'):
+                    content = self.resolve_figures(chapter_file.read_text(encoding='utf-8'))
+                with span('markdown_to_html', 'pdf'):
+                    html = self.markdown_to_html(content)
+            parts.append(DocumentPart(chapter_file.stem, html))
+        return title, parts
+    
+    def full_html(self, title: str, body: str, first_page: int = 1) -> str:
+        """
+        完全なHTML（first_page は最初のページのページ番号）
         
-        # 完全なHTML
-        full_html = f'''
+        css_style は埋め込まず、コンパイル済みのものをレイアウト時に渡す
+        （compiled_stylesheet を参照）。
+        """
+        page_css = f"@page :first {{ counter-reset: page {first_page}; }}" if first_page != 1 else ""
+        return f'''
         <!DOCTYPE html>
         <html lang="ja">
         <head>
             <meta charset="UTF-8">
             <title>{title}</title>
-            <style>{self.css_style}</style>
+            <style>{page_css}</style>
         </head>
         <body>
-            {"".join(html_parts)}
+            {body}
         </body>
         </html>
         '''
+    
+    def build_pdf(self, volume_name: str, manuscript_dir: Path, jobs: int = 1):
+        """
+        PDFを生成（日本語対応）
         
-        # WeasyPrintでPDF生成
-        HTML(string=full_html, base_url=str(manuscript_dir)).write_pdf(
-            str(output_file)
-        )
+        表紙・目次・各章を別々にレイアウトしてキャッシュし、pypdf でつなぐ
+        （layout_parts を参照）。jobs > 1 の場合はそれらを別プロセスで並列に行う。
+        pypdf がなければ、VOL全体を1つのHTMLとしてレイアウトする。
+        """
+        output_file = self.output_dir / f"{volume_name}.pdf"
+        title, parts = self.document_parts(volume_name, manuscript_dir)
+        
+        if pypdf_available():
+            self.layout_parts(volume_name, title, parts, output_file, jobs)
+            logger.info(f"✅ PDF生成完了: {output_file}")
+            return output_file
+        if jobs > 1:
+            logger.info("  pypdf がないため、章ごとの並列レイアウトは行いません")
+        
+        body = CHAPTER_BREAK.join(part.html for part in parts)
+        full_html = self.full_html(title, body)
         
+        # WeasyPrintでPDF生成（画像の圧縮・解像度はプロファイルに従う）
+        # WeasyPrintは読み込みが重いので、実際に生成するときだけ import する
+        # レイアウトと書き出しを分けて呼ぶ（HTML.write_pdf と同じ処理。計測のため）
+        # 図は fig: のURLを url_fetcher で解決する。相対パスも図の出力先から解決する
+        from weasyprint import HTML
+        stylesheet, setup_seconds = prepare_stylesheet(self.css_style)
+        if self.url_fetcher is None:
+            self.url_fetcher = figure_url_fetcher(self.assets)
+        options = dict(self.profile.pdf_options, cache=image_cache())
+        start = time.perf_counter()
+        with span('weasyprint:layout', 'pdf', volume=volume_name):
+            document = HTML(string=full_html, base_url=str(self.figures_dir),
+                            url_fetcher=self.url_fetcher).render(
+                stylesheets=[stylesheet], font_config=font_configuration(), **options)
+        with span('weasyprint:write_pdf', 'pdf', volume=volume_name, pages=len(document.pages)):
+            document.write_pdf(str(output_file), **options)
+        
+        logger.info(f"  ⏱️  {len(document.pages)}ページ: セットアップ {setup_seconds:.2f}秒 / "
+                    f"レイアウト {time.perf_counter() - start:.2f}秒")
         logger.info(f"✅ PDF生成完了: {output_file}")
         return output_file
+    
+    def layout_parts(self, volume_name: str, title: str, parts: List[DocumentPart],
+                     output_file: Path, jobs: int = 1):
+        """
+        表紙・目次・各章を別々にレイアウトし、1つのPDFにつなぐ
+        
+        各パートの開始ページ番号は前回のビルドのページ数から推測して
+        （@page :first の counter-reset で）与える。パートのページ数は開始ページに
+        よらないので、推測が外れたパートだけを正しい開始ページでやり直せば
+        通しのページ番号になる。別のパートへの内部リンクは layout_part で
+        仮のURIにしておき、つないだ後に名前付き宛先へのリンクに戻す。
+        
+        レイアウト済みのパートは内容・スタイルシート・画像・開始ページをキーに
+        キャッシュし（layout_cache.py）、変わっていないパートはレイアウトしない。
+        新たにレイアウトした場合は、最後にキャッシュの古い分を削除する。
+        キャッシュにないパートが複数あり jobs > 1 なら、別プロセスで並列に行う。
+        """
+        base_url = str(self.figures_dir)
+        history_file = self.page_history_file(volume_name)
+        history = load_page_history(history_file)
+        anchors = [set(ANCHOR_ID.findall(part.html)) for part in parts]
+        settings = self.profile.document_settings
+        
+        layouts: Dict[int, PartLayout] = {}
+        laid_out_at: Dict[int, int] = {}  # パート → レイアウトしたときの開始ページ
+        laid_out = []
+        setup_seconds = layout_seconds = 0.0
+        
+        def current_starts() -> List[int]:
+            starts, page = [], 1
+            for index, part in enumerate(parts):
+                starts.append(page)
+                page += layouts[index].pages if index in layouts else history.get(part.name, 1)
+            return starts
+        
+        with span('pdf:layout_parts', 'pdf', volume=volume_name, parts=len(parts)), \
+                contextlib.ExitStack() as stack:
+            pool = None
+            # ページ数が確定すると開始ページも確定するので、通常は1〜2回で終わる
+            while True:
+                starts = current_starts()
+                pending = [i for i in range(len(parts)) if laid_out_at.get(i) != starts[i]]
+                if not pending:
+                    break
+                
+                htmls, keys, misses = {}, {}, []
+                for index in pending:
+                    htmls[index] = self.full_html(title, parts[index].html, starts[index])
+                    keys[index] = layout_key(htmls[index], base_url, settings, self.css_style)
+                    cached = self.layout_cache.get(keys[index])
+                    if cached is not None:
+                        layouts[index] = PartLayout(cached.pdf, cached.pages, 0.0, 0.0, 0.0, [])
+                        laid_out_at[index] = starts[index]
+                    else:
+                        misses.append(index)
+                
+                if len(misses) > 1 and jobs > 1 and pool is None:
+                    pool = stack.enter_context(layout_pool(min(jobs, len(misses))))
+                if pool is not None:
+                    futures = {
+                        index: pool.submit(layout_part, htmls[index], base_url, self.profile.name,
+                                           anchors[index], self.css_style, tracing.enabled())
+                        for index in misses
+                    }
+                    results = {index: future.result() for index, future in futures.items()}
+                else:
+                    results = {index: layout_part(htmls[index], base_url, self.profile.name,
+                                                  anchors[index], self.css_style)
+                               for index in misses}
+                
+                for index, layout in results.items():
+                    layouts[index] = collect_layout(parts[index].name, layout)
+                    setup_seconds += layout.setup_seconds
+                    layout_seconds += layout.seconds
+                    laid_out_at[index] = starts[index]
+                    laid_out.append(parts[index].name)
+                    self.layout_cache.put(keys[index], layout.pdf, layout.pages,
+                                          f"{volume_name}/{parts[index].name}", layout.seconds)
+        
+        save_page_history(history_file, {part.name: layouts[i].pages for i, part in enumerate(parts)})
+        if laid_out:
+            self.layout_cache.prune()
+        total = sum(layout.pages for layout in layouts.values())
+        with span('pypdf:stitch', 'pdf', volume=volume_name, pages=total):
+            stitch_pdfs([layouts[i].pdf for i in range(len(parts))], output_file)
+        
+        if laid_out:
+            slowest = max(layouts.values(), key=lambda layout: layout.seconds)
+            logger.info(f"  ⏱️  {len(parts)}パート / {total}ページ: レイアウト {len(laid_out)}件"
+                        f"（{', '.join(dict.fromkeys(laid_out))}）, キャッシュ {len(parts) - len(set(laid_out))}件, "
+                        f"最長 {slowest.seconds:.2f}秒, ピークRSS {max(layout.peak_rss_mb for layout in layouts.values()):.0f}MB")
+            logger.info(f"  ⏱️  セットアップ {setup_seconds:.2f}秒 / レイアウト {layout_seconds:.2f}秒"
+                        f"（各パートの合計。セットアップはワーカーごとに初回だけ）")
+        else:
+            logger.info(f"  ⏱️  {len(parts)}パート / {total}ページ: すべてキャッシュから")
+    
+    def page_history_file(self, volume_name: str) -> Path:
+        """前回のビルドでのパートごとのページ数（開始ページの推測に使う）"""
+        return ProjectPaths().cache / "pdf_layout" / f"{self.profile.name}-{volume_name}.json"
 
 
-def build_all_pdfs():
-    """すべてのPDFを生成"""
+def build_all_pdfs(jobs: int = 1, profile: BuildProfile = RELEASE, layout_jobs: int = 1):
+    """
+    すべてのPDFを生成（対象のVOLと出力先はプロファイルに従う）
+    
+    jobs > 1 の場合は各VOLを別プロセスで並列に生成する。
+    layout_jobs > 1 の場合は各VOLの中でも章ごとに並列にレイアウトする。
+    """
     paths = ProjectPaths()
     paths.ensure_dirs()
+    dist_dir = profile.dist_dir(paths)
     
-    builder = PDFBuilder(paths.dist)
-    
-    # VOL1 (2級)
-    logger.info("VOL1 (2級対応) PDF生成中...")
-    pdf1 = builder.build_pdf("vol1_2kyu", paths.vol1_dir)
-    
-    # VOL2 (準1級)
-    logger.info("VOL2 (準1級対応) PDF生成中...")
-    pdf2 = builder.build_pdf("vol2_jun1kyu", paths.vol2_dir)
+    if jobs > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        from build_graph import execute_captured, replay_outcome
+        from build_stages import run_pdf
+        
+        logger.info(f"PDF生成中（{jobs}プロセス並列, profile={profile.name}）...")
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = {
+                volume_name: pool.submit(execute_captured, run_pdf, (volume_name, profile.name, layout_jobs))
+                for volume_name in profile.volumes
+            }
+            outcomes = {name: future.result() for name, future in futures.items()}
+        
+        for volume_name, outcome in outcomes.items():
+            replay_outcome(volume_name, outcome)
+        failed = [name for name, outcome in outcomes.items() if outcome.error]
+        if failed:
+            for name in failed:
+                logger.error(f"[{name}]\n{outcomes[name].error}")
+            raise RuntimeError(f"PDF生成に失敗: {', '.join(failed)}")
+        
+        wall = max(outcome.wall for outcome in outcomes.values())
+        cpu = sum(outcome.cpu for outcome in outcomes.values())
+        logger.info(f"⏱️  最長 {wall:.2f}秒 / CPU時間合計 {cpu:.2f}秒")
+        pdf_files = [dist_dir / f"{volume_name}.pdf" for volume_name in profile.volumes]
+    else:
+        builder = PDFBuilder(dist_dir, profile, profile.figures_dir(paths))
+        pdf_files = []
+        for volume_name in profile.volumes:
+            vol_key, manuscript_dir = paths.volumes[volume_name]
+            logger.info(f"{vol_key} PDF生成中（profile={profile.name}）...")
+            pdf_files.append(builder.build_pdf(volume_name, manuscript_dir, jobs=layout_jobs))
     
     logger.info("=" * 70)
     logger.info("✨ PDF生成完了")
-    logger.info(f"📄 VOL1: {pdf1}")
-    logger.info(f"📄 VOL2: {pdf2}")
+    for pdf_file in pdf_files:
+        logger.info(f"📄 {pdf_file}")
     logger.info("=" * 70)
 
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Markdown原稿からPDFを生成")
+    parser.add_argument('-j', '--jobs', type=int, default=1, metavar='N',
+                        help="VOLごとのPDFをNプロセスで並列生成する")
+    parser.add_argument('--layout-jobs', type=int, default=1, metavar='N',
+                        help="各VOLの表紙・目次・章をNプロセスで並列にレイアウトする（pypdf が必要）")
+    parser.add_argument('--profile', choices=list(PROFILES), default=RELEASE.name,
+                        help="ビルドプロファイル（profiles.py）")
+    args = parser.parse_args()
+    configure_logging()
     try:
-        build_all_pdfs()
+        build_all_pdfs(jobs=args.jobs, profile=get_profile(args.profile), layout_jobs=args.layout_jobs)
     except Exception as e:
         logger.error(f"❌ エラーが発生しました: {e}")
         import traceback
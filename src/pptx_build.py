@@ -7,12 +7,16 @@ pptx_build.py - Markdown原稿からPPTX（スライド）生成
 import sys
 import re
 from pathlib import Path
+from typing import Optional
 from pptx import Presentation
 from pptx.util import Inches, Pt
 from pptx.enum.text import PP_ALIGN
 from pptx.dml.color import RGBColor
 
-from utils import ProjectPaths, logger
+from utils import ProjectPaths, configure_logging, logger
+from renditions import RenditionCache, slide_spec, resolve_rendition
+from profiles import RELEASE, BuildProfile, PROFILES, get_profile
+from tracing import span
 
 
 class PPTXBuilder:
@@ -25,10 +29,14 @@ class PPTXBuilder:
     THEME_COLOR_WARNING = RGBColor(255, 152, 0)  # Orange
     THEME_COLOR_DANGER = RGBColor(244, 67, 54)  # Red
     
-    def __init__(self, output_dir: Path):
+    def __init__(self, output_dir: Path, profile: BuildProfile = RELEASE,
+                 figures_dir: Optional[Path] = None):
         self.output_dir = output_dir
         self.output_dir.mkdir(parents=True, exist_ok=True)
-        self.figures_dir = self.output_dir.parent / "assets" / "figs"
+        self.profile = profile
+        self.figures_dir = figures_dir or self.output_dir.parent / "assets" / "figs"
+        self.renditions = RenditionCache(ProjectPaths().cache / "renditions")
+        self.slide_spec = slide_spec(profile.slide_dpi)
     
     def apply_theme_to_shape(self, shape, is_title=False):
         """テーマカラーを適用"""
@@ -217,8 +225,9 @@ class PPTXBuilder:
         p.font.color.rgb = self.THEME_COLOR_PRIMARY
         
         # 図の挿入
-        figure_path = self.figures_dir / f"{figure_name}.png"
-        if figure_path.exists():
+        # 図枠（7×5インチ）に合わせたスライド用の派生画像
+        figure_path = resolve_rendition(self.figures_dir, figure_name, self.slide_spec, self.renditions)
+        if figure_path is not None:
             try:
                 shapes.add_picture(
                     str(figure_path),
@@ -252,84 +261,93 @@ class PPTXBuilder:
         chapter_files = sorted(manuscript_dir.glob("chapter_*.md"))
         for idx, chapter_file in enumerate(chapter_files, start=1):
             logger.info(f"  処理中: {chapter_file.name}")
-            content = chapter_file.read_text(encoding='utf-8')
-            
-            # 章タイトル抽出
-            title_match = re.search(r'^# (.+)$', content, re.MULTILINE)
-            if title_match:
-                chapter_title = title_match.group(1)
-            else:
-                chapter_title = chapter_file.stem
-            
-            # 章タイトルスライド
-            self.create_title_slide(prs, f"第{idx}章", chapter_title)
-            
-            # セクションごとにスライド作成
-            sections = re.split(r'####\s+', content)[1:8]  # 最大8セクション
-            for section in sections:
-                lines = section.split('\n')
-                section_title = lines[0].strip() if lines else "内容"
-                
-                # コンテンツ抽出（図表参照を除外）
-                section_lines = []
-                for line in lines[1:]:
-                    if line.strip().startswith('![FIG:'):
-                        # 図表参照を検出
-                        fig_match = re.search(r'!\[FIG:(\w+)\]', line)
-                        if fig_match:
-                            fig_name = fig_match.group(1)
-                            # 図表スライドを作成
-                            self.create_figure_slide(
-                                prs,
-                                f"{chapter_title} - 図表",
-                                fig_name,
-                                idx
-                            )
-                    elif not line.strip().startswith('```'):
-                        section_lines.append(line)
-                
-                section_content = '\n'.join(section_lines[:25])
-                
-                if section_content.strip():
-                    self.create_content_slide(
-                        prs,
-                        f"{chapter_title} - {section_title}",
-                        section_content,
-                        idx
-                    )
+            with span(chapter_file.name, 'chapter', volume=volume_name):
+                self.add_chapter_slides(prs, idx, chapter_file)
         
         # 保存
-        prs.save(str(output_file))
+        with span('pptx:save', 'pptx', volume=volume_name, slides=len(prs.slides)):
+            prs.save(str(output_file))
         logger.info(f"✅ PPTX生成完了: {output_file}")
+    
+    def add_chapter_slides(self, prs: Presentation, idx: int, chapter_file: Path):
+        """1章ぶんのスライド（章タイトル・セクション・図表）を追加"""
+        content = chapter_file.read_text(encoding='utf-8')
+        
+        # 章タイトル抽出
+        title_match = re.search(r'^# (.+)$', content, re.MULTILINE)
+        if title_match:
+            chapter_title = title_match.group(1)
+        else:
+            chapter_title = chapter_file.stem
+        
+        # 章タイトルスライド
+        self.create_title_slide(prs, f"第{idx}章", chapter_title)
+        
+        # セクションごとにスライド作成
+        sections = re.split(r'####\s+', content)[1:8]  # 最大8セクション
+        for section in sections:
+            lines = section.split('\n')
+            section_title = lines[0].strip() if lines else "内容"
+            
+            # コンテンツ抽出（図表参照を除外）
+            section_lines = []
+            for line in lines[1:]:
+                if line.strip().startswith('![FIG:'):
+                    # 図表参照を検出
+                    fig_match = re.search(r'!\[FIG:(\w+)\]', line)
+                    if fig_match:
+                        fig_name = fig_match.group(1)
+                        # 図表スライドを作成
+                        self.create_figure_slide(
+                            prs,
+                            f"{chapter_title} - 図表",
+                            fig_name,
+                            idx
+                        )
+                elif not line.strip().startswith('```'):
+                    section_lines.append(line)
+            
+            section_content = '\n'.join(section_lines[:25])
+            
+            if section_content.strip():
+                self.create_content_slide(
+                    prs,
+                    f"{chapter_title} - {section_title}",
+                    section_content,
+                    idx
+                )
 
 
-def build_all_pptx():
-    """PPTXを生成（build.pyから呼ばれる）"""
+def build_all_pptx(profile: BuildProfile = RELEASE):
+    """PPTXを生成（対象のVOLと出力先はプロファイルに従う）"""
     paths = ProjectPaths()
-    builder = PPTXBuilder(paths.dist)
+    builder = PPTXBuilder(profile.dist_dir(paths), profile, profile.figures_dir(paths))
     
     logger.info("=" * 70)
-    logger.info("PPTX生成開始")
+    logger.info(f"PPTX生成開始（profile={profile.name}）")
     logger.info("=" * 70)
     
-    # VOL1
-    logger.info("VOL1 (2級対応) PPTX生成中...")
-    builder.build_pptx("vol1_2kyu", paths.vol1_dir)
-    
-    # VOL2
-    logger.info("VOL2 (準1級対応) PPTX生成中...")
-    builder.build_pptx("vol2_jun1kyu", paths.vol2_dir)
+    for volume_name in profile.volumes:
+        vol_key, manuscript_dir = paths.volumes[volume_name]
+        logger.info(f"{vol_key} PPTX生成中...")
+        builder.build_pptx(volume_name, manuscript_dir)
     
     logger.info("=" * 70)
     logger.info("✨ PPTX生成完了")
-    logger.info(f"📊 VOL1: {paths.dist / 'vol1_2kyu.pptx'}")
-    logger.info(f"📊 VOL2: {paths.dist / 'vol2_jun1kyu.pptx'}")
+    for volume_name in profile.volumes:
+        logger.info(f"📊 {builder.output_dir / f'{volume_name}.pptx'}")
     logger.info("=" * 70)
 
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Markdown原稿からPPTXを生成")
+    parser.add_argument('--profile', choices=list(PROFILES), default=RELEASE.name,
+                        help="ビルドプロファイル（profiles.py）")
+    args = parser.parse_args()
+    configure_logging()
     try:
-        build_all_pptx()
+        build_all_pptx(get_profile(args.profile))
         logger.info("✅ PPTX生成完了")
     except Exception as e:
         logger.error(f"❌ エラーが発生しました: {e}")
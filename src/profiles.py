@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+profiles.py - ビルドプロファイル（draft / release）
+
+図の解像度・余白の切り詰め・画像の最適化・PDFの画像圧縮・PPTXの画像サイズ・
+ビルドするVOLと成果物を1か所で決める。build.py の --profile で選び、
+ProfessionalDiagramGenerator / PDFBuilder / PPTXBuilder に同じ設定を渡す。
+
+draft は原稿の確認用。図を低解像度・PNGのみで描画し、最適化を省き、
+PDFだけを生成する。出力は release と混ざらないよう別の場所に置く。
+"""
+
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from figure_index import FIGURE_FORMATS
+from utils import ProjectPaths
+
+
+class BuildProfile(NamedTuple):
+    """ビルドプロファイル"""
+    name: str
+    # 図（ProfessionalDiagramGenerator）
+    figure_dpi: int
+    tight_bbox: bool
+    figure_formats: Tuple[str, ...]
+    optimize_png: bool
+    # PDF（PDFBuilder → WeasyPrint write_pdf のオプション）
+    print_dpi: int                  # 印刷用派生画像の解像度（本文幅あたり）
+    pdf_optimize_images: bool
+    pdf_jpeg_quality: Optional[int]
+    pdf_image_dpi: Optional[int]    # これを超える解像度の画像は縮小して埋め込む
+    # PPTX（PPTXBuilder）
+    slide_dpi: int                  # スライドの図枠（7×5インチ）あたりの解像度
+    # ビルド対象
+    volumes: Tuple[str, ...]
+    deliverables: Tuple[str, ...]   # 'pdf' / 'pptx'
+    output_subdir: str = ''         # release 以外は dist/<name>/ 等に分けて出力
+
+    @property
+    def pdf_options(self) -> Dict[str, object]:
+        """WeasyPrint の write_pdf に渡すオプション"""
+        return {
+            'optimize_images': self.pdf_optimize_images,
+            'jpeg_quality': self.pdf_jpeg_quality,
+            'dpi': self.pdf_image_dpi,
+        }
+
+    @property
+    def figure_settings(self) -> str:
+        """図の描画結果に影響する設定（図キャッシュのキー・ビルドstampに含める）"""
+        return (f"dpi={self.figure_dpi}:tight={self.tight_bbox}:"
+                f"formats={','.join(self.figure_formats)}:optimize={self.optimize_png}")
+
+    @property
+    def document_settings(self) -> str:
+        """PDF/PPTXの出力に影響する設定（ビルドstampに含める）"""
+        return (f"print_dpi={self.print_dpi}:pdf={sorted(self.pdf_options.items())}:"
+                f"slide_dpi={self.slide_dpi}")
+
+    def figures_dir(self, paths: ProjectPaths) -> Path:
+        """図の出力先（release は assets/figs）"""
+        if not self.output_subdir:
+            return paths.figs
+        return paths.cache / self.output_subdir / "figs"
+
+    def dist_dir(self, paths: ProjectPaths) -> Path:
+        """PDF/PPTXの出力先（release は dist/）"""
+        if not self.output_subdir:
+            return paths.dist
+        return paths.dist / self.output_subdir
+
+    def state_file(self, paths: ProjectPaths) -> Path:
+        """ビルド状態ファイル（プロファイルを切り替えても互いの記録を壊さない）"""
+        suffix = f"-{self.name}" if self.output_subdir else ''
+        return paths.cache / f"build_state{suffix}.json"
+
+
+ALL_VOLUMES = ("vol1_2kyu", "vol2_jun1kyu")
+
+RELEASE = BuildProfile(
+    name='release',
+    figure_dpi=150,
+    tight_bbox=True,
+    figure_formats=FIGURE_FORMATS,
+    optimize_png=True,
+    print_dpi=300,
+    pdf_optimize_images=True,
+    pdf_jpeg_quality=90,
+    pdf_image_dpi=300,
+    slide_dpi=150,
+    volumes=ALL_VOLUMES,
+    deliverables=('pdf', 'pptx'),
+)
+
+DRAFT = BuildProfile(
+    name='draft',
+    figure_dpi=60,
+    tight_bbox=False,
+    figure_formats=('png',),
+    optimize_png=False,
+    print_dpi=96,
+    pdf_optimize_images=False,
+    pdf_jpeg_quality=None,
+    pdf_image_dpi=None,
+    slide_dpi=60,
+    volumes=ALL_VOLUMES,
+    deliverables=('pdf',),
+    output_subdir='draft',
+)
+
+PROFILES: Dict[str, BuildProfile] = {profile.name: profile for profile in (RELEASE, DRAFT)}
+DEFAULT_PROFILE = 'release'
+
+
+def get_profile(name: str = DEFAULT_PROFILE) -> BuildProfile:
+    """名前からプロファイルを取得"""
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"不明なプロファイル: {name}（{', '.join(PROFILES)} のいずれか）") from None
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+profiling.py - ビルドステージ単位の関数プロファイル（build.py --profile-stage）
+
+指定したターゲットだけを cProfile の下で実行し、ターゲットごとに
+- <ターゲット名>.pstats     : python -m pstats / snakeviz などで開く
+- <ターゲット名>.collapsed  : flamegraph.pl / speedscope 用の collapsed stack 形式
+を保存する。プロファイルしないステージは通常どおり実行されるので、
+1つのステージを計測しても他のステージの時間は歪まない。
+
+collapsed stack は cProfile の呼び出し元→呼び出し先の時間から復元したもの。
+ある関数が複数の呼び出し元から呼ばれた場合は、その関数の時間を各呼び出し元の
+累積時間の比で按分する（flameprof と同じ近似）。按分した時間が全体の
+MIN_STACK_FRACTION 未満の枝と MAX_STACK_DEPTH より深い枝は展開せず、その時間は
+呼び出し元の自身の時間に含める（合計時間は変わらず、行数は全体/下限で抑えられる）。
+
+図キャッシュは使わずに描画を計測する（build.enable_stage_profiling）。
+--pdf-jobs > 1 の章レイアウトはワーカープロセスで動くので計測に含まれない。
+
+    python src/build.py --profile-stage 'fig:*' --profile-stage pdf:vol1_2kyu
+    python -m pstats .build_cache/profiles/pdf_vol1_2kyu.pstats
+    flamegraph.pl .build_cache/profiles/pdf_vol1_2kyu.collapsed > pdf.svg
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import re
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from utils import logger
+
+# 按分した時間が全体のこの割合未満の枝は展開しない（1/2000 → 高々約2000行）
+MIN_STACK_FRACTION = 0.0005
+MAX_STACK_DEPTH = 64
+
+FunctionKey = Tuple[str, int, str]  # (ファイル名, 行番号, 関数名)
+
+
+def stage_filename(name: str) -> str:
+    """ターゲット名 → ファイル名（fig:lod_matrix → fig_lod_matrix）"""
+    return re.sub(r'[^\w.-]+', '_', name)
+
+
+def frame_label(func: FunctionKey) -> str:
+    filename, lineno, funcname = func
+    if filename == '~':  # 組み込み関数
+        return funcname
+    return f"{funcname} ({os.path.basename(filename)}:{lineno})"
+
+
+def collapsed_stacks(stats: pstats.Stats) -> Dict[str, float]:
+    """
+    pstats の呼び出しグラフを collapsed stack（"a;b;c" → 自身の時間[秒]）に展開
+
+    再帰呼び出しは、スタック上にすでにある関数への辺を辿らないことで打ち切る。
+    展開しない枝の時間は呼び出し元のスタックに加える。
+    """
+    raw = stats.stats  # func → (cc, nc, tottime, cumtime, callers)
+    children: Dict[FunctionKey, List[Tuple[FunctionKey, float]]] = {}
+    for func, (_, _, _, _, callers) in raw.items():
+        for caller, edge in callers.items():
+            if func in raw:
+                children.setdefault(caller, []).append((func, edge[3]))
+    roots = [func for func, entry in raw.items() if not entry[4]]
+    min_seconds = max(stats.total_tt * MIN_STACK_FRACTION, 1e-6)
+
+    stacks: Dict[str, float] = {}
+
+    def walk(func: FunctionKey, path: List[str], on_stack: set, fraction: float):
+        _, _, tottime, cumtime, _ = raw[func]
+        path = path + [frame_label(func)]
+        own = tottime * fraction
+        pruned = expanded = 0.0
+        for child, edge_cumtime in children.get(func, []):
+            child_cumtime = raw[child][3]
+            if child in on_stack or child_cumtime <= 0:
+                continue
+            # この経路を通った割合 = 呼び出し元の経路の割合 × この辺の時間 / 子の累積時間
+            child_fraction = min(1.0, fraction * edge_cumtime / child_cumtime)
+            child_seconds = child_cumtime * child_fraction
+            if child_seconds < min_seconds or len(path) >= MAX_STACK_DEPTH:
+                pruned += child_seconds
+                continue
+            expanded += child_seconds
+            walk(child, path, on_stack | {child}, child_fraction)
+        # 展開しない枝（小さい・深すぎる）の時間は自分の時間に含める。再帰の辺は
+        # cProfile の累積時間が重複するので、自分の累積時間を超えない分だけにする
+        own += min(pruned, max(0.0, cumtime * fraction - own - expanded))
+        if own > 0:
+            key = ';'.join(path)
+            stacks[key] = stacks.get(key, 0.0) + own
+
+    for root in roots:
+        walk(root, [], {root}, 1.0)
+    return stacks
+
+
+def write_collapsed(path: Path, stacks: Dict[str, float]):
+    """collapsed stack 形式で保存（値はマイクロ秒の整数）"""
+    lines = [f"{stack} {round(seconds * 1e6)}"
+             for stack, seconds in sorted(stacks.items()) if round(seconds * 1e6) > 0]
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+
+
+def save_profile(profiler: cProfile.Profile, output_dir: Path, name: str,
+                 top: int = 8) -> Tuple[Path, Path]:
+    """pstats と collapsed stack を保存し、自身の時間が長い関数を表示"""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    base = output_dir / stage_filename(name)
+    pstats_file = base.with_suffix('.pstats')
+    collapsed_file = base.with_suffix('.collapsed')
+
+    profiler.dump_stats(str(pstats_file))
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    write_collapsed(collapsed_file, collapsed_stacks(stats))
+
+    logger.info(f"🔬 プロファイル [{name}]: {pstats_file} / {collapsed_file.name} "
+                f"(合計 {stats.total_tt:.2f}秒)")
+    hottest = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:top]
+    for func, (_, calls, tottime, cumtime, _) in hottest:
+        logger.info(f"    {tottime:7.3f}秒 (累積 {cumtime:7.3f}秒, {calls}回)  {frame_label(func)}")
+    return pstats_file, collapsed_file
+
+
+def profile_call(action: Callable, output_dir: Path, name: str, *args):
+    """
+    action(*args) を cProfile の下で実行して結果を保存
+
+    functools.partial(profile_call, action, output_dir, name) の形でターゲットの
+    action を置き換えて使う（モジュールレベル関数なのでワーカーにも渡せる）。
+    """
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(action, *args)
+    finally:
+        save_profile(profiler, output_dir, name)
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+renditions.py - 用途別の図の派生画像（レンディション）
+
+assets/figs の図はすべて同じ解像度（幅2000px超）で出力されるが、
+実際に表示される大きさは用途ごとに違う。
+
+- print: A4本文幅（170mm）を300dpiで埋める幅（PDF用）
+- slide: スライドの図枠（7×5インチ）を150dpiで埋める大きさ（PPTX用）
+  （解像度はビルドプロファイルで変わる。profiles.py 参照）
+- web:   480 / 960 / 1600px の複数幅（srcset用。docsサイトのビルド時に
+         docs_hooks.py が作り、本文の図の参照を <img srcset> に置き換える）
+
+派生画像は元画像のハッシュと仕様をキーに .build_cache/renditions/ に保存し、
+元画像が変わらない限り作り直さない。元画像より大きくはしない。
+
+使い方:
+    python src/renditions.py             # 全図の web 用派生画像を docs/assets/figs に出力
+    python src/renditions.py --html      # あわせて <img srcset> のHTMLを表示
+"""
+
+import hashlib
+import os
+import sys
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from build_cache import file_digest, get_cache_stats
+from image_optimize import optimize_png_bytes
+from utils import logger
+
+# 派生画像の仕様を変えたら上げる（キャッシュキーに含める）
+RENDITION_VERSION = 1
+
+MM_PER_INCH = 25.4
+
+
+class RenditionSpec(NamedTuple):
+    """派生画像の仕様（max_width/max_height に収まるよう縮小。0は制限なし）"""
+    name: str
+    max_width: int
+    max_height: int = 0
+
+
+def print_spec(dpi: int) -> RenditionSpec:
+    """A4 (210mm) - 左右余白 20mm×2 = 170mm を dpi で埋める幅"""
+    return RenditionSpec(f'print{dpi}', round(170 / MM_PER_INCH * dpi))
+
+
+def slide_spec(dpi: int) -> RenditionSpec:
+    """PPTXBuilder.create_figure_slide の図枠 7×5インチを dpi で埋める大きさ"""
+    return RenditionSpec(f'slide{dpi}', 7 * dpi, 5 * dpi)
+
+
+PRINT = print_spec(300)
+SLIDE = slide_spec(150)
+WEB_WIDTHS = (480, 960, 1600)
+WEB = [RenditionSpec(f'web{width}', width) for width in WEB_WIDTHS]
+
+RENDITIONS: Dict[str, RenditionSpec] = {spec.name: spec for spec in [PRINT, SLIDE] + WEB}
+
+
+def fit_size(size: Tuple[int, int], spec: RenditionSpec) -> Tuple[int, int]:
+    """仕様の枠に収まる大きさ（縦横比を保ち、拡大はしない）"""
+    width, height = size
+    scale = 1.0
+    if spec.max_width:
+        scale = min(scale, spec.max_width / width)
+    if spec.max_height:
+        scale = min(scale, spec.max_height / height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def render_rendition(source: Path, spec: RenditionSpec) -> bytes:
+    """元画像を縮小して最適化したPNGを返す（縮小の必要がないか、元の方が小さければ元のまま）"""
+    from PIL import Image
+    
+    with Image.open(source) as image:
+        image.load()
+        size = fit_size(image.size, spec)
+        if size == image.size:
+            return source.read_bytes()
+        # パレット画像はフルカラーに戻してから縮小する（補間のため）
+        mode = 'RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB'
+        resized = image.convert(mode).resize(size, Image.Resampling.LANCZOS)
+    buffer = BytesIO()
+    resized.save(buffer, format='PNG')
+    data, _ = optimize_png_bytes(buffer.getvalue())
+    # 縮小率が小さいと補間で色数が増え、元より大きくなることがある
+    source_data = source.read_bytes()
+    return data if len(data) < len(source_data) else source_data
+
+
+class RenditionCache:
+    """元画像のハッシュをキーにした派生画像のキャッシュ"""
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = cache_dir
+        self.stats = get_cache_stats('renditions')
+        # 元画像のハッシュ（パス → (mtime_ns, サイズ, ハッシュ)）。常駐プロセスでは要求をまたいで効く
+        self._digests: Dict[Path, Tuple[int, int, str]] = {}
+
+    def key(self, source_digest: str, spec: RenditionSpec) -> str:
+        h = hashlib.sha256()
+        h.update(f"{RENDITION_VERSION}:{spec!r}:{source_digest}".encode('ascii'))
+        return h.hexdigest()
+
+    def source_digest(self, source: Path) -> str:
+        """元画像のハッシュ（mtime・サイズが前回と同じなら再計算しない）"""
+        st = source.stat()
+        cached = self._digests.get(source)
+        if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return cached[2]
+        digest = file_digest(source)
+        self._digests[source] = (st.st_mtime_ns, st.st_size, digest)
+        return digest
+
+    def get(self, source: Path, spec: RenditionSpec) -> Path:
+        """派生画像のパス（なければ作成）"""
+        key = self.key(self.source_digest(source), spec)
+        cached = self.cache_dir / f"{source.stem}.{spec.name}.{key[:16]}.png"
+        if cached.exists():
+            self.stats.hit()
+            return cached
+
+        self.stats.miss()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # 同じ図・同じ用途の古い世代を削除
+        for old_file in self.cache_dir.glob(f"{source.stem}.{spec.name}.*.png"):
+            old_file.unlink()
+        tmp_file = cached.with_name(f".{cached.name}.{os.getpid()}.tmp")
+        tmp_file.write_bytes(render_rendition(source, spec))
+        os.replace(tmp_file, cached)
+        return cached
+
+
+def resolve_rendition(figures_dir: Path, fig_id: str, spec: RenditionSpec,
+                      cache: RenditionCache) -> Optional[Path]:
+    """図IDのPNGから派生画像を得る（PNGがなければNone、作れなければ元のPNG）"""
+    source = figures_dir / f"{fig_id}.png"
+    if not source.exists():
+        return None
+    try:
+        return cache.get(source, spec)
+    except OSError as e:
+        logger.warning(f"派生画像の作成に失敗: {fig_id} ({spec.name}) - {e}")
+        return source
+
+
+def web_variants(source: Path, output_dir: Path, cache: RenditionCache) -> List[Tuple[Path, int]]:
+    """web用の各幅の派生画像を output_dir に <図ID>-<幅>w.png として置く"""
+    from PIL import Image
+    
+    variants = []
+    for spec in WEB:
+        rendition = cache.get(source, spec)
+        with Image.open(rendition) as image:
+            width = image.width
+        target = output_dir / f"{source.stem}-{spec.max_width}w.png"
+        data = rendition.read_bytes()
+        if not target.exists() or target.read_bytes() != data:
+            tmp_file = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+            tmp_file.write_bytes(data)
+            os.replace(tmp_file, target)
+        variants.append((target, width))
+    return variants
+
+
+def srcset_html(fig_id: str, alt: str, variants: List[Tuple[Path, int]],
+                base_url: str = "assets/figs") -> str:
+    """<img srcset> タグ（本文幅いっぱいに表示する前提の sizes）"""
+    from html import escape
+
+    srcset = ', '.join(f"{base_url}/{path.name} {width}w" for path, width in variants)
+    return (f'<img src="{base_url}/{fig_id}.png" srcset="{srcset}" '
+            f'sizes="(max-width: 960px) 100vw, 960px" alt="{escape(alt)}" loading="lazy">')
+
+
+def main():
+    import argparse
+    from utils import ProjectPaths, configure_logging
+
+    parser = argparse.ArgumentParser(description="docsサイト用に図の複数幅の派生画像を出力")
+    parser.add_argument('fig_ids', nargs='*', help="対象の図ID。省略時は assets/figs のすべて")
+    parser.add_argument('--html', action='store_true', help="<img srcset> のHTMLを表示する")
+    args = parser.parse_args()
+    configure_logging()
+
+    paths = ProjectPaths()
+    docs_figs = paths.root / "docs" / "assets" / "figs"
+    docs_figs.mkdir(parents=True, exist_ok=True)
+    cache = RenditionCache(paths.cache / "renditions")
+
+    sources = [paths.figs / f"{fig_id}.png" for fig_id in args.fig_ids] if args.fig_ids \
+        else sorted(paths.figs.glob("*.png"))
+    for source in sources:
+        if not source.exists():
+            logger.warning(f"図が見つかりません: {source}")
+            continue
+        variants = web_variants(source, docs_figs, cache)
+        logger.info(f"  ✓ {source.stem}: {', '.join(f'{width}w' for _, width in variants)}")
+        if args.html:
+            print(srcset_html(source.stem, source.stem, variants))
+    logger.info(f"📦 キャッシュ[renditions]: ヒット {cache.stats.hits} / ミス {cache.stats.misses}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
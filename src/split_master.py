@@ -2,64 +2,185 @@
 # -*- coding: utf-8 -*-
 """
 split_master.py - MASTER.mdを章ごとのファイルに分割
+
+内容が変わった章ファイルだけを書き換える。各ファイルの内容ハッシュは
+manuscript/.manifest.json に記録し、前回との差分を ChangeReport で返す。
 """
 
+import json
 import sys
 from pathlib import Path
+from typing import Dict, List, Optional
 from utils import (
     ProjectPaths,
-    parse_master_markdown,
+    configure_logging,
     logger,
     create_table_of_contents
 )
+from build_cache import parse_master_markdown_cached, text_digest
+from tracing import span
+
+MANIFEST_NAME = ".manifest.json"
+MANIFEST_VERSION = 1
+
+
+class ChangeReport:
+    """分割結果の差分（キーは manuscript/ からの相対パス）"""
+
+    def __init__(self):
+        self.added: List[str] = []
+        self.removed: List[str] = []
+        self.modified: List[str] = []
+        self.unchanged: List[str] = []
+
+    @property
+    def dirty(self) -> List[str]:
+        """内容が変わった（追加・削除・変更された）ファイル"""
+        return self.added + self.modified + self.removed
+
+    @property
+    def dirty_volumes(self) -> List[str]:
+        """変更のあったVOLディレクトリ名（例: "vol1_2kyu"）"""
+        return sorted({key.split('/', 1)[0] for key in self.dirty})
+
+    def has_changes(self) -> bool:
+        return bool(self.dirty)
+
+    def __repr__(self):
+        return (f"<ChangeReport added={len(self.added)} removed={len(self.removed)} "
+                f"modified={len(self.modified)} unchanged={len(self.unchanged)}>")
+
+
+def load_manifest(manuscript_dir: Path) -> Dict[str, str]:
+    """前回の分割時に記録した内容ハッシュを読み込む"""
+    manifest_file = manuscript_dir / MANIFEST_NAME
+    if not manifest_file.exists():
+        return {}
+    try:
+        data = json.loads(manifest_file.read_text(encoding='utf-8'))
+    except (OSError, ValueError) as e:
+        logger.warning(f"マニフェストの読み込みに失敗: {e}")
+        return {}
+    if data.get('version') != MANIFEST_VERSION:
+        return {}
+    return data.get('files', {})
+
+
+def save_manifest(manuscript_dir: Path, files: Dict[str, str]):
+    """内容ハッシュを保存"""
+    manifest_file = manuscript_dir / MANIFEST_NAME
+    data = {'version': MANIFEST_VERSION, 'files': dict(sorted(files.items()))}
+    manifest_file.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding='utf-8')
+
+
+def manifest_outputs(paths: ProjectPaths) -> List[Path]:
+    """前回の分割で書き出したファイル（マニフェスト自体を含む）"""
+    files = [paths.manuscript / key for key in load_manifest(paths.manuscript)]
+    return files + [paths.manuscript / MANIFEST_NAME]
+
+
+def matches_on_disk(path: Path, content: str) -> bool:
+    """ファイルの現在の内容が content と同じか（手で編集・削除されていないか）"""
+    try:
+        return path.read_text(encoding='utf-8') == content
+    except (OSError, UnicodeDecodeError):
+        return False
+
+
+def sync_file(manuscript_dir: Path, key: str, content: str,
+              manifest: Dict[str, str], new_manifest: Dict[str, str],
+              report: ChangeReport) -> bool:
+    """
+    内容が変わっていればファイルを書き込む（書き込んだらTrue）
+
+    マニフェストのハッシュが同じでも、ファイルが手で書き換えられていれば書き直す。
+    """
+    digest = text_digest(content)
+    new_manifest[key] = digest
+    output_path = manuscript_dir / key
+
+    if manifest.get(key) == digest and matches_on_disk(output_path, content):
+        report.unchanged.append(key)
+        return False
 
+    if key in manifest:
+        report.modified.append(key)
+    else:
+        report.added.append(key)
+    output_path.write_text(content, encoding='utf-8')
+    return True
+
+
+def split_master_to_chapters(paths: Optional[ProjectPaths] = None):
+    """
+    MASTER.mdを章ファイルに分割
+
+    Returns:
+        (vol1_chapters, vol2_chapters, change_report)
+    """
+    if paths is None:
+        paths = ProjectPaths()
 
-def split_master_to_chapters():
-    """MASTER.mdを章ファイルに分割"""
-    paths = ProjectPaths()
-    
     # ディレクトリ確保
     paths.ensure_dirs()
-    
+
     # MASTER.mdを解析
     logger.info(f"MASTER.mdを読み込み中: {paths.master_file}")
-    vol1_chapters, vol2_chapters = parse_master_markdown(paths.master_file)
-    
-    # VOL1の章を保存
-    logger.info(f"VOL1 (2級対応): {len(vol1_chapters)}章をファイル化")
-    for chapter in vol1_chapters:
-        output_path = paths.vol1_dir / chapter.filename
-        output_path.write_text(chapter.content, encoding='utf-8')
-        logger.info(f"  ✓ {chapter.filename} - {chapter.title} ({len(chapter.content)}文字)")
-    
-    # VOL1の目次を作成
-    toc_vol1 = create_table_of_contents(vol1_chapters, "VOL1: BIM利用技術者試験2級対応")
-    (paths.vol1_dir / "00_toc.md").write_text(toc_vol1, encoding='utf-8')
-    logger.info(f"  ✓ 00_toc.md - 目次")
-    
-    # VOL2の章を保存
-    logger.info(f"VOL2 (準1級対応): {len(vol2_chapters)}章をファイル化")
-    for chapter in vol2_chapters:
-        output_path = paths.vol2_dir / chapter.filename
-        output_path.write_text(chapter.content, encoding='utf-8')
-        logger.info(f"  ✓ {chapter.filename} - {chapter.title} ({len(chapter.content)}文字)")
-    
-    # VOL2の目次を作成
-    toc_vol2 = create_table_of_contents(vol2_chapters, "VOL2: BIM利用技術者試験準1級対応")
-    (paths.vol2_dir / "00_toc.md").write_text(toc_vol2, encoding='utf-8')
-    logger.info(f"  ✓ 00_toc.md - 目次")
-    
+    with span('parse_master', 'split'):
+        vol1_chapters, vol2_chapters = parse_master_markdown_cached(paths)
+
+    manifest = load_manifest(paths.manuscript)
+    new_manifest: Dict[str, str] = {}
+    report = ChangeReport()
+
+    volumes = [
+        (paths.vol1_dir, vol1_chapters, "VOL1 (2級対応)", "VOL1: BIM利用技術者試験2級対応"),
+        (paths.vol2_dir, vol2_chapters, "VOL2 (準1級対応)", "VOL2: BIM利用技術者試験準1級対応"),
+    ]
+
+    for vol_dir, chapters, label, toc_title in volumes:
+        vol_key = vol_dir.relative_to(paths.manuscript).as_posix()
+
+        # 章を保存
+        logger.info(f"{label}: {len(chapters)}章をファイル化")
+        for chapter in chapters:
+            key = f"{vol_key}/{chapter.filename}"
+            with span(key, 'chapter'):
+                written = sync_file(paths.manuscript, key, chapter.content,
+                                    manifest, new_manifest, report)
+            mark = "✓" if written else "="
+            logger.info(f"  {mark} {chapter.filename} - {chapter.title} ({len(chapter.content)}文字)")
+
+        # 目次を作成
+        toc = create_table_of_contents(chapters, toc_title)
+        if sync_file(paths.manuscript, f"{vol_key}/00_toc.md", toc,
+                     manifest, new_manifest, report):
+            logger.info("  ✓ 00_toc.md - 目次")
+
+        # 原稿から消えた章ファイルを削除
+        for stale_file in sorted(vol_dir.glob("chapter_*.md")):
+            key = f"{vol_key}/{stale_file.name}"
+            if key not in new_manifest:
+                stale_file.unlink()
+                report.removed.append(key)
+                logger.info(f"  ✗ {stale_file.name} - 削除")
+
+    save_manifest(paths.manuscript, new_manifest)
+
     # サマリー
     logger.info("=" * 70)
     logger.info("✨ 分割完了！")
     logger.info(f"📚 VOL1 (2級対応): {len(vol1_chapters)}章 → {paths.vol1_dir}")
     logger.info(f"📚 VOL2 (準1級対応): {len(vol2_chapters)}章 → {paths.vol2_dir}")
+    logger.info(f"📝 変更: 追加 {len(report.added)} / 変更 {len(report.modified)} / "
+                f"削除 {len(report.removed)} / 変更なし {len(report.unchanged)}")
     logger.info("=" * 70)
-    
-    return vol1_chapters, vol2_chapters
+
+    return vol1_chapters, vol2_chapters, report
 
 
 if __name__ == "__main__":
+    configure_logging()
     try:
         split_master_to_chapters()
     except Exception as e:
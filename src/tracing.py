@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+tracing.py - ビルドのタイムライン計測（Chrome trace 形式）
+
+ステージ・図・VOL・章ごとの入れ子のスパンを記録し、
+chrome://tracing や https://ui.perfetto.dev で開けるJSONに書き出す。
+各スパンには経過時間に加えてCPU時間と、終了時点のピークRSSを記録する。
+
+    with span("markdown", "pdf", chapter="chapter_01.md"):
+        ...
+
+start() を呼ぶまでは記録しない。無効時の span() は共有の空オブジェクトを
+返すだけなので、計測箇所を残したままでも通常のビルドはほぼ遅くならない。
+ワーカープロセスのスパンは build_graph.execute_captured が集めて返し、
+親プロセスで add_events() によりまとめる（pid ごとに別のトラックになる）。
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+TraceEvent = Dict[str, object]
+
+_events: Optional[List[TraceEvent]] = None  # None のときは無効
+_lock = threading.Lock()
+
+
+def peak_rss_mb() -> float:
+    """このプロセスのピークRSS（MB）。取得できなければ0"""
+    if resource is None:
+        return 0.0
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux は KB、macOS は バイト
+    return maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def enabled() -> bool:
+    return _events is not None
+
+
+def start(process_name: str = 'build'):
+    """記録を開始（プロセス名はトレースビューアのトラック名になる）"""
+    global _events
+    _events = [{
+        'name': 'process_name', 'ph': 'M', 'pid': os.getpid(), 'tid': 0,
+        'args': {'name': f"{process_name} ({os.getpid()})"},
+    }]
+
+
+def stop() -> List[TraceEvent]:
+    """記録を終了し、記録したイベントを返す"""
+    global _events
+    events, _events = _events or [], None
+    return events
+
+
+def add_events(events: List[TraceEvent]):
+    """別プロセスで記録したイベントを取り込む"""
+    if _events is not None:
+        with _lock:
+            _events.extend(events)
+
+
+class _Span:
+    __slots__ = ('name', 'category', 'args', '_ts', '_wall', '_cpu')
+
+    def __init__(self, name: str, category: str, args: dict):
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        # ts はプロセス間で比較できるよう壁時計、所要時間は単調時計で測る
+        self._ts = time.time_ns()
+        self._wall = time.perf_counter_ns()
+        self._cpu = time.process_time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter_ns() - self._wall
+        cpu = time.process_time_ns() - self._cpu
+        args = dict(self.args, cpu_ms=round(cpu / 1e6, 3), peak_rss_mb=round(peak_rss_mb(), 1))
+        if exc_type is not None:
+            args['error'] = exc_type.__name__
+        event = {
+            'name': self.name, 'cat': self.category, 'ph': 'X',
+            'ts': self._ts // 1000, 'dur': wall // 1000,
+            'pid': os.getpid(), 'tid': threading.get_ident() % 2 ** 31, 'args': args,
+        }
+        with _lock:
+            if _events is not None:
+                _events.append(event)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name: str, category: str = 'build', **args):
+    """スパンを記録するコンテキストマネージャ（無効時は何もしない）"""
+    if _events is None:
+        return _NULL_SPAN
+    return _Span(name, category, args)
+
+
+def write_trace(path: Path, events: List[TraceEvent]):
+    """Chrome trace 形式（JSON Object Format）で書き出す"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = {'traceEvents': events, 'displayTimeUnit': 'ms'}
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding='utf-8')
+
+
+def summarize(events: List[TraceEvent], top: int = 10) -> List[str]:
+    """所要時間の長いスパン（表示用の行）"""
+    spans = sorted((e for e in events if e.get('ph') == 'X'), key=lambda e: e['dur'], reverse=True)
+    return [f"{e['dur'] / 1e6:7.2f}秒  CPU {e['args']['cpu_ms'] / 1000:6.2f}秒  "
+            f"{e['args']['peak_rss_mb']:6.0f}MB  [{e['cat']}] {e['name']}"
+            for e in spans[:top]]
@@ -4,20 +4,28 @@
 BIM利用技術者試験 教科書シリーズ - ユーティリティモジュール
 """
 
-import os
 import re
 import logging
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Tuple, Iterable, Iterator, NamedTuple
 
-# ロギング設定
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
 
+def configure_logging(level: int = logging.INFO):
+    """
+    ロギング設定（各スクリプトのエントリポイントで呼ぶ）
+
+    import しただけではハンドラを設定しない（ライブラリとして使う側の設定を尊重する）。
+    """
+    logging.basicConfig(
+        level=level,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    # pdf.fonttype=42 の図を保存するたびに fontTools のサブセット化がINFOを出すので抑える
+    logging.getLogger('fontTools').setLevel(logging.WARNING)
+
+
 class ProjectPaths:
     """プロジェクトのパス管理"""
     
@@ -34,10 +42,17 @@ class ProjectPaths:
         self.figs = self.assets / "figs"
         self.dist = self.root / "dist"
         self.master_file = self.root / "MASTER.md"
+        self.cache = self.root / ".build_cache"
         
         # VOL別ディレクトリ
         self.vol1_dir = self.manuscript / "vol1_2kyu"
         self.vol2_dir = self.manuscript / "vol2_jun1kyu"
+        
+        # 成果物名 → (MASTER.md上のVOL名, 原稿ディレクトリ)
+        self.volumes = {
+            "vol1_2kyu": ("VOL1", self.vol1_dir),
+            "vol2_jun1kyu": ("VOL2", self.vol2_dir),
+        }
     
     def ensure_dirs(self):
         """必要なディレクトリを作成"""
@@ -55,63 +70,184 @@ class ProjectPaths:
 class ChapterInfo:
     """章情報を管理するクラス"""
     
-    def __init__(self, volume: str, chapter_num: int, title: str, content: str):
+    def __init__(self, volume: str, chapter_num: int, title: str, content: str,
+                 figures: Optional[List[str]] = None):
         self.volume = volume  # "VOL1" or "VOL2"
         self.chapter_num = chapter_num
         self.title = title
         self.content = content
+        self.figures = figures if figures is not None else extract_figure_references(content)
         self.filename = f"chapter_{chapter_num:02d}.md"
     
     def __repr__(self):
         return f"<Chapter {self.volume}-{self.chapter_num}: {self.title}>"
 
 
-def parse_master_markdown(master_path: Path) -> Tuple[List[ChapterInfo], List[ChapterInfo]]:
+# MASTER.md の行パターン（すべて行頭で判定し、1行ずつ処理する）
+VOLUME_LINE = re.compile(r'## (VOL\d+):\s*(.+)')
+CHAPTER_LINE = re.compile(r'### 第(\d+)章｜(.+)')
+SECTION_LINE = re.compile(r'####\s+(.+)')
+FIGURE_REF = re.compile(r'!\[FIG:(\w+)\]\(\)')
+APPENDIX_MARK = '## 付録'
+CHAPTER_END_MARK = '---CHAPTER_END---'
+MASTER_END_MARK = '---END_OF_MASTER---'
+
+
+class MasterEvent(NamedTuple):
+    """MASTER.md トークナイザが生成するイベント
+    
+    kind:
+        'volume'      - VOL見出し (volume=VOL名, text=タイトル)
+        'chapter'     - 章見出し (number=章番号, text=タイトル)
+        'text'        - 章本文の1行 (text=行内容)
+        'section'     - 章内の #### 見出し (text=見出し)
+        'figure'      - 図の参照 (text=図ID)
+        'chapter_end' - 章の終了（明示的な区切り・次の見出し・EOF）
+        'appendix'    - 付録開始（以降はVOLに属さない）
+        'end'         - ---END_OF_MASTER---
     """
-    MASTER.mdを解析してVOL1とVOL2の章に分割
+    kind: str
+    lineno: int
+    text: str = ''
+    volume: str = ''
+    number: int = 0
+
+
+def tokenize_master_lines(lines: Iterable[str]) -> Iterator[MasterEvent]:
+    """
+    MASTER.mdの行を1パスで走査してイベントを生成
     
-    Returns:
-        (vol1_chapters, vol2_chapters)
+    各行を一度だけ見るため、処理時間は行数に比例する。
+    ---CHAPTER_END--- が欠けていても、次の章・VOL・付録見出しで章を閉じる。
     """
+    volume = ''
+    chapter = 0
+    
+    for lineno, raw in enumerate(lines, start=1):
+        line = raw.rstrip('\r\n')
+        
+        if line.startswith(MASTER_END_MARK):
+            if chapter:
+                yield MasterEvent('chapter_end', lineno, volume=volume, number=chapter)
+            volume, chapter = '', 0
+            yield MasterEvent('end', lineno)
+            continue
+        
+        if line.startswith('## '):
+            vol_match = VOLUME_LINE.match(line)
+            if vol_match or line.startswith(APPENDIX_MARK):
+                if chapter:
+                    yield MasterEvent('chapter_end', lineno, volume=volume, number=chapter)
+                    chapter = 0
+                if vol_match:
+                    volume = vol_match.group(1)
+                    yield MasterEvent('volume', lineno, vol_match.group(2).strip(), volume)
+                else:
+                    volume = ''
+                    yield MasterEvent('appendix', lineno)
+                continue
+        
+        if not volume:
+            continue
+        
+        if line.startswith('### '):
+            chapter_match = CHAPTER_LINE.match(line)
+            if chapter_match:
+                if chapter:
+                    yield MasterEvent('chapter_end', lineno, volume=volume, number=chapter)
+                chapter = int(chapter_match.group(1))
+                yield MasterEvent('chapter', lineno, chapter_match.group(2).strip(),
+                                  volume, chapter)
+                continue
+        
+        if not chapter:
+            continue
+        
+        if line.lstrip().startswith(CHAPTER_END_MARK):
+            yield MasterEvent('chapter_end', lineno, volume=volume, number=chapter)
+            chapter = 0
+            continue
+        
+        yield MasterEvent('text', lineno, line, volume, chapter)
+        
+        if line.startswith('####'):
+            section_match = SECTION_LINE.match(line)
+            if section_match:
+                yield MasterEvent('section', lineno, section_match.group(1).strip(),
+                                  volume, chapter)
+        if '![FIG:' in line:
+            for fig_id in FIGURE_REF.findall(line):
+                yield MasterEvent('figure', lineno, fig_id, volume, chapter)
+    
+    if chapter:
+        yield MasterEvent('chapter_end', 0, volume=volume, number=chapter)
+
+
+def iter_master_events(master_path: Path) -> Iterator[MasterEvent]:
+    """MASTER.mdをストリーミングで読み込み、イベントを生成"""
     if not master_path.exists():
         raise FileNotFoundError(f"MASTER.md が見つかりません: {master_path}")
     
-    content = master_path.read_text(encoding='utf-8')
+    with master_path.open(encoding='utf-8') as f:
+        yield from tokenize_master_lines(f)
+
+
+def build_chapters(events: Iterable[MasterEvent]) -> Dict[str, List[ChapterInfo]]:
+    """イベント列からVOLごとの章リストを組み立てる"""
+    volumes: Dict[str, List[ChapterInfo]] = {}
+    title = ''
+    body: List[str] = []
+    figures: List[str] = []
     
-    vol1_chapters = []
-    vol2_chapters = []
+    for event in events:
+        kind = event.kind
+        if kind == 'text':
+            body.append(event.text)
+        elif kind == 'figure':
+            if event.text not in figures:
+                figures.append(event.text)
+        elif kind == 'chapter':
+            title = event.text
+            body = []
+            figures = []
+        elif kind == 'chapter_end':
+            # 章の完全なコンテンツ（タイトル含む）
+            chapter_content = '\n'.join(body).strip()
+            full_content = f"# 第{event.number}章｜{title}\n\n{chapter_content}"
+            volumes[event.volume].append(ChapterInfo(
+                volume=event.volume,
+                chapter_num=event.number,
+                title=title,
+                content=full_content,
+                figures=figures
+            ))
+            body = []
+        elif kind == 'volume':
+            volumes.setdefault(event.volume, [])
     
-    # VOLセクションで分割
-    vol_pattern = r'## (VOL\d+):\s*(.+?)(?=## VOL\d+:|## 付録|---END_OF_MASTER---|$)'
-    vol_matches = re.finditer(vol_pattern, content, re.DOTALL)
+    return volumes
+
+
+def parse_master_volumes(master_path: Path) -> Dict[str, List[ChapterInfo]]:
+    """
+    MASTER.mdを解析してすべてのVOLの章を取得
     
-    for vol_match in vol_matches:
-        vol_name = vol_match.group(1)  # "VOL1" or "VOL2"
-        vol_content = vol_match.group(2).strip()
-        
-        # 章で分割（新フォーマット対応）
-        chapter_pattern = r'### 第(\d+)章｜(.+?)\n(.*?)(?=---CHAPTER_END---|### 第\d+章｜|## VOL\d+:|## 付録|$)'
-        chapter_matches = re.finditer(chapter_pattern, vol_content, re.DOTALL)
-        
-        for chapter_match in chapter_matches:
-            chapter_num = int(chapter_match.group(1))
-            chapter_title = chapter_match.group(2).strip()
-            chapter_content = chapter_match.group(3).strip()
-            
-            # 章の完全なコンテンツ（タイトル含む）
-            full_content = f"# 第{chapter_num}章｜{chapter_title}\n\n{chapter_content}"
-            
-            chapter_info = ChapterInfo(
-                volume=vol_name,
-                chapter_num=chapter_num,
-                title=chapter_title,
-                content=full_content
-            )
-            
-            if vol_name == "VOL1":
-                vol1_chapters.append(chapter_info)
-            elif vol_name == "VOL2":
-                vol2_chapters.append(chapter_info)
+    Returns:
+        {"VOL1": [...], "VOL2": [...], ...}（出現順）
+    """
+    return build_chapters(iter_master_events(master_path))
+
+
+def parse_master_markdown(master_path: Path) -> Tuple[List[ChapterInfo], List[ChapterInfo]]:
+    """
+    MASTER.mdを解析してVOL1とVOL2の章に分割
+    
+    Returns:
+        (vol1_chapters, vol2_chapters)
+    """
+    volumes = parse_master_volumes(master_path)
+    vol1_chapters = volumes.get("VOL1", [])
+    vol2_chapters = volumes.get("VOL2", [])
     
     logger.info(f"VOL1: {len(vol1_chapters)}章, VOL2: {len(vol2_chapters)}章を検出")
     
@@ -125,18 +261,16 @@ def extract_figure_references(content: str) -> List[str]:
     例: ![FIG:cad_vs_bim]()
     → "cad_vs_bim"
     """
-    pattern = r'!\[FIG:(\w+)\]\(\)'
-    matches = re.findall(pattern, content)
-    return list(set(matches))  # 重複を除去
+    matches = FIGURE_REF.findall(content)
+    return list(dict.fromkeys(matches))  # 重複を除去（出現順を維持）
 
 
 def get_all_figure_references(chapters: List[ChapterInfo]) -> List[str]:
     """全章から図の参照を抽出"""
     all_refs = []
     for chapter in chapters:
-        refs = extract_figure_references(chapter.content)
-        all_refs.extend(refs)
-    return list(set(all_refs))
+        all_refs.extend(chapter.figures)
+    return list(dict.fromkeys(all_refs))
 
 
 def format_file_size(size_bytes: int) -> str:
@@ -175,13 +309,16 @@ def get_project_info() -> Dict[str, str]:
 
 
 if __name__ == "__main__":
+    configure_logging()
     # テスト実行
     paths = ProjectPaths()
     print(f"プロジェクトルート: {paths.root}")
     print(f"MASTER.md: {paths.master_file}")
     
     if paths.master_file.exists():
-        vol1, vol2 = parse_master_markdown(paths.master_file)
+        from build_cache import load_manuscript, report_cache_stats
+        manuscript = load_manuscript(paths)
+        vol1, vol2 = manuscript.vol1, manuscript.vol2
         print(f"\nVOL1: {len(vol1)}章")
         for ch in vol1:
             print(f"  - {ch}")
@@ -190,7 +327,9 @@ if __name__ == "__main__":
             print(f"  - {ch}")
         
         # 図の参照を抽出
-        all_figs = get_all_figure_references(vol1 + vol2)
+        all_figs = manuscript.figure_refs
         print(f"\n必要な図: {len(all_figs)}個")
         for fig in sorted(all_figs):
             print(f"  - {fig}")
+        
+        report_cache_stats()
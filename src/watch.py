@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+watch.py - 監視モード（build.py --watch）
+
+原稿（MASTER.md）・図の生成コード・ビルドスクリプトの変更を監視し、
+影響を受けるターゲットだけを再ビルドする。
+
+- Linux では inotify（ctypes 経由）でディレクトリを監視し、
+  使えない環境（macOS・一部のネットワークFSなど）ではmtimeのポーリングに切り替える
+- 保存が連続したとき（エディタの一時ファイル・複数ファイルの一括保存）は
+  DEBOUNCE_SECONDS の間変更が途切れるのを待ってからまとめて1回ビルドする
+- 変更されたファイルを入力に持つターゲットと、その下流（split → pdf/pptx など）を
+  再ビルド候補にする。実際に作り直すかは通常どおり入力ハッシュで判定するので、
+  章を1つ編集しただけなら、その章を含むVOLだけが作り直される
+- 図の生成コード（diagrams_professional.py）やPDF/PPTXのビルダーの変更は
+  モジュールを読み込み直して反映する。それ以外の src/*.py が変わった場合は
+  プロセスごと再起動する
+"""
+
+import ctypes
+import ctypes.util
+import importlib
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from build_graph import BuildFailed, BuildGraph
+from profiles import BuildProfile
+from utils import ProjectPaths, logger
+
+DEBOUNCE_SECONDS = 0.3
+POLL_INTERVAL = 0.5
+
+# 読み込み直せば変更を反映できるモジュール（build_stages から関数内で import される）
+RELOADABLE_MODULES = ('diagrams_professional', 'pdf_build', 'pptx_build')
+# 変更されると全図の stamp（生成関数のハッシュ）が変わるモジュール
+FIGURE_SOURCE = 'diagrams_professional.py'
+
+# <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+_EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len
+
+
+class Watcher:
+    """監視対象ファイルの変更を待つ（サブクラスで実装）"""
+
+    name = ''
+
+    def __init__(self):
+        self.files: Set[Path] = set()
+        self.overflowed = False  # イベントを取りこぼした（全ターゲットを確認する）
+
+    def set_files(self, files: Iterable[Path]):
+        self.files = set(files)
+
+    def poll(self, timeout: Optional[float]) -> Set[Path]:
+        """timeout 秒（None なら無期限）まで待ち、変更された監視対象ファイルを返す"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher(Watcher):
+    """inotify によるディレクトリ監視（Linux）"""
+
+    name = 'inotify'
+
+    def __init__(self):
+        super().__init__()
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError("inotify はこのプラットフォームでは使えません")
+        self._libc = libc
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self.directories: Dict[int, Path] = {}  # watch descriptor → ディレクトリ
+
+    def set_files(self, files: Iterable[Path]):
+        super().set_files(files)
+        # エディタは一時ファイルへの書き込み+renameで保存するので、ファイルではなく親を監視する
+        watched = set(self.directories.values())
+        for directory in sorted({path.parent for path in self.files} - watched):
+            if not directory.is_dir():
+                continue
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+            if wd < 0:
+                errno = ctypes.get_errno()
+                raise OSError(errno, f"{directory} を監視できません: {os.strerror(errno)}")
+            self.directories[wd] = directory
+
+    def _read_events(self) -> Set[Path]:
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # イベントを取りこぼした: すべて変更されたものとして扱う
+                self.overflowed = True
+                changed |= self.files
+            elif wd in self.directories and name:
+                changed.add(self.directories[wd] / os.fsdecode(name))
+        return changed & self.files
+
+    def poll(self, timeout: Optional[float]) -> Set[Path]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            ready, _, _ = select.select([self.fd], [], [], remaining)
+            if not ready:
+                return set()
+            changed = self._read_events()
+            if changed or deadline is not None:
+                return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher(Watcher):
+    """mtime・サイズのポーリングによる監視（inotify が使えない環境用）"""
+
+    name = 'polling'
+
+    def __init__(self, interval: float = POLL_INTERVAL):
+        super().__init__()
+        self.interval = interval
+        self.snapshot: Dict[Path, Optional[Tuple[int, int]]] = {}
+
+    @staticmethod
+    def _stat(path: Path) -> Optional[Tuple[int, int]]:
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def set_files(self, files: Iterable[Path]):
+        super().set_files(files)
+        self.snapshot = {path: self.snapshot.get(path, self._stat(path)) for path in self.files}
+
+    def poll(self, timeout: Optional[float]) -> Set[Path]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            changed = set()
+            for path, previous in self.snapshot.items():
+                current = self._stat(path)
+                if current != previous:
+                    self.snapshot[path] = current
+                    changed.add(path)
+            if changed:
+                return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return set()
+            time.sleep(self.interval if deadline is None
+                       else min(self.interval, max(0.0, deadline - time.monotonic())))
+
+
+def create_watcher(force_polling: bool = False) -> Watcher:
+    """inotify が使えればそれを、使えなければポーリングの監視を作る"""
+    if not force_polling:
+        try:
+            return InotifyWatcher()
+        except (OSError, AttributeError, TypeError) as e:
+            logger.info(f"inotify を使えないためポーリングで監視します: {e}")
+    return PollingWatcher()
+
+
+def wait_for_changes(watcher: Watcher, debounce: float = DEBOUNCE_SECONDS) -> Tuple[Set[Path], float]:
+    """
+    変更を待ち、連続した変更が debounce 秒途切れるまでまとめる
+
+    Returns:
+        (変更されたファイル, 最初の変更を検知した時刻 perf_counter)
+    """
+    changed: Set[Path] = set()
+    while not changed:
+        changed = watcher.poll(None)
+    detected = time.perf_counter()
+    while True:
+        more = watcher.poll(debounce)
+        if not more:
+            return changed, detected
+        changed |= more
+
+
+def source_files(graph: BuildGraph, paths: ProjectPaths) -> Set[Path]:
+    """監視するファイル（ターゲットの入力のうち生成物でないもの + src/*.py）"""
+    outputs = {path for target in graph.targets.values() for path in target.output_paths()}
+    inputs = {path for target in graph.targets.values() for path in target.input_paths()}
+    return (inputs - outputs) | set(paths.src.glob("*.py"))
+
+
+def affected_targets(graph: BuildGraph, changed: Set[Path], selected: Sequence[str]) -> List[str]:
+    """変更されたファイルの影響を受けるターゲット（下流を含む、selected の範囲で）"""
+    direct = {target.name for target in graph.targets.values()
+              if changed.intersection(target.input_paths())}
+    if any(path.name == FIGURE_SOURCE for path in changed):
+        # 生成関数のハッシュは入力ファイルではなく stamp に入っている
+        direct |= {name for name in graph.targets if name.startswith('fig:')}
+
+    affected = set(direct)
+    grew = True
+    while grew:
+        downstream = {target.name for target in graph.targets.values()
+                      if target.name not in affected and affected.intersection(target.deps)}
+        affected |= downstream
+        grew = bool(downstream)
+    return [name for name in selected if name in affected]
+
+
+def reload_modules(changed: Set[Path], paths: ProjectPaths) -> bool:
+    """
+    変更された src/*.py を反映する
+
+    Returns:
+        プロセスの再起動が必要なら True
+    """
+    import build_stages
+
+    for path in sorted(changed):
+        if path.parent != paths.src or path.suffix != '.py':
+            continue
+        module_name = path.stem
+        if module_name not in sys.modules:
+            continue  # まだ読み込んでいないので、次に import されたときに反映される
+        if module_name not in RELOADABLE_MODULES:
+            return True
+        logger.info(f"♻️  {path.name} を読み込み直します")
+        importlib.reload(sys.modules[module_name])
+
+    # 読み込み直したモジュールのクラスで生成器・ビルダーを作り直す
+    build_stages.figure_generator.cache_clear()
+    build_stages.pdf_builder.cache_clear()
+    build_stages.pptx_builder.cache_clear()
+    return False
+
+
+def _display(paths: ProjectPaths, changed: Set[Path]) -> str:
+    names = []
+    for path in sorted(changed):
+        try:
+            names.append(path.relative_to(paths.root).as_posix())
+        except ValueError:
+            names.append(str(path))
+    return ', '.join(names)
+
+
+def _build(graph: BuildGraph, patterns: Optional[Sequence[str]], jobs: int) -> bool:
+    try:
+        result = graph.run(patterns, jobs=jobs)
+    except BuildFailed as e:
+        logger.error(f"❌ ビルドに失敗: {e}（修正して保存すると再試行します）")
+        return False
+    logger.info(f"🔨 ビルド: {len(result.built)}件 / ⏭️  スキップ: {len(result.skipped)}件 "
+                f"({result.elapsed:.2f}秒)")
+    return True
+
+
+def watch(paths: ProjectPaths, profile: BuildProfile, patterns: Sequence[str], jobs: int,
+          create_graph: Callable[[ProjectPaths, BuildProfile], BuildGraph],
+          force_polling: bool = False, debounce: float = DEBOUNCE_SECONDS) -> int:
+    """最初に通常のビルドを行い、以後は変更のたびに影響を受けるターゲットを再ビルドする"""
+    graph = create_graph(paths, profile)
+    _build(graph, patterns or None, jobs)
+
+    watcher = create_watcher(force_polling)
+    try:
+        while True:
+            watcher.set_files(source_files(graph, paths))
+            logger.info(f"👀 変更を監視中（{watcher.name}, {len(watcher.files)}ファイル）... Ctrl+C で終了")
+            changed, detected = wait_for_changes(watcher, debounce)
+            logger.info(f"📝 変更: {_display(paths, changed)}")
+
+            if reload_modules(changed, paths):
+                logger.info("♻️  ビルドスクリプトが変更されたため再起動します")
+                watcher.close()
+                os.execv(sys.executable, [sys.executable] + sys.argv)
+
+            # 図の参照やVOLの構成が変わっている可能性があるので、グラフは毎回作り直す
+            graph = create_graph(paths, profile)
+            selected = [target.name for target in graph.select(patterns or None)]
+            if watcher.overflowed:
+                targets, watcher.overflowed = selected, False
+            else:
+                targets = affected_targets(graph, changed, selected)
+            if not targets:
+                logger.info("  影響を受けるターゲットはありません")
+                continue
+
+            logger.info(f"🎯 再ビルド候補: {', '.join(targets)}")
+            if _build(graph, targets, jobs):
+                logger.info(f"⏱️  変更の検知から {time.perf_counter() - detected:.2f}秒で反映")
+    except KeyboardInterrupt:
+        logger.info("監視を終了します")
+        return 0
+    finally:
+        watcher.close()